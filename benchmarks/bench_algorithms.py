@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_algorithms微基准：逐个测量直线（各算法、不同斜率与长度）、多边形、椭圆（不同半径）、
+曲线（Bezier与B样条，不同控制点数）、平移旋转缩放和两种裁剪算法，报告吞吐量（像素/秒、图元/秒）与单次调用的峰值内存，
+结果可保存为JSON，并与基准结果比较，单次耗时（多次测量的中位数）增加超过阈值的用例记为性能回退
+
+用法: python benchmarks/bench_algorithms.py [--repeat 9] [--min-time 0.05] [--filter draw_line]
+                                            [--output results.json] [--baseline baseline.json | --no-baseline]
+                                            [--threshold 0.25]
+未给出 --baseline 时与仓库中的 benchmarks/baseline_algorithms.json 比较，存在回退时以状态码1退出。
+该文件记录了测量时的机器信息，在其他机器上比较时只能作为参考，可用
+--no-baseline --output benchmarks/baseline_algorithms.json 在本机重新生成。
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+
+import cg_algorithms as alg
+
+# 每个用例的一批图元个数
+BATCH = 20
+# 图元所在范围
+SIZE = 1000
+# 默认的基准结果
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_algorithms.json')
+
+
+def line_cases(rng):
+    """直线：每种算法在不同斜率（角度）与长度下各一个用例"""
+    for algorithm in ('Naive', 'DDA', 'Bresenham'):
+        for angle in (0, 30, 45, 60, 90):
+            for length in (10, 100, 1000):
+                dx, dy = round(length * math.cos(math.radians(angle))), round(length * math.sin(math.radians(angle)))
+                batch = []
+                for _ in range(BATCH):
+                    x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+                    batch.append([[x, y], [x + dx, y + dy]])
+                yield ('draw_line/%s/angle=%d/length=%d' % (algorithm, angle, length),
+                       lambda p_list, algorithm=algorithm: alg.draw_line(p_list, algorithm), batch, True)
+
+
+def random_points(rng, count):
+    return [[rng.randrange(SIZE), rng.randrange(SIZE)] for _ in range(count)]
+
+
+def polygon_cases(rng):
+    for algorithm in ('DDA', 'Bresenham'):
+        for count in (3, 10, 50):
+            batch = [random_points(rng, count) for _ in range(BATCH)]
+            yield ('draw_polygon/%s/vertices=%d' % (algorithm, count),
+                   lambda p_list, algorithm=algorithm: alg.draw_polygon(p_list, algorithm), batch, True)
+
+
+def ellipse_cases(rng):
+    """椭圆：长半轴为radius，短半轴为其一半"""
+    for radius in (10, 100, 1000):
+        batch = []
+        for _ in range(BATCH):
+            x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+            batch.append([[x - radius, y - radius // 2], [x + radius, y + radius // 2]])
+        yield 'draw_ellipse/radius=%d' % radius, alg.draw_ellipse, batch, True
+
+
+def curve_cases(rng):
+    for algorithm, counts in (('Bezier', (3, 4, 8, 16)), ('B-spline', (4, 8, 16, 64))):
+        for count in counts:
+            batch = [random_points(rng, count) for _ in range(BATCH)]
+            yield ('draw_curve/%s/points=%d' % (algorithm, count),
+                   lambda p_list, algorithm=algorithm: alg.draw_curve(p_list, algorithm), batch, True)
+
+
+def transform_cases(rng):
+    """变换：不同顶点数的图元参数"""
+    for count in (2, 16, 256):
+        batch = [random_points(rng, count) for _ in range(BATCH)]
+        yield 'translate/vertices=%d' % count, lambda p_list: alg.translate(p_list, 17, -23), batch, False
+        yield 'rotate/vertices=%d' % count, lambda p_list: alg.rotate(p_list, 500, 500, 37), batch, False
+        yield 'scale/vertices=%d' % count, lambda p_list: alg.scale(p_list, 500, 500, 1.7), batch, False
+
+
+def clip_cases(rng):
+    """裁剪：窗口为 [250, 750] x [250, 750]，线段完全在内、穿过窗口边界、完全在外三种情况"""
+    def inside():
+        return [[rng.randint(260, 740), rng.randint(260, 740)] for _ in range(2)]
+
+    def crossing():
+        return [[rng.randint(0, 240), rng.randint(0, SIZE)], [rng.randint(760, SIZE), rng.randint(0, SIZE)]]
+
+    def outside():
+        y = rng.choice((rng.randint(0, 240), rng.randint(760, SIZE)))
+        return [[rng.randint(0, SIZE), y], [rng.randint(0, SIZE), y]]
+
+    for algorithm in ('Cohen-Sutherland', 'Liang-Barsky'):
+        for name, make in (('inside', inside), ('crossing', crossing), ('outside', outside)):
+            batch = [make() for _ in range(BATCH)]
+            yield ('clip/%s/%s' % (algorithm, name),
+                   lambda p_list, algorithm=algorithm: alg.clip(p_list, 250, 250, 750, 750, algorithm), batch, False)
+
+
+def all_cases(seed=0):
+    rng = random.Random(seed)
+    for cases in (line_cases, polygon_cases, ellipse_cases, curve_cases, transform_cases, clip_cases):
+        yield from cases(rng)
+
+
+def run_batch(func, batch):
+    for p_list in batch:
+        func(p_list)
+
+
+def measure(func, batch, repeat, min_time):
+    """测量处理一批图元的耗时，取repeat次测量的中位数；单批过快时每次测量连续处理多批，使一次测量不短于min_time
+
+    :return: (float) 每个图元的平均耗时（秒）
+    """
+    start = time.perf_counter()
+    run_batch(func, batch)
+    loops = max(1, math.ceil(min_time / max(time.perf_counter() - start, 1e-9)))
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run_batch(func, batch)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) / loops / len(batch)
+
+
+def machine():
+    """测量所在机器的信息，保存在结果中，比较时据此判断基准是否来自同一台机器"""
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def peak_memory(func, batch):
+    """单次调用分配内存的峰值（字节），取一批图元中的最大值"""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for p_list in batch:
+            tracemalloc.reset_peak()
+            func(p_list)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run(args):
+    results = {}
+    for name, func, batch, draws in all_cases():
+        if args.filter and not any(text in name for text in args.filter):
+            continue
+        seconds = measure(func, batch, args.repeat, args.min_time)
+        pixels = sum(len(func(p_list)) for p_list in batch) / len(batch) if draws else None
+        results[name] = {
+            'seconds': seconds,
+            'primitives_per_second': 1 / seconds,
+            'pixels': pixels,
+            'pixels_per_second': pixels / seconds if draws else None,
+            'peak_bytes': peak_memory(func, batch),
+        }
+    return results
+
+
+def compare(results, baseline):
+    """与基准结果比较单个图元的耗时
+
+    :return: (dict) 用例名 -> 耗时比（本次 / 基准）；基准中没有的用例不在其中
+    """
+    return {name: result['seconds'] / baseline[name]['seconds']
+            for name, result in results.items() if name in baseline and baseline[name]['seconds'] > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=9, help='每个用例测量的次数，取中位数')
+    parser.add_argument('--min-time', type=float, default=0.05, help='单次测量的最短时长（秒）')
+    parser.add_argument('--filter', nargs='*', default=None, help='只运行名称包含任一字符串的用例')
+    parser.add_argument('--output', default=None, help='结果保存为JSON文件的路径')
+    parser.add_argument('--baseline', default=BASELINE,
+                        help='用于比较的基准结果（之前 --output 保存的JSON文件），默认为仓库中的baseline_algorithms.json')
+    parser.add_argument('--no-baseline', action='store_true', help='不与基准结果比较')
+    parser.add_argument('--threshold', type=float, default=0.25, help='耗时比基准增加超过该比例时记为回退')
+    args = parser.parse_args()
+
+    baseline = None
+    if not args.no_baseline:
+        with open(args.baseline, encoding='utf-8') as fp:
+            saved = json.load(fp)
+        baseline = saved['results']
+        if saved.get('machine') != machine():
+            print('warning: %s was measured on a different machine (%s), ratios are only indicative'
+                  % (args.baseline, saved.get('machine', {}).get('platform', 'unknown')))
+    results = run(args)
+    ratios = compare(results, baseline) if baseline is not None else {}
+
+    print('%-44s %12s %14s %14s %11s %9s' % ('case', 'us/primitive', 'primitives/s', 'pixels/s', 'peak (KB)',
+                                              'vs base'))
+    regressions = []
+    for name, result in results.items():
+        pixels_text = '%14.0f' % result['pixels_per_second'] if result['pixels_per_second'] is not None else '%14s' % '-'
+        if name in ratios:
+            ratio_text = '%+8.1f%%' % ((ratios[name] - 1) * 100)
+            if ratios[name] > 1 + args.threshold:
+                regressions.append(name)
+                ratio_text += '!'
+        else:
+            ratio_text = '%9s' % ('new' if baseline is not None else '-')
+        print('%-44s %12.2f %14.0f %s %11.1f %s' % (name, result['seconds'] * 1e6, result['primitives_per_second'],
+                                                 pixels_text, result['peak_bytes'] / 1024, ratio_text))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'machine': machine(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'batch': BATCH,
+                'repeat': args.repeat,
+                'statistic': 'median',
+                'results': results,
+            }, fp, indent=1)
+    if baseline is not None:
+        print('%d of %d cases compared with %s, %d regressions over %.0f%%'
+              % (len(ratios), len(results), args.baseline, len(regressions), args.threshold * 100))
+        for name in regressions:
+            print('  regression: %s %+.1f%%' % (name, (ratios[name] - 1) * 100))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""Bezier曲线求值基准：比较逐点De Casteljau、批量De Casteljau、Horner求值与对数域Bernstein求值在不同阶数下的耗时，
+以及与批量De Casteljau（逐位复现cg_algorithms）的最大偏差；超过Horner适用次数的阶数只运行后两者
+
+用法: python benchmarks/bench_bezier.py [--samples 2049] [--repeat 3] [--degrees 3,10,30,100,200,500,513,1000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+
+import cg_algorithms as alg
+import cg_raster
+
+
+def scalar_de_casteljau(p_list, u_values):
+    """cg_algorithms中逐点De Casteljau求值的原样复现（不取整），作为对照"""
+    result = []
+    for u in u_values:
+        res = p_list
+        for i in range(len(p_list) - 1):
+            res = [[(1 - u) * x1 + u * x2, (1 - u) * y1 + u * y2]
+                   for (x1, y1), (x2, y2) in zip(res, res[1:])]
+        result.append(res[0])
+    return np.array(result)
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        best = min(best, time.perf_counter() - start)
+    return best, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=2049)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scalar-max-degree', type=int, default=30)
+    parser.add_argument('--degrees', default='3,10,30,100,200,500,513,1000', help='以逗号分隔的阶数')
+    args = parser.parse_args()
+
+    random.seed(0)
+    u = np.arange(args.samples) / (args.samples - 1)
+    print('%7s %12s %12s %12s %12s %14s %14s' % ('degree', 'scalar(s)', 'batched(s)', 'horner(s)', 'bernstein(s)',
+                                                 'horner |dev|', 'bernstein |dev|'))
+    for degree in map(int, args.degrees.split(',')):
+        p_list = [[random.randint(0, 1000), random.randint(0, 1000)] for _ in range(degree + 1)]
+        if degree <= args.scalar_max_degree:
+            scalar_time, _ = best_of(lambda: scalar_de_casteljau(p_list, u.tolist()), args.repeat)
+            scalar_text = '%12.4f' % scalar_time
+        else:
+            scalar_text = '%12s' % '-'
+        batched_time, batched = best_of(lambda: cg_raster.bezier_de_casteljau(p_list, u), args.repeat)
+        if degree <= cg_raster._HORNER_MAX_DEGREE:
+            horner_time, horner = best_of(lambda: cg_raster.bezier_horner(p_list, u), args.repeat)
+            horner_text = '%12.4f' % horner_time
+            horner_dev = '%14.3e' % np.abs(batched - horner).max()
+        else:
+            horner_text, horner_dev = '%12s' % '-', '%14s' % '-'
+        bernstein_time, bernstein = best_of(lambda: cg_raster.bezier_bernstein(p_list, u), args.repeat)
+        print('%7d %s %12.4f %s %12.4f %s %14.3e' % (degree, scalar_text, batched_time, horner_text, bernstein_time,
+                                                     horner_dev, np.abs(batched - bernstein).max()))
+
+    p_list = [[random.randint(0, 1000), random.randint(0, 1000)] for _ in range(31)]
+    scalar_time, _ = best_of(lambda: alg.draw_curve(p_list, 'Bezier'), 1)
+    vector_time, _ = best_of(lambda: cg_raster.draw_curve(p_list, 'Bezier'), args.repeat)
+    print('draw_curve degree 30: cg_algorithms %.4fs, cg_raster %.4fs' % (scalar_time, vector_time))
+    # 超过Horner适用次数后，完整绘制的耗时仍与次数成正比
+    for degree in (512, 513, 1000):
+        p_list = [[random.randint(0, 1000), random.randint(0, 1000)] for _ in range(degree + 1)]
+        vector_time, _ = best_of(lambda: cg_raster.draw_curve(p_list, 'Bezier'), 1)
+        print('draw_curve degree %d: cg_raster %.4fs (%d samples)'
+              % (degree, vector_time, alg.curve_steps(p_list, 'Bezier') + 1))
+
+
+if __name__ == '__main__':
+    main()
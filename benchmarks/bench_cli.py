@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_cli.py端到端基准：在指令文件（给定或由gen_workload.py生成）上运行命令行程序，
+报告总耗时、峰值常驻内存（RSS），以及解析、变换、光栅化、合成、编码等各阶段的耗时
+
+用法: python benchmarks/bench_cli.py [script.txt] [--commands 100000] [--mix line=40,...] [--save-every 0]
+                                     [--span 100] [--cli-args "--memory-budget 64"] [--no-profile] [--output result.json]
+不给出指令文件时按 --commands、--mix 等选项生成（选项含义同gen_workload.py）。
+总耗时与峰值内存取自不计时的一次运行；各阶段耗时取自另一次以 --profile 运行的结果，计时本身会带来少量额外开销。
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import gen_workload
+
+CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source', 'cg_cli.py')
+# 报告中各阶段的顺序与说明；'other' 为进程启动、导入模块和退出等未计入任何阶段的时间
+PHASES = (
+    ('parse', 'parsing'),
+    ('store', 'draw/setColor (store updates)'),
+    ('transform', 'transforms and clips'),
+    ('rasterize', 'rasterization'),
+    ('composite', 'compositing'),
+    ('encode', 'image encoding'),
+    ('write', 'file writes'),
+    ('save', 'other saveCanvas work'),
+    ('other', 'startup, imports and exit'),
+)
+
+
+def run_cli(script, output_dir, cli_args):
+    """运行一次cg_cli.py
+
+    :return: (tuple: (float, int)) 总耗时（秒）与子进程的峰值常驻内存（字节）
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, CLI, script, output_dir] + cli_args)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    # 子进程已由wait4回收，告知Popen不必再等待
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        sys.exit('cg_cli.py exited with status %d' % process.returncode)
+    # Linux上ru_maxrss的单位为KB
+    return wall, usage.ru_maxrss * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('script', nargs='?', help='指令文件，不给出时按以下选项生成')
+    parser.add_argument('--commands', type=int, default=100000, help='生成的指令总数')
+    parser.add_argument('--mix', default='', help='生成的各类指令的相对权重，如 line=40,polygon=10,clip=0')
+    parser.add_argument('--save-every', type=int, default=0, help='每隔多少条指令保存一次画布，0表示只在末尾保存')
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=1000)
+    parser.add_argument('--span', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cli-args', default='', help='传给cg_cli.py的其他参数，如 "--image-format ppm"')
+    parser.add_argument('--no-profile', action='store_true', help='不统计各阶段耗时，只运行一次')
+    parser.add_argument('--dir', default=None, help='临时文件所在目录')
+    parser.add_argument('--output', default=None, help='结果保存为JSON文件的路径')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(dir=args.dir)
+    try:
+        script = args.script
+        generate_time = None
+        if script is None:
+            script = os.path.join(directory, 'workload.txt')
+            try:
+                mix = gen_workload.parse_mix(args.mix)
+            except ValueError as e:
+                parser.error(str(e))
+            start = time.perf_counter()
+            with open(script, 'w') as fp:
+                gen_workload.write(fp, gen_workload.generate(args.commands, mix, args.save_every, args.width,
+                                                             args.height, args.span, args.seed))
+            generate_time = time.perf_counter() - start
+        with open(script, 'rb') as fp:
+            commands = sum(chunk.count(b'\n') for chunk in iter(lambda: fp.read(1 << 20), b''))
+        cli_args = shlex.split(args.cli_args)
+
+        output_dir = os.path.join(directory, 'output')
+        os.mkdir(output_dir)
+        wall, peak_rss = run_cli(script, output_dir, cli_args)
+        images = [os.path.join(output_dir, name) for name in os.listdir(output_dir)]
+        result = {
+            'script': args.script,
+            'commands': commands,
+            'script_bytes': os.path.getsize(script),
+            'cli_args': cli_args,
+            'wall_seconds': wall,
+            'peak_rss_bytes': peak_rss,
+            'images': len(images),
+            'image_bytes': sum(os.path.getsize(path) for path in images),
+        }
+        if generate_time is not None:
+            print('generated %d commands in %.2fs' % (commands, generate_time))
+        print('%d commands (%.1f MB), %d images written (%.1f MB)'
+              % (commands, result['script_bytes'] / 2 ** 20, result['images'], result['image_bytes'] / 2 ** 20))
+        print('wall time %.3fs (%.0f commands/s), peak RSS %.1f MB' % (wall, commands / wall, peak_rss / 2 ** 20))
+
+        if not args.no_profile:
+            shutil.rmtree(output_dir)
+            os.mkdir(output_dir)
+            profile_path = os.path.join(directory, 'profile.json')
+            profiled_wall, _ = run_cli(script, output_dir, cli_args + ['--profile', profile_path])
+            with open(profile_path, encoding='utf-8') as fp:
+                profile = json.load(fp)
+            seconds = dict(profile['seconds'])
+            seconds['other'] = max(profiled_wall - sum(seconds.values()), 0)
+            result['profiled_wall_seconds'] = profiled_wall
+            result['phases'] = seconds
+            result['phase_counts'] = profile['counts']
+            print('profiled run %.3fs:' % profiled_wall)
+            print('  %-32s %10s %7s %10s' % ('phase', 'seconds', 'share', 'calls'))
+            for name, label in PHASES:
+                if name in seconds:
+                    print('  %-32s %10.3f %6.1f%% %10s' % (label, seconds[name], seconds[name] / profiled_wall * 100,
+                                                          profile['counts'].get(name, '-')))
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as fp:
+                json.dump(result, fp, indent=1)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
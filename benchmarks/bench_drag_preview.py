@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""GUI拖动帧时间基准：平移一条多控制点的曲线（或多边形），逐帧处理鼠标移动事件并完成重绘，统计每帧耗时
+
+用法: python benchmarks/bench_drag_preview.py [--points 1000] [--bezier-points 1000] [--frames 60] [--no-preview]
+无显示环境下默认使用Qt的offscreen平台。
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import QColor, QMouseEvent
+from PyQt5.QtCore import Qt, QPointF, QEvent
+
+import cg_gui
+
+# 60帧/秒对应的每帧时间预算（毫秒）
+FRAME_BUDGET = 16.0
+
+
+def mouse_event(kind, x, y):
+    return QMouseEvent(kind, QPointF(x, y), Qt.LeftButton, Qt.LeftButton, Qt.NoModifier)
+
+
+def drag_frames(app, canvas, item, frames):
+    """选中图元后平移，每帧一次鼠标移动并处理重绘，返回各帧耗时（秒）与松开鼠标的耗时"""
+    canvas.set_selection([item.id])
+    canvas.start_translate()
+    origin = canvas.mapToScene(0, 0)
+    x0, y0 = 300 - origin.x(), 300 - origin.y()
+    canvas.mousePressEvent(mouse_event(QEvent.MouseButtonPress, x0, y0))
+    app.processEvents()
+    times = []
+    for frame in range(1, frames + 1):
+        start = time.perf_counter()
+        canvas.mouseMoveEvent(mouse_event(QEvent.MouseMove, x0 + frame % 40, y0 + frame % 25))
+        canvas.viewport().repaint()
+        times.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    canvas.mouseReleaseEvent(mouse_event(QEvent.MouseButtonRelease, x0, y0))
+    canvas.viewport().repaint()
+    return times, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=1000, help='B样条曲线和多边形的控制点个数')
+    parser.add_argument('--bezier-points', type=int, default=1000, help='Bezier曲线的控制点个数')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--no-preview', action='store_true', help='关闭拖动预览，每帧精确光栅化')
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    window = cg_gui.MainWindow()
+    window.wait_task()  # 启动时在后台恢复上次的画布
+    canvas = window.canvas_widget
+    canvas.preview_drag = not args.no_preview
+    window.show()
+    random.seed(0)
+    cases = [('Bezier', 'curve', args.bezier_points), ('B-spline', 'curve', args.points),
+             ('Bresenham', 'polygon', args.points)]
+    print('%-10s %-8s %7s %10s %10s %12s %8s' % ('algorithm', 'type', 'points', 'mean(ms)', 'max(ms)',
+                                               'release(ms)', 'budget'))
+    for algorithm, item_type, points in cases:
+        p_list = [[random.randint(50, 550), random.randint(50, 550)] for _ in range(points)]
+        item = cg_gui.MyItem('bench', item_type, p_list, algorithm, QColor(0, 0, 0))
+        window.scene.addItem(item)
+        canvas.item_dict['bench'] = item
+        app.processEvents()
+        times, release = drag_frames(app, canvas, item, args.frames)
+        mean = sum(times) / len(times) * 1000
+        worst = max(times) * 1000
+        print('%-10s %-8s %7d %10.2f %10.2f %12.2f %8s' % (algorithm, item_type, points, mean, worst,
+                                                          release * 1000, 'ok' if mean < FRAME_BUDGET else 'over'))
+        canvas.clear_selection()
+        window.scene.removeItem(canvas.item_dict.pop('bench'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""操作日志基准：在大画布上做少量修改后，比较追加日志并提交与重写完整快照的保存耗时，以及打开时重放日志的耗时
+
+用法: python benchmarks/bench_journal.py [--items 200000] [--edits 100] [--dir /tmp]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+
+import cg_scene
+import cg_journal
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return time.perf_counter() - start, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=200000)
+    parser.add_argument('--edits', type=int, default=100, help='两次保存之间修改的图元个数')
+    parser.add_argument('--dir', default=None, help='临时文件所在目录')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    items = {str(i): ('line', [[rng.randrange(1000), rng.randrange(1000)] for _ in range(2)], 'DDA',
+                      (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+             for i in range(args.items)}
+    directory = tempfile.mkdtemp(dir=args.dir)
+    scene_path = os.path.join(directory, 'scene.cgs')
+    try:
+        cg_scene.save(scene_path, ((k,) + v for k, v in items.items()), 1000, 1000)
+        journal = cg_journal.Journal(cg_journal.journal_path(scene_path))
+        for item_id in rng.sample(list(items), args.edits):
+            item_type, _, algorithm, color = items[item_id]
+            items[item_id] = (item_type, [[rng.randrange(1000), rng.randrange(1000)] for _ in range(2)], algorithm, color)
+            journal.set(item_id, *items[item_id])
+        commit_time, _ = timed(journal.commit)
+        snapshot_time, _ = timed(lambda: cg_scene.save(scene_path + '.full', ((k,) + v for k, v in items.items()),
+                                                      1000, 1000))
+        load_time, (loaded, _, _) = timed(lambda: cg_journal.load(scene_path))
+        assert loaded == items
+        print('%d items, %d edits' % (args.items, args.edits))
+        print('save: journal commit %.2f ms (%d bytes), full snapshot %.2f ms (%d bytes)'
+              % (commit_time * 1000, journal.size, snapshot_time * 1000, os.path.getsize(scene_path + '.full')))
+        print('open: snapshot + replay %.3fs' % load_time)
+        compact_time, _ = timed(lambda: journal.compact(scene_path, ((k,) + v for k, v in items.items()), 1000, 1000))
+        print('compaction: %.3fs' % compact_time)
+        journal.close()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""场景文件读写基准：比较二进制场景文件与旧版pickle画布文件的大小、保存与打开耗时
+
+用法: python benchmarks/bench_scene_io.py [--items 1000000] [--dir /tmp]
+"""
+
+import os
+import sys
+import time
+import pickle
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+
+import cg_scene
+import cg_store
+
+
+def random_store(count, seed=0):
+    """随机生成count个图元：大部分为线段，其余为少量顶点的多边形和曲线"""
+    rng = np.random.default_rng(seed)
+    lengths = np.where(rng.random(count) < 0.8, 2, rng.integers(3, 9, count)).astype(np.int32)
+    store = cg_store.PrimitiveStore()
+    store.ids = [str(i) for i in range(count)]
+    store.index = {item_id: i for i, item_id in enumerate(store.ids)}
+    for algorithm in ('DDA', 'Bresenham', 'B-spline'):
+        store.intern(algorithm)
+    store.types = np.where(lengths == 2, cg_store.TYPE_CODES['line'], cg_store.TYPE_CODES['polygon']).astype(np.uint8)
+    store.types[(lengths > 3) & (rng.random(count) < 0.5)] = cg_store.TYPE_CODES['curve']
+    store.algorithm = np.where(store.types == cg_store.TYPE_CODES['curve'], 2, rng.integers(0, 2, count)).astype(np.uint8)
+    store.colors = rng.integers(0, 1 << 24, count).astype(np.uint32)
+    store.lengths = lengths
+    store.offsets = np.cumsum(lengths, dtype=np.int64) - lengths
+    store.vertices = rng.integers(0, 1000, (int(lengths.sum()), 2)).astype(np.int32)
+    store.vertex_count = len(store.vertices)
+    return store
+
+
+def timed(func):
+    start = time.perf_counter()
+    value = func()
+    return time.perf_counter() - start, value
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=1000000)
+    parser.add_argument('--dir', default=None, help='临时文件所在目录')
+    args = parser.parse_args()
+
+    store = random_store(args.items)
+    directory = tempfile.mkdtemp(dir=args.dir)
+    scene_path = os.path.join(directory, 'scene.cgs')
+    pickle_path = os.path.join(directory, 'scene.bmp')
+    try:
+        save_time, _ = timed(lambda: cg_scene.write_store(scene_path, store))
+        legacy = [[store.ids[i], store.item_type(i), store.p_list(i), store.algorithm_name(i),
+                   tuple(int(c) for c in store.rgb(i)[0]) + (255,)] for i in range(len(store))]
+
+        def dump():
+            with open(pickle_path, 'wb') as fp:
+                pickle.dump(legacy, fp)
+        pickle_save_time, _ = timed(dump)
+        del legacy
+
+        print('%d items' % len(store))
+        print('file size: scene %.1f MB, pickle %.1f MB' % (os.path.getsize(scene_path) / 2 ** 20,
+                                                           os.path.getsize(pickle_path) / 2 ** 20))
+        print('save: scene %.3fs, pickle %.3fs' % (save_time, pickle_save_time))
+
+        open_time, scene = timed(lambda: cg_scene.SceneFile(scene_path))
+        rng = random.Random(0)
+        picks = [rng.randrange(len(scene)) for _ in range(1000)]
+        access_time, _ = timed(lambda: [scene.item(i) for i in picks])
+        iterate_time, count = timed(lambda: sum(1 for _ in scene))
+        store_time, _ = timed(scene.to_store)
+        scene.close()
+        import_time, _ = timed(lambda: cg_scene.import_pickle(pickle_path))
+        print('open (mmap, header and validation): %.2f ms' % (open_time * 1000))
+        print('1000 random items: %.2f ms' % (access_time * 1000))
+        print('materialize all %d items: %.3fs, copy into PrimitiveStore: %.3fs' % (count, iterate_time, store_time))
+        print('legacy pickle import (all items): %.3fs' % import_time)
+    finally:
+        for path in (scene_path, pickle_path):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""GUI打开画布基准：从场景文件打开大画布，统计打开到首次完整绘制的耗时、界面最长无响应时间，以及之后局部重绘的耗时
+
+用法: python benchmarks/bench_scene_load.py [--items 100000] [--span 40] [--no-bulk]
+--span为线段端点间的最大距离，0表示端点在画布内任意分布。无显示环境下默认使用Qt的offscreen平台。
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication, QFileDialog
+from PyQt5.QtCore import QTimer
+
+import cg_gui
+import cg_scene
+
+# 画布大小
+SIZE = 600
+
+
+def random_items(count, span, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        x, y = rng.randrange(SIZE), rng.randrange(SIZE)
+        if span:
+            end = [min(max(x + rng.randint(-span, span), 0), SIZE - 1), min(max(y + rng.randint(-span, span), 0), SIZE - 1)]
+        else:
+            end = [rng.randrange(SIZE), rng.randrange(SIZE)]
+        yield str(i), 'line', [[x, y], end], rng.choice(['DDA', 'Bresenham']), (0, 0, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--span', type=int, default=40, help='线段端点间的最大距离，0表示任意')
+    parser.add_argument('--no-bulk', action='store_true', help='关闭批量加入，每个图元加入时即更新索引')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    # 使用临时的主目录，不恢复也不改写真实的上次画布
+    os.environ['HOME'] = directory
+    path = os.path.join(directory, 'scene.cgs')
+    cg_scene.save(path, random_items(args.items, args.span), SIZE, SIZE)
+
+    app = QApplication(sys.argv[:1])
+    window = cg_gui.MainWindow()
+    window.canvas_widget.bulk_load = not args.no_bulk
+    window.show()
+    app.processEvents()
+    QFileDialog.getOpenFileName = lambda *a, **k: (path, '')
+
+    # 界面线程每5毫秒应处理一次定时器，两次之间的最长间隔即最长无响应时间
+    ticks = []
+    timer = QTimer()
+    timer.timeout.connect(lambda: ticks.append(time.perf_counter()))
+    timer.start(5)
+    start = time.perf_counter()
+    window.open_canvas_action()
+    window.wait_task()
+    opened = time.perf_counter()
+    window.canvas_widget.viewport().repaint()
+    painted = time.perf_counter()
+    ticks.append(painted)
+    timer.stop()
+    stall = max(b - a for a, b in zip([start] + ticks, ticks))
+
+    items = list(window.canvas_widget.item_dict.values())
+    update_start = time.perf_counter()
+    for k in range(20):
+        items[k * len(items) // 20].update()
+        app.processEvents()
+    update_time = (time.perf_counter() - update_start) / 20
+
+    print('%d items, span %s, bulk load %s' % (len(items), args.span or 'any', 'off' if args.no_bulk else 'on'))
+    print('open (read + rasterize + add): %.3fs' % (opened - start))
+    print('first full paint (including index build): %.3fs' % (painted - opened))
+    print('open to first paint: %.3fs, longest UI stall: %.0f ms' % (painted - start, stall * 1000))
+    print('single item repaint afterwards: %.1f ms' % (update_time * 1000))
+    for name in os.listdir(directory):
+        if os.path.isfile(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""合成指令文件生成器：按给定的指令比例生成可由cg_cli.py执行的指令文件，边生成边写出，可生成上千万条指令
+
+用法: python benchmarks/gen_workload.py output.txt [--commands 1000] [--mix line=40,polygon=10,...]
+                                        [--save-every 0] [--width 1000] [--height 1000] [--span 100] [--seed 0]
+--mix为各类指令的相对权重，可选 line、polygon、ellipse、curve、color、translate、rotate、scale、clip，
+未给出的取默认权重；--save-every为每隔多少条指令保存一次画布，0表示只在末尾保存。
+output为 - 时写到标准输出。
+"""
+
+import sys
+import bisect
+import random
+import argparse
+import itertools
+
+# 默认的指令权重
+MIX = {
+    'line': 40,
+    'polygon': 10,
+    'ellipse': 10,
+    'curve': 10,
+    'color': 5,
+    'translate': 10,
+    'rotate': 5,
+    'scale': 5,
+    'clip': 5,
+}
+# 多边形与曲线的顶点数范围
+MIN_POINTS = 3
+MAX_POINTS = 8
+# 每次写出的行数
+LINES_PER_WRITE = 10000
+
+
+def parse_mix(text):
+    """解析形如 "line=40,clip=5" 的指令权重，未给出的取默认权重
+
+    :param text: (string) 以逗号分隔的 名称=权重
+    :return: (dict of string: float) 指令名 -> 权重
+    """
+    mix = dict(MIX)
+    for field in filter(None, text.split(',')):
+        name, _, weight = field.partition('=')
+        if name not in MIX:
+            raise ValueError('未知的指令类型: %s' % name)
+        mix[name] = float(weight)
+    if not any(mix[name] > 0 for name in ('line', 'polygon', 'ellipse', 'curve')):
+        raise ValueError('至少要有一种绘制指令的权重大于0')
+    return mix
+
+
+class Workload:
+    """
+    逐条生成合法的指令：变换和裁剪只作用于已绘制的图元，旋转不作用于椭圆，裁剪只作用于线段
+    """
+    def __init__(self, mix, width=1000, height=1000, span=100, seed=0):
+        self.width = width
+        self.height = height
+        self.span = span    # 图元控制点之间、平移量的最大距离
+        self.rng = random.Random(seed)
+        self.names = [name for name in mix if mix[name] > 0]
+        self.cumulative = list(itertools.accumulate(mix[name] for name in self.names))
+        self.count = 0          # 已绘制的图元数，图元ID依次为 0, 1, 2, ...
+        self.rotatable = []     # 非椭圆图元的ID
+        self.lines = []         # 线段的ID
+
+    def point(self):
+        return self.rng.randrange(self.width), self.rng.randrange(self.height)
+
+    def near(self, x, y):
+        """距(x, y)不超过span的点"""
+        rng = self.rng
+        return x + rng.randint(-self.span, self.span), y + rng.randint(-self.span, self.span)
+
+    def points(self, low):
+        x, y = self.point()
+        values = []
+        for _ in range(self.rng.randint(low, MAX_POINTS)):
+            values.extend(self.near(x, y))
+        return ' '.join(map(str, values))
+
+    def command(self):
+        """随机生成一条指令
+
+        :return: (string) 一行指令文本（不含换行）
+        """
+        rng = self.rng
+        name = self.names[bisect.bisect(self.cumulative, rng.random() * self.cumulative[-1])]
+        # 还没有可作用的图元时改为绘制线段
+        if (name in ('translate', 'scale') and not self.count or name == 'rotate' and not self.rotatable
+                or name == 'clip' and not self.lines):
+            name = 'line'
+        if name == 'color':
+            return 'setColor %d %d %d' % (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        if name == 'translate':
+            return 'translate %d %d %d' % (rng.randrange(self.count), rng.randint(-self.span, self.span),
+                                           rng.randint(-self.span, self.span))
+        if name == 'rotate':
+            return 'rotate %d %d %d %d' % ((rng.choice(self.rotatable),) + self.point() + (rng.randrange(360),))
+        if name == 'scale':
+            # 倍数的对数对称分布，反复缩放后图元大小不会持续增大或缩小
+            return 'scale %d %d %d %s' % ((rng.randrange(self.count),) + self.point()
+                                          + (rng.choice(('0.5', '0.8', '1.25', '2')),))
+        if name == 'clip':
+            x, y = self.point()
+            return 'clip %d %d %d %d %d %s' % (rng.choice(self.lines), x, y, x + rng.randint(1, 2 * self.span),
+                                               y + rng.randint(1, 2 * self.span),
+                                               rng.choice(('Cohen-Sutherland', 'Liang-Barsky')))
+        item_id = self.count
+        self.count += 1
+        if name == 'ellipse':
+            x, y = self.point()
+            rx, ry = rng.randint(1, self.span), rng.randint(1, self.span)
+            return 'drawEllipse %d %d %d %d %d' % (item_id, x - rx, y - ry, x + rx, y + ry)
+        self.rotatable.append(item_id)
+        if name == 'line':
+            self.lines.append(item_id)
+            x, y = self.point()
+            return 'drawLine %d %d %d %d %d %s' % ((item_id, x, y) + self.near(x, y)
+                                                   + (rng.choice(('Naive', 'DDA', 'Bresenham')),))
+        if name == 'polygon':
+            return 'drawPolygon %d %s %s' % (item_id, self.points(MIN_POINTS), rng.choice(('DDA', 'Bresenham')))
+        # 三次B样条至少需要4个控制点
+        algorithm = rng.choice(('Bezier', 'B-spline'))
+        return 'drawCurve %d %s %s' % (item_id, self.points(4 if algorithm == 'B-spline' else MIN_POINTS), algorithm)
+
+
+def generate(commands, mix=None, save_every=0, width=1000, height=1000, span=100, seed=0):
+    """逐行产生指令文件的内容：先重置画布，最后保存画布，共commands行
+
+    :param commands: (int) 指令总数（不少于2）
+    :param mix: (dict of string: float or None) 指令名 -> 权重，None为默认权重
+    :param save_every: (int) 每隔多少条指令保存一次画布，0表示只在末尾保存
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :param span: (int) 图元控制点之间、平移量的最大距离
+    :param seed: (int) 随机数种子
+    :return: (generator of string) 依次产生各行指令（不含换行）
+    """
+    workload = Workload(mix or MIX, width, height, span, seed)
+    yield 'resetCanvas %d %d' % (width, height)
+    saves = 0
+    for number in range(1, commands - 1):
+        if save_every and number % save_every == 0:
+            yield 'saveCanvas %d' % saves
+            saves += 1
+        else:
+            yield workload.command()
+    yield 'saveCanvas %d' % saves
+
+
+def write(fp, lines):
+    """分批写出各行"""
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, LINES_PER_WRITE))
+        if not batch:
+            break
+        fp.write('\n'.join(batch) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', help='指令文件路径，为 - 时写到标准输出')
+    parser.add_argument('--commands', type=int, default=1000, help='指令总数，包括开头的resetCanvas和结尾的saveCanvas')
+    parser.add_argument('--mix', default='', help='各类指令的相对权重，如 line=40,polygon=10,clip=0')
+    parser.add_argument('--save-every', type=int, default=0, help='每隔多少条指令保存一次画布，0表示只在末尾保存')
+    parser.add_argument('--width', type=int, default=1000)
+    parser.add_argument('--height', type=int, default=1000)
+    parser.add_argument('--span', type=int, default=100, help='图元控制点之间、平移量的最大距离')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.commands < 2:
+        parser.error('指令总数不能少于2')
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    lines = generate(args.commands, mix, args.save_every, args.width, args.height, args.span, args.seed)
+    if args.output == '-':
+        write(sys.stdout, lines)
+    else:
+        with open(args.output, 'w') as fp:
+            write(fp, lines)
+
+
+if __name__ == '__main__':
+    main()
@@ -160,6 +160,48 @@ def draw_ellipse(p_list):
     return result
 
 
+# 计算i控制点的基函数值，表示该点对当前u值下曲线点的权重
+def de_boor_cox(i, k, u): 
+    # 二维数组（k x k）：存储每个基函数值
+    N = [[0] * k for _ in range(k)]
+
+    # 第 1 阶的基函数值
+    for j in range(k):
+        N[j][0] = 1 if i + j <= u < i + j + 1 else 0
+        # 1有影响，0没有影响
+
+    # 从 2 阶开始，迭代计算更高阶的基函数值
+    for d in range(1, k):
+        for j in range(k - d):
+            # 计算左边项
+            left = 0
+            if (u - (i + j)) != 0:
+                left = (u - (i + j)) / d * N[j][d - 1]
+            # 计算右边项
+            right = 0
+            if ((i + j + d + 1) - u) != 0:
+                right = ((i + j + d + 1) - u) / d * N[j + 1][d - 1]
+            # 更新当前阶次的基函数值
+            N[j][d] = left + right
+
+    # 最高阶次（k-1）的第一个基函数值
+    return N[0][k - 1]
+
+
+def bspline_basis_table(steps, k=4):
+    """均匀B样条的基函数表
+
+    均匀节点下，u = (k - 1) + j + s / steps 处只有第 j..j+k-1 个基函数非零，且其取值与段号j无关，
+    因此每个采样比例只需计算一次k个权重，所有段共用同一张表。
+    steps为2的整数次幂时u的小数部分没有舍入误差，查表结果与直接调用de_boor_cox逐位相同。
+
+    :param steps: (int) 每段的采样数
+    :param k: (int) B样条的阶数
+    :return: (list of list of float) steps行k列，第s行为 u 的小数部分为 s / steps 时第 j..j+k-1 个控制点的权重
+    """
+    return [[de_boor_cox(m, k, k - 1 + s / steps) for m in range(k)] for s in range(steps)]
+
+
 def draw_curve(p_list, algorithm):
     """绘制曲线
 
@@ -168,55 +210,26 @@ def draw_curve(p_list, algorithm):
     :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
     """
     # TODO
-    # 计算i控制点的基函数值，表示该点对当前u值下曲线点的权重
-    def de_boor_cox(i, k, u): 
-        # 二维数组（k x k）：存储每个基函数值
-        N = [[0] * k for _ in range(k)]
-
-        # 第 1 阶的基函数值
-        for j in range(k):
-            N[j][0] = 1 if i + j <= u < i + j + 1 else 0
-            # 1有影响，0没有影响
-
-        # 从 2 阶开始，迭代计算更高阶的基函数值
-        for d in range(1, k):
-            for j in range(k - d):
-                # 计算左边项
-                left = 0
-                if (u - (i + j)) != 0:
-                    left = (u - (i + j)) / d * N[j][d - 1]
-                # 计算右边项
-                right = 0
-                if ((i + j + d + 1) - u) != 0:
-                    right = ((i + j + d + 1) - u) / d * N[j + 1][d - 1]
-                # 更新当前阶次的基函数值
-                N[j][d] = left + right
-
-        # 最高阶次（k-1）的第一个基函数值
-        return N[0][k - 1]
-    
-    du = 0.001 # 控制曲线的分辨率
-    # 值越小，生成点越多，曲线越平滑
+    # 自适应采样：采样段数由曲线的平坦程度（Wang公式）和控制多边形长度共同决定，
+    # 相邻采样点之间再用Bresenham直线连接，保证结果无缺口且每步约一个像素
     result = []
     if algorithm == 'Bezier':
         n = len(p_list) - 1 # 控制点数量减一，即Bezier曲线的阶数
-        result.append(p_list[0]) 
-        u = du 
-        # 在0到1之间的小增量：控制点的线性插值生成曲线
-        # 步长设置为0.001：曲线的分辨率较高
-        while u < 1:
-            res = p_list.copy() # 每轮迭代生成当前u值下的曲线上点
+        steps = curve_steps(p_list, algorithm)
+        samples = []
+        # u = i / steps 为二进制有限小数，采样参数没有舍入误差
+        for s in range(steps + 1):
+            u = s / steps
+            res = p_list # 每轮迭代生成当前u值下的曲线上点（只读，无需复制）
             for i in range(n): # n次插值
                 temp = [] # 中间点
                 for j in range(len(res) - 1): # 相邻两点
                     x1, y1 = res[j]
                     x2, y2 = res[j + 1]
                     temp.append([(1 - u) * x1 + u * x2, (1 - u) * y1 + u * y2]) # De Casteljau算法
-                res = temp.copy()
-            x, y = round(res[0][0]), round(res[0][1])
-            result.append([x, y])
-            u += du
-        result.append(p_list[-1])
+                res = temp
+            samples.append((round(res[0][0]), round(res[0][1])))
+        result = join_samples(samples)
     elif algorithm == 'B-spline':
         k = 4
         n = len(p_list)
@@ -225,20 +238,67 @@ def draw_curve(p_list, algorithm):
 
 #        k = 4 # 样条的阶数，取值为4，表示三次B样条曲线
 #        u = 3 # 曲线在控制点的权重位置
-        u = k - 1
-
-        while u < n:
+        # 每一段（相邻整数u之间）等分为steps份，最后补上曲线终点 u = n（即第n-k+1段的起点，只有前k-1个权重有对应的控制点）
+        steps = curve_steps(p_list, algorithm)
+        table = bspline_basis_table(steps, k)
+        samples = []
+        for s in range((n - k + 1) * steps + 1):
+            j, weights = s // steps, table[s % steps]
             x1, y1 = 0, 0
-            for i in range(n):
-                x0, y0 = p_list[i]
-                res = de_boor_cox(i, k, u)
-                x1 += x0 * res
-                y1 += y0 * res
-            result.append([round(x1), round(y1)])
-            u += du
+            for m in range(min(k, n - j)):
+                x0, y0 = p_list[j + m]
+                x1 += x0 * weights[m]
+                y1 += y0 * weights[m]
+            samples.append((round(x1), round(y1)))
+        result = join_samples(samples)
     return result
 
 
+def curve_steps(p_list, algorithm, tolerance=0.25):
+    """计算Bezier曲线（或B样条曲线每一段）的采样段数
+
+    由Wang公式，将曲线等分为 sqrt(M / (8 * tolerance)) 段后，每段与其弦的距离不超过tolerance，
+    其中M为二阶导数长度的上界：n次Bezier曲线为 n(n-1) 乘以控制点二阶差分的最大长度，
+    三次均匀B样条每一段则直接为控制点二阶差分的最大长度。
+    同时段数不超过曲线（段）长度上界的像素数，避免短曲线过度采样。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 'Bezier'或'B-spline'
+    :param tolerance: (float) 允许的最大弦高误差（像素）
+    :return: (int) 采样段数，总是2的整数次幂
+    """
+    second = 0
+    for i in range(len(p_list) - 2):
+        ddx = p_list[i + 2][0] - 2 * p_list[i + 1][0] + p_list[i][0]
+        ddy = p_list[i + 2][1] - 2 * p_list[i + 1][1] + p_list[i][1]
+        second = max(second, math.hypot(ddx, ddy))
+    edges = [math.hypot(p_list[i + 1][0] - p_list[i][0], p_list[i + 1][1] - p_list[i][1])
+             for i in range(len(p_list) - 1)]
+    if algorithm == 'B-spline':
+        # 每一段的长度不超过控制多边形的最长边
+        length = max(edges, default=0)
+    else:
+        n = len(p_list) - 1
+        second *= n * (n - 1)
+        # 曲线长度不超过控制多边形的总长
+        length = sum(edges)
+    steps = max(1, min(math.ceil(math.sqrt(second / (8 * tolerance))), math.ceil(length)))
+    return 1 << (steps - 1).bit_length()
+
+
+def join_samples(samples):
+    """用Bresenham直线依次连接采样点，并去除重复像素
+
+    :param samples: (list of tuple of int: [(x_0, y_0), (x_1, y_1), ...]) 取整后的采样点
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 无缺口的像素点坐标列表
+    """
+    pixels = dict.fromkeys(samples[:1])
+    for i in range(1, len(samples)):
+        if samples[i] != samples[i - 1]:
+            pixels.update(dict.fromkeys(draw_line([samples[i - 1], samples[i]], 'Bresenham')))
+    return [list(p) for p in pixels]
+
+
 def translate(p_list, dx, dy):
     """平移变换
 
@@ -3,133 +3,803 @@
 
 import sys
 import os
+import argparse
+import io
+import json
+import time
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import cg_algorithms as alg
+import cg_raster
+import cg_parser
+import cg_image
+import cg_store
 import numpy as np
 from PIL import Image
 
+
+def rasterize_segments(store, indices, rect=None):
+    """将线段和多边形按算法分组，每组直接从顶点数组取出所有边，只调用一次cg_raster.draw_lines进行批量光栅化
+
+    :param store: (cg_store.PrimitiveStore) 图元存储
+    :param indices: (np.ndarray of int) 图元下标
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，给定时只生成各边穿过该区域的部分
+    :return: (dict of int: np.ndarray) 图元在indices中的位置 -> 该图元的像素坐标数组
+    """
+    indices = np.asarray(indices, np.int64)
+    lengths = store.lengths[indices].astype(np.int64)
+    types = store.types[indices]
+    line = (types == cg_store.TYPE_CODES['line']) & (lengths == 2)
+    polygon = (types == cg_store.TYPE_CODES['polygon']) & (lengths > 0)
+    # 每个图元的边数：直线1条，n边形n条
+    edges = np.where(line, 1, lengths)
+    selected = np.flatnonzero(line | polygon)
+    codes = store.algorithm[indices[selected]]
+    result = {}
+    for code in np.unique(codes):
+        group = selected[codes == code]
+        counts = edges[group]
+        owner = np.repeat(group, counts)
+        first = np.cumsum(counts) - counts
+        k = np.arange(counts.sum()) - np.repeat(first, counts)
+        start = store.offsets[indices[owner]]
+        n = lengths[owner]
+        # 多边形的第k条边为 [p[k - 1], p[k]]，与cg_raster.polygon_segments的顺序相同
+        head = np.where(line[owner], start, start + (k - 1) % n)
+        tail = np.where(line[owner], start + 1, start + k)
+        segments = np.stack([store.vertices[head], store.vertices[tail]], axis=1)
+        pixels, offsets = cg_raster.draw_lines(segments, store.algorithms[code], rect)
+        for position, begin, end in zip(group.tolist(), offsets[first], offsets[first + counts]):
+            result[position] = pixels[begin:end]
+    return result
+
+
+def rasterize_items(store, indices, rect=None):
+    """光栅化指定图元
+
+    给定可见区域时先按控制点包围盒剔除与区域不相交的图元，其余图元只生成可见部分，
+    运算量只与图元在区域内的大小有关，而与其完整尺寸无关。
+
+    :param store: (cg_store.PrimitiveStore) 图元存储
+    :param indices: (np.ndarray of int) 图元下标
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开
+    :return: (list of np.ndarray) 与indices一一对应的像素坐标数组，形状为(M, 2)；
+             给定rect时包含区域内的全部像素，可能另有少量区域外的像素
+    """
+    indices = np.asarray(indices, np.int64)
+    visible = np.arange(len(indices))
+    if rect is not None:
+        b = item_bounds(store, indices)
+        visible = np.flatnonzero((b[:, 0] < rect[2]) & (b[:, 2] > rect[0]) & (b[:, 1] < rect[3]) & (b[:, 3] > rect[1]))
+    segment_pixels = rasterize_segments(store, indices[visible], rect)
+    buffers = [_NO_PIXELS] * len(indices)
+    for k, (position, index) in enumerate(zip(visible.tolist(), indices[visible].tolist())):
+        if k in segment_pixels:
+            buffers[position] = segment_pixels[k]
+        else:
+            buffers[position] = cg_raster.rasterize(store.item_type(index), store.p_list(index),
+                                                    store.algorithm_name(index), rect)
+    return buffers
+
+
+def composite(canvas, buffers, colors, rect, offset=0):
+    """按绘制顺序将各图元位于矩形区域内的像素写入画布，后绘制的图元覆盖先绘制的图元
+
+    所有图元的像素拼接后只做一次花式索引赋值，代替逐像素的 canvas[y, x] = color。
+    同一位置被多个图元覆盖时，先用 np.maximum.at 求出最后绘制的图元，保证覆盖顺序不变。
+
+    :param canvas: (np.ndarray of uint8, shape (height, width, 3)) 画布
+    :param buffers: (list of np.ndarray) 按绘制顺序排列的各图元像素坐标数组
+    :param colors: (np.ndarray of uint8, shape (n, 3)) 与buffers一一对应的颜色
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 写入区域，左闭右开，必须位于画布内
+    :param offset: (int) canvas只保存画布的一个行条带时，其第0行对应的画布行号
+    """
+    if not buffers:
+        return
+    x_min, y_min, x_max, y_max = rect
+    width = x_max - x_min
+    counts = np.array([len(pixels) for pixels in buffers], np.int64)
+    pixels = np.concatenate(buffers)
+    owners = np.repeat(np.arange(len(buffers), dtype=np.int32), counts)
+    # 根据Pillow版本而定，最终输出的视觉结果需要以画布左上角为坐标原点
+    x, y = pixels[:, 0], pixels[:, 1]
+    # 区域之外（包括画布之外）的像素直接丢弃
+    inside = (x >= x_min) & (x < x_max) & (y >= y_min) & (y < y_max)
+    if not inside.all():
+        x, y, owners = x[inside], y[inside], owners[inside]
+    index = (y - y_min).astype(np.int64) * width + (x - x_min)
+    owner = np.full((y_max - y_min) * width, -1, np.int32)
+    np.maximum.at(owner, index, owners)
+    drawn = np.flatnonzero(owner >= 0)
+    # 以3字节为单位整体赋值，比按(行, 通道)的二维花式索引更快
+    rgb = np.dtype((np.void, 3))
+    region = canvas[y_min - offset:y_max - offset, x_min:x_max]
+    if not region.flags.c_contiguous:
+        region = region.copy()
+    region.reshape(-1, 3).view(rgb)[drawn, 0] = np.ascontiguousarray(colors).view(rgb)[owner[drawn], 0]
+    canvas[y_min - offset:y_max - offset, x_min:x_max] = region
+
+
+def merge_rects(rects, limit=16):
+    """合并相交的矩形，矩形过多时直接取并集包围盒
+
+    :param rects: (list of tuple: [(x_min, y_min, x_max, y_max), ...]) 左闭右开的矩形列表
+    :param limit: (int) 合并后保留的矩形数上限
+    :return: (list of tuple) 互不相交的矩形列表
+    """
+    rects = list(rects)
+    merged = True
+    while merged and len(rects) > 1:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                a, b = rects[i], rects[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rects[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    del rects[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    if len(rects) > limit:
+        rects = [(min(r[0] for r in rects), min(r[1] for r in rects),
+                  max(r[2] for r in rects), max(r[3] for r in rects))]
+    return rects
+
+
+_NO_PIXELS = np.empty((0, 2), np.int32)
+
+
+def image_format(path):
+    """由扩展名得到图像格式，如 'bmp'、'ppm'"""
+    return os.path.splitext(path)[1][1:].lower()
+
+
+class Profile:
+    """
+    按阶段累计主进程的耗时，供 --profile 使用；阶段可以嵌套，内层阶段计时期间外层阶段暂停计时，
+    因此各阶段的耗时互不重叠，之和即计时的总时间
+    """
+    def __init__(self):
+        self.seconds = {}       # 阶段名 -> 累计耗时（秒）
+        self.counts = {}        # 阶段名 -> 进入次数
+        self._stack = []        # 正在计时的阶段，栈顶为当前阶段
+        self._last = time.perf_counter()
+
+    def _switch(self):
+        """将上次切换以来的时间计入当前阶段"""
+        now = time.perf_counter()
+        if self._stack:
+            name = self._stack[-1]
+            self.seconds[name] = self.seconds.get(name, 0.0) + now - self._last
+        self._last = now
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """在with块内计时，耗时计入阶段name
+
+        :param name: (string) 阶段名
+        """
+        self._switch()
+        self._stack.append(name)
+        self.counts[name] = self.counts.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def dump(self, path):
+        """将各阶段的耗时和进入次数以JSON格式写入文件"""
+        with open(path, 'w', encoding='utf-8') as fp:
+            json.dump({'seconds': self.seconds, 'counts': self.counts}, fp, indent=1)
+
+
+class _NoProfile:
+    """不计时时使用的空对象"""
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+
+NO_PROFILE = _NoProfile()
+
+
+class Renderer:
+    """
+    增量渲染器：在多次saveCanvas之间保留各图元的像素缓存和持久画布，
+    只重新光栅化上次保存后被修改过的图元，并只重绘它们新旧位置覆盖的区域
+    """
+    profile = NO_PROFILE    # 各阶段的计时，由Interpreter设置
+
+    def __init__(self, width=0, height=0, verbose=False):
+        self.verbose = verbose  # 是否逐图元输出调试信息
+        self.reset(width, height)
+
+    def reset(self, width, height):
+        self.width = width
+        self.height = height
+        self.store = cg_store.PrimitiveStore()      # 图元存储，下标即绘制顺序
+        self.buffers = []       # 按绘制顺序存储的像素缓存
+        self.bounds = np.empty((0, 4), np.int64)    # 像素包围盒，左闭右开；空图元为空矩形；容量按需扩充
+        self.dirty = set()      # 上次保存后被修改过的图元下标
+        self.canvas = None      # 持久画布，首次保存时创建
+        self.encoded = None     # 上次保存的BMP编码结果
+
+    def load(self, store):
+        """替换全部图元
+
+        :param store: (cg_store.PrimitiveStore) 图元存储
+        """
+        self.reset(self.width, self.height)
+        self.store = store
+        self.mark(range(len(store)))
+
+    def mark(self, indices):
+        """标记store中新增或修改过的图元，下次保存时重绘
+
+        :param indices: (iterable of int) 图元下标
+        """
+        count = len(self.store)
+        if count > len(self.buffers):
+            if count > len(self.bounds):
+                # 按倍数扩容，避免每新增一个图元就复制一次数组
+                capacity = max(2 * len(self.bounds), count, 64)
+                self.bounds = np.resize(self.bounds, (capacity, 4))
+                self.bounds[len(self.buffers):] = 0
+            # 尚未光栅化的图元共用同一个空数组，缓存更新时整体替换而不会原地修改
+            self.buffers.extend([_NO_PIXELS] * (count - len(self.buffers)))
+        self.dirty.update(indices)
+
+    def _update_rasters(self, indices):
+        """重新光栅化指定图元，返回它们旧的和新的包围盒"""
+        old_bounds = self.bounds[indices]
+        with self.profile.phase('rasterize'):
+            # 画布之外的部分不光栅化
+            buffers = rasterize_items(self.store, indices, (0, 0, self.width, self.height))
+            for index, pixels in zip(indices.tolist(), buffers):
+                self.buffers[index] = pixels
+            # 用reduceat一次求出所有非空图元的包围盒
+            counts = np.array([len(pixels) for pixels in buffers], np.int64)
+            filled = counts > 0
+            bounds = np.zeros((len(indices), 4), np.int64)
+            if filled.any():
+                pixels = np.concatenate(buffers)
+                starts = (np.cumsum(counts) - counts)[filled]
+                bounds[filled, :2] = np.minimum.reduceat(pixels, starts, axis=0)
+                bounds[filled, 2:] = np.maximum.reduceat(pixels, starts, axis=0) + 1
+            self.bounds[indices] = bounds
+        if self.verbose:
+            for index in indices.tolist():
+                print('%s drawn' % self.store.item_type(index).upper())
+        return np.concatenate([old_bounds, self.bounds[indices]])
+
+    def _redraw(self, rect):
+        """将矩形区域恢复为白色，再按绘制顺序重绘与之相交的所有图元"""
+        x_min, y_min, x_max, y_max = rect
+        with self.profile.phase('composite'):
+            self.canvas[y_min:y_max, x_min:x_max] = 255
+            b = self.bounds[:len(self.buffers)]
+            hit = np.flatnonzero((b[:, 0] < x_max) & (b[:, 2] > x_min) & (b[:, 1] < y_max) & (b[:, 3] > y_min))
+            composite(self.canvas, [self.buffers[i] for i in hit], self.store.rgb(hit), rect)
+
+    def render(self):
+        """更新持久画布
+
+        :return: (bool) 画布内容是否可能发生了变化
+        """
+        if self.canvas is None:
+            self.canvas = np.zeros([self.height, self.width, 3], np.uint8)
+            self.canvas.fill(255)
+            self._update_rasters(np.arange(len(self.store)))
+            self.dirty.clear()
+            self._redraw((0, 0, self.width, self.height))
+            return True
+        if not self.dirty:
+            return False
+        # 按绘制顺序重新光栅化，受影响区域为这些图元新旧包围盒与画布的交集
+        indices = np.array(sorted(self.dirty), np.int64)
+        self.dirty.clear()
+        rects = []
+        for x_min, y_min, x_max, y_max in self._update_rasters(indices):
+            x_min, y_min = max(x_min, 0), max(y_min, 0)
+            x_max, y_max = min(x_max, self.width), min(y_max, self.height)
+            if x_min < x_max and y_min < y_max:
+                rects.append((int(x_min), int(y_min), int(x_max), int(y_max)))
+        for rect in merge_rects(rects):
+            self._redraw(rect)
+        return True
+
+    def close(self):
+        """释放渲染器占用的资源"""
+        self.canvas = None
+        self.encoded = None
+
+    def save(self, path):
+        """保存画布，格式由扩展名决定；自上次保存以来没有变化时直接复用上次的编码结果
+
+        :param path: (string) 保存路径
+        """
+        if self.render() or self.encoded is None:
+            with self.profile.phase('encode'):
+                buffer = io.BytesIO()
+                Image.fromarray(self.canvas).save(buffer, image_format(path))
+                self.encoded = buffer.getvalue()
+        with self.profile.phase('write'):
+            with open(path, 'wb') as fw:
+                fw.write(self.encoded)
+
+
+class TiledRenderer(Renderer):
+    """
+    分块并行渲染器：画布位于共享内存中，由常驻的进程池按图块并行绘制，适合超大画布；
+    首次保存时绘制所有图块，之后只重绘被修改图元新旧包围盒覆盖的图块
+    """
+    def __init__(self, width=0, height=0, verbose=False, jobs=2, tile_size=1024):
+        self.jobs = jobs                # 进程数
+        self.tile_size = tile_size      # 图块边长
+        self.memory = None              # 存放画布的共享内存
+        self.pool = None                # 常驻进程池，首次绘制时创建，close时关闭
+        super().__init__(width, height, verbose)
+
+    def reset(self, width, height):
+        self._release_canvas()
+        super().reset(width, height)
+
+    def _release_canvas(self):
+        # 先释放画布对共享内存的引用，才能关闭共享内存
+        self.canvas = None
+        self.encoded = None
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def close(self):
+        self._release_canvas()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def render(self):
+        if self.canvas is not None and not self.dirty:
+            return False
+        # self.bounds保存各图元控制点的包围盒（而非像素包围盒），与工作进程分块时所用的相同
+        indices = np.array(sorted(self.dirty), np.int64)
+        self.dirty.clear()
+        old_bounds = self.bounds[indices]
+        self.bounds[indices] = item_bounds(self.store, indices)
+        size = self.tile_size
+        tiles = bin_items(self.bounds[:len(self.store)], self.width, self.height, size, size)
+        if self.canvas is None:
+            shape = (self.height, self.width, 3)
+            self.memory = shared_memory.SharedMemory(create=True, size=max(self.height * self.width * 3, 1))
+            self.canvas = np.ndarray(shape, np.uint8, buffer=self.memory.buf)
+            self.canvas.fill(255)
+            rects = list(tiles)
+        else:
+            # 被修改图元移出的图块中可能已没有图元，同样需要重绘为白色
+            rects = list(bin_items(np.concatenate([old_bounds, self.bounds[indices]]),
+                                   self.width, self.height, size, size))
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.jobs)
+        # 光栅化与合成在工作进程中按图块交替进行，等待的时间统一计入光栅化
+        with self.profile.phase('rasterize'):
+            render_tiled(self.pool, self.memory, self.canvas.shape, self.store, tiles, rects)
+        return True
+
+
+class MemmapRenderer(Renderer):
+    """
+    外存渲染器：帧缓冲保存在文件中，按行条带依次绘制并流式写出图像，
+    内存占用由budget决定而与画布大小无关；每次保存时完整重绘
+    """
+    def __init__(self, width=0, height=0, verbose=False, budget=256 << 20, directory=None):
+        self.budget = budget            # 每个行条带占用内存的上限（字节）
+        self.directory = directory      # 帧缓冲文件所在目录，None为系统临时目录
+        self.framebuffer = None
+        super().__init__(width, height, verbose)
+
+    def reset(self, width, height):
+        self.close()
+        super().reset(width, height)
+
+    def close(self):
+        super().close()
+        if self.framebuffer is not None:
+            self.framebuffer.close()
+            self.framebuffer = None
+
+    @property
+    def rows(self):
+        """每个行条带的行数；合成时每个像素约需16字节（画布、覆盖关系和索引）"""
+        return max(1, self.budget // (max(self.width, 1) * 16))
+
+    def render(self):
+        if self.framebuffer is not None and not self.dirty:
+            return False
+        self.dirty.clear()
+        if self.framebuffer is None:
+            self.framebuffer = cg_image.Framebuffer(self.width, self.height, self.directory)
+        rows = self.rows
+        strips = bin_items(item_bounds(self.store), self.width, self.height, self.width, rows)
+        for y_min, y_max in self.framebuffer.strips(rows):
+            strip = self.framebuffer.strip(y_min, y_max)
+            strip.fill(255)
+            indices = strips.get((0, y_min, self.width, y_max), np.empty(0, np.int64))
+            rect = (0, y_min, self.width, y_max)
+            with self.profile.phase('rasterize'):
+                buffers = rasterize_items(self.store, indices, rect)
+            with self.profile.phase('composite'):
+                composite(strip, buffers, self.store.rgb(indices), rect, y_min)
+            strip.flush()
+            del strip
+        return True
+
+    def save(self, path):
+        """按行条带从帧缓冲流式写出图像，格式由扩展名决定（'bmp' 或 'ppm'）
+
+        :param path: (string) 保存路径
+        """
+        self.render()
+        # 编码与写出按条带交替进行，统一计入编码
+        with self.profile.phase('encode'):
+            with open(path, 'wb') as fw:
+                cg_image.WRITERS[image_format(path)](fw, self.framebuffer, self.rows)
+
+
+def item_bounds(store, indices=None):
+    """由控制点求各图元的包围盒；直线、多边形、曲线和椭圆的像素都不会超出控制点的包围盒
+
+    :param store: (cg_store.PrimitiveStore) 图元存储
+    :param indices: (np.ndarray of int or None) 图元下标，None为全部图元
+    :return: (np.ndarray of int64, shape (n, 4)) 左闭右开的包围盒 (x_min, y_min, x_max, y_max)，无控制点的图元为空矩形
+    """
+    if indices is None:
+        indices = np.arange(len(store))
+    counts = store.lengths[indices].astype(np.int64)
+    bounds = np.zeros((len(indices), 4), np.int64)
+    filled = np.flatnonzero(counts > 0)
+    if len(filled):
+        points = store.points(indices[filled]).astype(np.int64)
+        starts = np.cumsum(counts[filled]) - counts[filled]
+        bounds[filled, :2] = np.minimum.reduceat(points, starts, axis=0)
+        bounds[filled, 2:] = np.maximum.reduceat(points, starts, axis=0) + 1
+    return bounds
+
+
+def bin_items(bounds, width, height, tile_width, tile_height):
+    """将图元按包围盒分配到与之相交的各个图块
+
+    :param bounds: (np.ndarray of int64, shape (n, 4)) 左闭右开的图元包围盒
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :param tile_width: (int) 图块宽度
+    :param tile_height: (int) 图块高度
+    :return: (dict of tuple: np.ndarray) 图块 (x_min, y_min, x_max, y_max) -> 按绘制顺序排列的图元下标
+    """
+    columns = -(-width // tile_width)
+    x_min, y_min = np.maximum(bounds[:, 0], 0), np.maximum(bounds[:, 1], 0)
+    x_max, y_max = np.minimum(bounds[:, 2], width), np.minimum(bounds[:, 3], height)
+    visible = np.flatnonzero((x_min < x_max) & (y_min < y_max))
+    tx0, ty0 = x_min[visible] // tile_width, y_min[visible] // tile_height
+    tx1, ty1 = (x_max[visible] - 1) // tile_width + 1, (y_max[visible] - 1) // tile_height + 1
+    span = tx1 - tx0
+    counts = span * (ty1 - ty0)
+    # 展开为 (图块, 图元) 对：第k个图元覆盖的第j个图块为 (tx0 + j % span, ty0 + j // span)
+    owner = np.repeat(np.arange(len(visible)), counts)
+    j = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tiles = (ty0[owner] + j // span[owner]) * columns + tx0[owner] + j % span[owner]
+    order = np.argsort(tiles, kind='stable')
+    tiles, members = tiles[order], visible[owner[order]]
+    result = {}
+    starts = np.flatnonzero(np.r_[True, tiles[1:] != tiles[:-1]]) if len(tiles) else []
+    for start, end in zip(starts, list(starts[1:]) + [len(tiles)]):
+        row, column = divmod(int(tiles[start]), columns)
+        rect = (column * tile_width, row * tile_height,
+                min((column + 1) * tile_width, width), min((row + 1) * tile_height, height))
+        result[rect] = members[start:end]
+    return result
+
+
+# 工作进程中映射的共享画布，画布重置后共享内存改变时重新映射
+_tile_memory = None
+_tile_canvas = None
+
+
+def _tile_canvas_of(name, shape):
+    global _tile_memory, _tile_canvas
+    if _tile_memory is None or _tile_memory.name != name:
+        if _tile_memory is not None:
+            _tile_canvas = None
+            _tile_memory.close()
+        _tile_memory = shared_memory.SharedMemory(name=name)
+        _tile_canvas = np.ndarray(shape, np.uint8, buffer=_tile_memory.buf)
+    return _tile_canvas
+
+
+def _render_tile(name, shape, rect, store):
+    """在工作进程中将图块恢复为白色，再光栅化与之相交的图元，并只合成图块内的像素，图块之间互不重叠"""
+    canvas = _tile_canvas_of(name, shape)
+    x_min, y_min, x_max, y_max = rect
+    canvas[y_min:y_max, x_min:x_max] = 255
+    indices = np.arange(len(store))
+    composite(canvas, rasterize_items(store, indices, rect), store.rgb(indices), rect)
+
+
+def render_tiled(pool, memory, shape, store, tiles, rects):
+    """由进程池并行重绘共享内存中画布的若干图块
+
+    每个图块只写入自己范围内的像素，跨越图块边界的图元在各图块中分别裁去图块外的部分，
+    图块内仍按绘制顺序覆盖，因此结果与单进程绘制逐像素相同。
+    每个任务只传递该图块中图元的紧凑副本，传递的数据量与重绘的图块相关，而与图元总数无关。
+
+    :param pool: (ProcessPoolExecutor) 进程池
+    :param memory: (shared_memory.SharedMemory) 存放画布的共享内存
+    :param shape: (tuple of int: (height, width, 3)) 画布形状
+    :param store: (cg_store.PrimitiveStore) 图元存储
+    :param tiles: (dict of tuple: np.ndarray) bin_items的结果：图块 -> 按绘制顺序排列的图元下标
+    :param rects: (list of tuple: [(x_min, y_min, x_max, y_max), ...]) 需要重绘的图块
+    """
+    empty = np.empty(0, np.int64)
+    # 覆盖图元多的图块先提交，减少最后只剩一个进程在工作的时间
+    order = sorted(rects, key=lambda rect: -len(tiles.get(rect, empty)))
+    futures = [pool.submit(_render_tile, memory.name, shape, rect, store.copy(tiles.get(rect, empty)))
+               for rect in order]
+    for future in futures:
+        future.result()
+
+
+def render_snapshot(width, height, store, paths, verbose=False):
+    """在工作进程中按快照完整绘制一次画布，并保存到各个路径
+
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :param store: (cg_store.PrimitiveStore) 图元存储的快照
+    :param paths: (list of string) 保存路径
+    :param verbose: (bool) 是否逐图元输出调试信息
+    """
+    renderer = Renderer(width, height, verbose=verbose)
+    renderer.load(store)
+    for path in paths:
+        renderer.save(path)
+
+
+class Interpreter:
+    """
+    指令解释器：依次执行cg_parser产生的指令记录，可由脚本文件驱动，也可直接在程序中调用
+
+    jobs > 1 时每次saveCanvas只对图元存储做快照，光栅化和编码交给进程池，解释器继续执行后续指令。
+    给定profile时按阶段统计主进程的耗时：解析、变换、修改图元存储、光栅化、合成、编码和写出。
+    """
+    def __init__(self, output_dir, verbose=False, jobs=1, tile_jobs=1, tile_size=1024,
+                 memory_budget=None, framebuffer_dir=None, image_format='bmp', profile=None):
+        self.output_dir = output_dir
+        self.verbose = verbose
+        self.image_format = image_format
+        if memory_budget is not None:
+            self.renderer = MemmapRenderer(verbose=verbose, budget=memory_budget, directory=framebuffer_dir)
+        elif tile_jobs > 1:
+            self.renderer = TiledRenderer(verbose=verbose, jobs=tile_jobs, tile_size=tile_size)
+        else:
+            self.renderer = Renderer(verbose=verbose)
+        self.profile = profile  # Profile，None为不计时
+        if profile is not None:
+            self.renderer.profile = profile
+        self.pen_color = 0      # 打包后的画笔颜色 0xRRGGBB
+        self.pool = ProcessPoolExecutor(jobs) if jobs > 1 else None
+        self.max_pending = 2 * jobs     # 同时排队的快照数上限，避免快照堆积占用内存
+        self.pending = []       # 尚未完成的保存任务
+        self.writers = {}       # 保存路径 -> 最近一次写入它的任务，保证同名文件按指令顺序写入
+        self.staged = None      # 尚未提交的快照 (width, height, store, paths)，图元修改前提交
+        self.groups = {}        # 图元组ID -> 组内图元的下标数组，重置画布时清空
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """提交剩余快照，等待所有保存任务完成并释放渲染器"""
+        self.renderer.close()
+        if self.pool is None:
+            return
+        try:
+            self._submit()
+            for future in self.pending:
+                future.result()
+        finally:
+            self.pool.shutdown()
+        self.pending = []
+        self.writers = {}
+
+    def _submit(self):
+        """将暂存的快照提交给进程池"""
+        if self.staged is None:
+            return
+        width, height, store, paths = self.staged
+        self.staged = None
+        for path in paths:
+            if path in self.writers:
+                self.writers[path].result()
+        while len(self.pending) >= self.max_pending:
+            self.pending.pop(0).result()
+        future = self.pool.submit(render_snapshot, width, height, store, paths, self.verbose)
+        self.pending.append(future)
+        for path in paths:
+            self.writers[path] = future
+
+    @property
+    def store(self):
+        return self.renderer.store
+
+    def run(self, commands):
+        """执行一系列指令
+
+        :param commands: (iterable of namedtuple) cg_parser产生的指令记录
+        """
+        if self.profile is None:
+            for command in commands:
+                self.execute(command)
+            return
+        # 指令由生成器逐条解析，取下一条指令的时间即解析时间
+        commands = iter(commands)
+        while True:
+            with self.profile.phase('parse'):
+                command = next(commands, None)
+            if command is None:
+                break
+            with self.profile.phase(self._phases.get(type(command), 'store')):
+                self.execute(command)
+
+    def execute(self, command):
+        """执行一条指令
+
+        :param command: (namedtuple) cg_parser产生的指令记录
+        """
+        self._handlers[type(command)](self, command)
+
+    def reset_canvas(self, command):
+        self._submit()
+        self.renderer.reset(command.width, command.height)
+        self.groups = {}
+
+    def save_canvas(self, command):
+        path = os.path.join(self.output_dir, command.name + '.' + self.image_format)
+        if self.pool is None:
+            self.renderer.save(path)
+        elif self.staged is not None:
+            # 两次保存之间没有修改，合并为同一个任务
+            self.staged[3].append(path)
+        else:
+            renderer = self.renderer
+            self.staged = (renderer.width, renderer.height, renderer.store.copy(), [path])
+
+    def set_color(self, command):
+        self.pen_color = cg_store.pack_rgb((command.r, command.g, command.b))
+
+    def draw(self, command):
+        self._submit()
+        index = self.store.set(command.item_id, command.item_type, command.p_list, command.algorithm, self.pen_color)
+        self.renderer.mark([index])
+
+    def _modify(self, item_id):
+        """准备修改图元：先提交暂存的快照，再返回图元下标"""
+        index = self.store.index[item_id]
+        self._submit()
+        self.renderer.mark([index])
+        return index
+
+    def translate(self, command):
+        self.store.translate(self._modify(command.item_id), command.dx, command.dy)
+
+    def rotate(self, command):
+        self.store.rotate(self._modify(command.item_id), command.x, command.y, command.r)
+
+    def scale(self, command):
+        self.store.scale(self._modify(command.item_id), command.x, command.y, command.s)
+
+    def clip(self, command):
+        index = self._modify(command.item_id)
+        self.store.set_points(index, alg.clip(self.store.p_list(index), command.x_min, command.y_min,
+                                              command.x_max, command.y_max, command.algorithm))
+
+    def clip_all(self, command):
+        """将所有线段裁剪到同一窗口，结果与逐条执行clip相同：完全位于窗口外的线段变为 [[0, 0], [0, 0]]，
+        仍保留在画布上，与GUI中裁剪全部线段的行为一致"""
+        store = self.store
+        count = len(store)
+        indices = np.flatnonzero((store.types[:count] == cg_store.TYPE_CODES['line']) & (store.lengths[:count] == 2))
+        if not len(indices):
+            return
+        self._submit()
+        self.renderer.mark(indices.tolist())
+        segments, _ = cg_store.clip_segments(store.points(indices), command.x_min, command.y_min,
+                                             command.x_max, command.y_max, command.algorithm)
+        store.set_points(indices, segments)
+
+    def group(self, command):
+        # 重复的ID只变换一次
+        item_ids = dict.fromkeys(command.item_ids)
+        self.groups[command.group_id] = np.array([self.store.index[item_id] for item_id in item_ids], np.int64)
+
+    def _modify_group(self, group_id):
+        """准备修改图元组：先提交暂存的快照，再返回组内图元的下标"""
+        indices = self.groups[group_id]
+        self._submit()
+        self.renderer.mark(indices.tolist())
+        return indices
+
+    def translate_group(self, command):
+        self.store.translate(self._modify_group(command.group_id), command.dx, command.dy)
+
+    def rotate_group(self, command):
+        self.store.rotate(self._modify_group(command.group_id), command.x, command.y, command.r)
+
+    def scale_group(self, command):
+        self.store.scale(self._modify_group(command.group_id), command.x, command.y, command.s)
+
+    _handlers = {
+        cg_parser.ResetCanvas: reset_canvas,
+        cg_parser.SaveCanvas: save_canvas,
+        cg_parser.SetColor: set_color,
+        cg_parser.Draw: draw,
+        cg_parser.Translate: translate,
+        cg_parser.Rotate: rotate,
+        cg_parser.Scale: scale,
+        cg_parser.Clip: clip,
+        cg_parser.ClipAll: clip_all,
+        cg_parser.Group: group,
+        cg_parser.TranslateGroup: translate_group,
+        cg_parser.RotateGroup: rotate_group,
+        cg_parser.ScaleGroup: scale_group,
+    }
+
+    # 计时时各指令计入的阶段，未列出的指令计入 'store'（修改图元存储和画布状态）；
+    # saveCanvas中的光栅化、合成、编码和写出另计，'save' 只包含其余部分
+    _phases = {
+        cg_parser.SaveCanvas: 'save',
+        cg_parser.Translate: 'transform',
+        cg_parser.Rotate: 'transform',
+        cg_parser.Scale: 'transform',
+        cg_parser.Clip: 'transform',
+        cg_parser.ClipAll: 'transform',
+        cg_parser.TranslateGroup: 'transform',
+        cg_parser.RotateGroup: 'transform',
+        cg_parser.ScaleGroup: 'transform',
+    }
+
+
 if __name__ == '__main__':
-    input_file = sys.argv[1]
-    output_dir = sys.argv[2]
-    os.makedirs(output_dir, exist_ok=True)
-
-    item_dict = {}
-    pen_color = np.zeros(3, np.uint8)
-    width = 0
-    height = 0
-
-    with open(input_file, 'r') as fp:
-        line = fp.readline()
-        while line:
-            line = line.strip().split(' ')
-            if line[0] == 'resetCanvas':
-                width = int(line[1])
-                height = int(line[2])
-                item_dict = {}
-            elif line[0] == 'saveCanvas':
-                save_name = line[1]
-                canvas = np.zeros([height, width, 3], np.uint8)
-                canvas.fill(255)
-                for item_type, p_list, algorithm, color in item_dict.values():
-                    if item_type == 'line':
-                        pixels = alg.draw_line(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[y, x] = color  # 根据Pillow版本而定，最终输出的视觉结果需要以画布左上角为坐标原点
-                        print('LINE drawn') # TODO: 调试辅助
-                    # TODO
-                    elif item_type == 'polygon':
-                        pixels = alg.draw_polygon(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[y, x] = color
-                        print('POLYGON drawn') 
-                    elif item_type == 'ellipse':
-                        pixels = alg.draw_ellipse(p_list)
-                        for x, y in pixels:
-                            canvas[y, x] = color
-                        print('ELLIPSE drawn')
-                    elif item_type == 'curve':
-                        pixels = alg.draw_curve(p_list, algorithm)
-                        for x, y in pixels:
-                            canvas[y, x] = color
-                        print('CURVE drawn')
-                Image.fromarray(canvas).save(os.path.join(output_dir, save_name + '.bmp'), 'bmp')
-            elif line[0] == 'setColor':
-                pen_color[0] = int(line[1])
-                pen_color[1] = int(line[2])
-                pen_color[2] = int(line[3])
-            elif line[0] == 'drawLine':
-                item_id = line[1]
-                x0 = int(line[2])
-                y0 = int(line[3])
-                x1 = int(line[4])
-                y1 = int(line[5])
-                algorithm = line[6]
-                item_dict[item_id] = ['line', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            # TODO
-            elif line[0] == 'drawPolygon':
-                item_id = line[1]
-                p_list = []
-                for i in range(2, len(line) - 1, 2): # 索引为2（第三个元素），步长为2（x, y）
-                    p_list.append([int(line[i]), int(line[i + 1])])
-                algorithm = line[-1] # 最后一个元素
-                item_dict[item_id] = ['polygon', p_list, algorithm, np.array(pen_color)]
-            elif line[0] == 'drawEllipse':
-                item_id = line[1]
-                x0 = int(line[2])
-                y0 = int(line[3])
-                x1 = int(line[4])
-                y1 = int(line[5])
-                algorithm = 'null'
-                item_dict[item_id] = ['ellipse', [[x0, y0], [x1, y1]], algorithm, np.array(pen_color)]
-            elif line[0] == 'drawCurve':
-                item_id = line[1]
-                p_list = []
-                for i in range(2, len(line) - 1, 2):
-                    p_list.append([int(line[i]), int(line[i + 1])])
-                algorithm = line[-1]
-                item_dict[item_id] = ['curve', p_list, algorithm, np.array(pen_color)]
-            elif line[0] == 'translate':
-                item_id = line[1]
-                dx = int(line[2])
-                dy = int(line[3])
-                item_type = item_dict[item_id][0]
-                p_list = item_dict[item_id][1]
-                algorithm = item_dict[item_id][2]
-                color = item_dict[item_id][3]
-                new_p_list = alg.translate(p_list, dx, dy)
-                item_dict[item_id] = [item_type, new_p_list, algorithm, color]
-            elif line[0] == 'rotate':
-                item_id = line[1]
-                x = int(line[2])
-                y = int(line[3])
-                r = int(line[4])
-                item_type = item_dict[item_id][0]
-                p_list = item_dict[item_id][1]
-                algorithm = item_dict[item_id][2]
-                color = item_dict[item_id][3]
-                new_p_list = alg.rotate(p_list, x, y, r)
-                item_dict[item_id] = [item_type, new_p_list, algorithm, color]
-            elif line[0] == 'scale':
-                item_id = line[1]
-                x = int(line[2])
-                y = int(line[3])
-                s = float(line[4])
-                item_type = item_dict[item_id][0]
-                p_list = item_dict[item_id][1]
-                algorithm = item_dict[item_id][2]
-                color = item_dict[item_id][3]
-                new_p_list = alg.scale(p_list, x, y, s)
-                item_dict[item_id] = [item_type, new_p_list, algorithm, color]
-            elif line[0] == 'clip':
-                item_id = line[1]
-                x0 = int(line[2])
-                y0 = int(line[3])
-                x1 = int(line[4])
-                y1 = int(line[5])
-                clip_algorithm = line[-1]
-                item_type = item_dict[item_id][0]
-                p_list = item_dict[item_id][1]
-                algorithm = item_dict[item_id][2]
-                color = item_dict[item_id][3]
-                new_p_list = alg.clip(p_list, x0, y0, x1, y1, clip_algorithm)
-                item_dict[item_id] = [item_type, new_p_list, algorithm, color]
-            line = fp.readline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='按指令文件绘制图元并保存画布')
+    parser.add_argument('input_file', help='指令文件，为 - 时读取标准输入')
+    parser.add_argument('output_dir', help='画布的保存目录')
+    parser.add_argument('-v', '--verbose', action='store_true', help='逐图元输出调试信息')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='并行保存画布的进程数，默认为1（串行）')
+    parser.add_argument('--tile-jobs', type=int, default=1, help='单幅画布分块并行绘制的进程数，默认为1（不分块）')
+    parser.add_argument('--tile-size', type=int, default=1024, help='分块绘制时的图块边长')
+    parser.add_argument('--memory-budget', type=int, help='外存模式：帧缓冲保存在文件中，按该内存上限（MB）分条带绘制和写出')
+    parser.add_argument('--framebuffer-dir', help='外存模式下帧缓冲文件所在目录，默认为系统临时目录')
+    parser.add_argument('--image-format', choices=sorted(cg_image.WRITERS), default='bmp',
+                        help='输出图像格式，默认为bmp；BMP文件不能超过4GB，超大画布请使用ppm')
+    parser.add_argument('--profile', help='将解析、变换、光栅化、合成、编码等各阶段的耗时以JSON格式写入该文件')
+    args = parser.parse_args()
+    if args.memory_budget is not None and args.tile_jobs > 1:
+        parser.error('--memory-budget 与 --tile-jobs 不能同时使用')
+    # 进程池中的快照总是由内存中的Renderer完整绘制，外存模式和分块绘制在其中都不起作用
+    if args.jobs > 1 and (args.memory_budget is not None or args.tile_jobs > 1):
+        parser.error('--jobs 不能与 --memory-budget 或 --tile-jobs 同时使用')
+    if args.profile and args.jobs > 1:
+        parser.error('--profile 只统计主进程的耗时，不能与 --jobs 同时使用')
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    memory_budget = args.memory_budget << 20 if args.memory_budget is not None else None
+    profile = Profile() if args.profile else None
+    with Interpreter(args.output_dir, verbose=args.verbose, jobs=args.jobs,
+                     tile_jobs=args.tile_jobs, tile_size=args.tile_size, memory_budget=memory_budget,
+                     framebuffer_dir=args.framebuffer_dir, image_format=args.image_format,
+                     profile=profile) as interpreter:
+        interpreter.run(cg_parser.parse_file(args.input_file))
+    if profile is not None:
+        profile.dump(args.profile)
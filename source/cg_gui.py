@@ -1,11 +1,18 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import os
 import sys
 import cg_algorithms as alg # 自定义的图形算法模块
+import cg_raster            # 基于NumPy的批量光栅化
+import cg_store             # 基于NumPy的批量几何变换
+import cg_spatial           # 图元包围盒的空间索引
+import numpy as np
 from typing import Optional # 类型提示：表示一个变量可能有值，也可能是None
 import math     # TODO
-import pickle   # TODO: 对象的序列化和反序列化（对象 <-> 字节流）
+import cg_scene             # 二进制场景文件
+import cg_journal           # 操作日志：自动保存与崩溃恢复
+import cg_cli               # 批量光栅化
 
 from PyQt5.QtWidgets import (
     QApplication,
@@ -14,29 +21,220 @@ from PyQt5.QtWidgets import (
     QGraphicsScene,
     QGraphicsView,
     QGraphicsItem,
-    QListWidget,
+    QListView,
     QHBoxLayout,
     QWidget,
     QStyleOptionGraphicsItem,
     QGraphicsRectItem, # TODO: 绘制矩形
+    QAbstractItemView,
+    QProgressDialog,
     QColorDialog, QInputDialog, QFileDialog, QMessageBox) # TODO: 弹出对话框的类
 # 用于绘图和事件处理
-from PyQt5.QtGui import QPainter, QMouseEvent, QColor, QKeySequence # TODO: 快捷键
+from PyQt5.QtGui import QPainter, QMouseEvent, QColor, QKeySequence, QPolygon, QPen # TODO: 快捷键
 # 用于定义矩形区域
-from PyQt5.QtCore import QRectF, Qt # TODO: Qt
+from PyQt5.QtCore import (
+    QRectF, Qt, QItemSelectionModel, # TODO: Qt
+    QAbstractListModel, QModelIndex, QItemSelection, # 图元列表的数据模型
+    QObject, QRunnable, QThreadPool, QTimer, QEventLoop, pyqtSignal, # 后台读写画布文件
+    QStandardPaths, QLockFile) # 操作日志与会话文件的位置和锁
+
+
+class ItemDict(dict):
+    """
+    图元ID -> 图元对象的字典，同时增量维护图元包围矩形的空间索引和图元 -> ID的反向映射，
+    点选和框选只需查询索引而不必遍历所有图元；图元的几何形状改变时由MyItem.invalidate通知更新索引
+    """
+    def __init__(self):
+        super().__init__()
+        self.index = cg_spatial.GridIndex()
+        self.ids = {}       # 图元对象 -> 图元ID
+        self.order = {}     # 图元ID -> 加入的序号，序号大的图元在上层
+        self.counter = 0
+        self.deferred = False   # 批量加入图元期间不更新空间索引，结束后由rebuild_index一次性重建
+
+    def __setitem__(self, item_id, item):
+        self._detach(item_id)
+        super().__setitem__(item_id, item)
+        # 值为None表示图元已被裁剪删除，只保留ID
+        if item is not None:
+            item.registry = self
+            self.ids[item] = item_id
+            self.order[item_id] = self.counter
+            self.counter += 1
+            self.refresh(item)
+
+    def __delitem__(self, item_id):
+        self._detach(item_id)
+        super().__delitem__(item_id)
+
+    def pop(self, item_id, *default):
+        self._detach(item_id)
+        return super().pop(item_id, *default)
+
+    def clear(self):
+        for item in self.ids:
+            item.registry = None
+        super().clear()
+        self.index.clear()
+        self.ids = {}
+        self.order = {}
+
+    def _detach(self, item_id):
+        """从索引和反向映射中移除图元"""
+        item = self.get(item_id)
+        if item is not None:
+            item.registry = None
+            self.ids.pop(item, None)
+        self.index.remove(item_id)
+        self.order.pop(item_id, None)
+
+    def refresh(self, item):
+        """图元的包围矩形改变后更新索引"""
+        if self.deferred:
+            return
+        rect = item.boundingRect()
+        if rect.isEmpty():
+            self.index.remove(self.ids[item])
+        else:
+            self.index.insert(self.ids[item], (rect.left(), rect.top(), rect.right(), rect.bottom()))
+
+    def rebuild_index(self):
+        """结束延迟，按全部图元当前的包围矩形一次性重建空间索引"""
+        self.deferred = False
+        self.index.clear()
+        for item in self.ids:
+            self.refresh(item)
+
+    def id_of(self, item):
+        """图元对象对应的ID，不是已登记的图元时返回None"""
+        return self.ids.get(item)
+
+    def hit_test(self, x, y, tolerance):
+        """点选：像素距离 (x, y) 不超过tolerance的图元中距离最近的一个，距离相同时取上层的图元
+
+        :param x: (float) 场景x坐标
+        :param y: (float) 场景y坐标
+        :param tolerance: (float) 允许的最大像素距离
+        :return: (string or None) 图元ID
+        """
+        best, best_key = None, None
+        for item_id in self.index.query_point(x, y, tolerance):
+            distance = self[item_id].distance(x, y)
+            if distance <= tolerance:
+                key = (distance, -self.order[item_id])
+                if best_key is None or key < best_key:
+                    best, best_key = item_id, key
+        return best
+
+    def query_rect(self, rect):
+        """框选：包围矩形与rect相交的图元
+
+        :param rect: (QRectF) 场景中的矩形
+        :return: (list of string) 按加入顺序排列的图元ID
+        """
+        hit = self.index.query_rect((rect.left(), rect.top(), rect.right(), rect.bottom()))
+        return sorted(hit, key=self.order.__getitem__)
+
+
+class ItemListModel(QAbstractListModel):
+    """
+    图元ID列表的数据模型：按加入顺序保存图元ID，并维护ID -> 行号的映射，查找行号为O(1)；
+    视图只在绘制可见行时通过data取文本，插入和删除按连续的行批量通知视图
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ids = []   # 行号 -> 图元ID
+        self.rows = {}  # 图元ID -> 行号
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.ids[index.row()]
+        return None
+
+    def __contains__(self, item_id):
+        return item_id in self.rows
+
+    def row_of(self, item_id):
+        """图元ID所在的行号，不在列表中时返回None"""
+        return self.rows.get(item_id)
+
+    def id_at(self, row):
+        return self.ids[row]
+
+    def append(self, ids):
+        """在末尾批量加入图元ID，已在列表中的ID被忽略
+
+        :param ids: (iterable of string) 图元ID
+        """
+        ids = [item_id for item_id in dict.fromkeys(ids) if item_id not in self.rows]
+        if not ids:
+            return
+        first = len(self.ids)
+        self.beginInsertRows(QModelIndex(), first, first + len(ids) - 1)
+        self.ids.extend(ids)
+        self.rows.update(zip(ids, range(first, first + len(ids))))
+        self.endInsertRows()
+
+    def remove(self, ids):
+        """批量删除图元ID，不在列表中的ID被忽略
+
+        :param ids: (iterable of string) 图元ID
+        """
+        rows = sorted(set(self.rows[item_id] for item_id in ids if item_id in self.rows))
+        if not rows:
+            return
+        # 从后往前按连续的行删除，每段只通知视图一次
+        for first, last in reversed(row_runs(rows)):
+            self.beginRemoveRows(QModelIndex(), first, last)
+            for item_id in self.ids[first:last + 1]:
+                del self.rows[item_id]
+            del self.ids[first:last + 1]
+            self.endRemoveRows()
+        # 只有第一个被删除的行之后的行号需要更新
+        self.rows.update(zip(self.ids[rows[0]:], range(rows[0], len(self.ids))))
+
+    def clear(self):
+        self.beginResetModel()
+        self.ids = []
+        self.rows = {}
+        self.endResetModel()
+
+
+def row_runs(rows):
+    """把升序的行号划分为连续的段
+
+    :param rows: (list of int) 升序排列、互不相同的行号
+    :return: (list of tuple: [(first, last), ...]) 各段的首行和末行（包含）
+    """
+    runs = []
+    for row in rows:
+        if runs and runs[-1][1] == row - 1:
+            runs[-1] = (runs[-1][0], row)
+        else:
+            runs.append((row, row))
+    return runs
 
 
 class MyCanvas(QGraphicsView):
     """
     画布窗体类，继承自QGraphicsView，采用QGraphicsView、QGraphicsScene、QGraphicsItem的绘图框架
     """
+    hit_tolerance = 3   # 点选时允许的最大像素距离
+    preview_drag = True # 拖动时以折线预览图元，松开鼠标后再按所选算法精确光栅化
     # 构造函数，初始化画布，设置初始状态和变量
     def __init__(self, *args):
         super().__init__(*args) # 初始化父类
         self.main_window = None # 指向主窗口的引用
-        self.list_widget = None # 指向列表控件的引用，用于显示图元ID
-        self.item_dict = {}     # 存储图元对象的字典
+        self.list_view = None   # 指向列表视图的引用，用于显示图元ID
+        self.list_model = None  # 列表视图的数据模型（ItemListModel）
+        self.syncing_list = False   # 正在把选择同步到列表视图，此时忽略列表的选择改变信号
+        self.journal = None     # 操作日志（cg_journal.Journal），图元改变时追加记录
+        self.item_dict = ItemDict()     # 存储图元对象的字典，附带空间索引
         self.selected_id = ''   # 当前选中的图元ID
+        self.selected_ids = []  # 所有选中的图元ID（多选），包含selected_id
         
         self.status = ''            # 当前画布的状态
         self.temp_algorithm = ''    # 临时存储算法名称
@@ -49,8 +247,48 @@ class MyCanvas(QGraphicsView):
         self.origin_p_list = None   
         self.origin_pos = None
         self.trans_center = None
+        # 多选变换：被变换的图元、变换前所有顶点拼接成的数组及各图元的分界位置
+        self.group_items = []
+        self.origin_points = None
+        self.origin_splits = None
+        # 拖动中以预览方式绘制的图元
+        self.preview_items = []
+        # 框选
+        self.rubber_band = None
+        self.rubber_origin = None
+        self.rubber_base = []
         # CLIP
         self.border = None
+        # 不再整体重绘场景：图元改变时自行使其新旧包围矩形失效，视图只重绘这些区域
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.bulk_load = True       # 打开画布时暂停场景索引和列表更新，全部加入后一次性重建
+        self.bulk_loading = False
+
+    def begin_bulk_load(self, count):
+        """开始批量加入图元：固定场景BSP树的深度，暂停图元空间索引的更新和画布的重绘，列表在结束时一次性加入
+
+        :param count: (int) 将要加入的图元数
+        """
+        if not self.bulk_load or self.bulk_loading:
+            return
+        self.bulk_loading = True
+        # BSP树深度为0（默认）时Qt按约log2(图元数)自动选取，图元数每翻一番就整体重建一次，跨越大片区域的图元
+        # 还会被登记到数以千计的叶节点中；按约log4(最终图元数)固定深度后，新图元只在下一次事件循环中增量登记。
+        # 不切换为NoIndex：场景一旦用过NoIndex，切换回BSP索引后每次重绘仍会遍历全部图元
+        count += len(self.item_dict.ids)
+        self.scene().setBspTreeDepth(max((count.bit_length() + 1) // 2, 5))
+        self.item_dict.deferred = True
+        self.setUpdatesEnabled(False)
+
+    def end_bulk_load(self):
+        """结束批量加入：一次性重建空间索引，把新图元一次性加入列表，恢复重绘"""
+        if not self.bulk_loading:
+            return
+        self.bulk_loading = False
+        self.item_dict.rebuild_index()
+        # 每次插入行都会使列表视图重新布局全部行，因此只插入一次
+        self.list_model.append(self.item_dict.ids.values())
+        self.setUpdatesEnabled(True)
 
     # TODO: 开始绘制不同类型的图形（设置当前状态&算法）
     def start_draw_line(self, algorithm, item_id):
@@ -106,46 +344,131 @@ class MyCanvas(QGraphicsView):
         self.status = 'clip'
         self.temp_algorithm = algorithm
         self.set_transform_status('clip', selected_only=True)
+    def start_clip_all(self, algorithm):
+        self.set_transform_status('clip_all')
+        self.temp_algorithm = algorithm
     # TODO: 刪除
     def start_delete(self):
-        if not self.selected_id:
+        if not self.selected_ids:
             return  # 提前退出，减少嵌套
 
         self.main_window.isModified = True  # 标记数据被修改
-        # 获取选中元素的对象
-        temp_id = self.selected_id
-        self.temp_item = self.item_dict[temp_id]
-        # 清除场景中的图形对象和内部引用
+        # 删除所有选中的图元
+        temp_ids = self.selected_ids
         self.clear_selection()
-        self.scene().removeItem(self.temp_item)
-        del self.item_dict[temp_id]
+        for temp_id in temp_ids:
+            # 清除场景中的图形对象和内部引用
+            self.scene().removeItem(self.item_dict[temp_id])
+            del self.item_dict[temp_id]
+        # 从列表中批量移除对应项
+        self.list_model.remove(temp_ids)
+        self.record(temp_ids)
         self.temp_item = None
-        # 从列表控件中移除对应项
-        items = self.list_widget.findItems(temp_id, Qt.MatchContains)
-        if items:  # 确保找到了匹配项
-            self.list_widget.takeItem(self.list_widget.row(items[0]))
-        # 刷新场景  
-        self.updateScene([self.sceneRect()])
+
+    def record(self, ids):
+        """把图元的当前状态追加到操作日志；已不存在（或被裁剪删除）的图元记为删除
+
+        :param ids: (list of string) 改变了的图元ID
+        """
+        if self.journal is None:
+            return
+        for item_id in ids:
+            item = self.item_dict.get(item_id)
+            if item is None:
+                self.journal.delete(item_id)
+            else:
+                self.journal.set(item_id, item.item_type, item.p_list, item.algorithm, item.color.getRgb()[:3])
 
     # TODO: 選擇模式
     def start_select(self):
         self.status = 'selecting'     
      
     def clear_selection(self):
-        if self.selected_id != '':
-            self.item_dict[self.selected_id].selected = False
-            self.selected_id = ''
+        self.set_selection([])
+
+    def set_selection(self, ids, sync_list=True):
+        """设置选中的图元
+
+        :param ids: (list of string) 选中的图元ID，最后一个为当前图元（selected_id）
+        :param sync_list: (bool) 是否同步列表控件中的选中项
+        """
+        ids = [item_id for item_id in dict.fromkeys(ids) if self.item_dict.get(item_id) is not None]
+        for item_id in self.selected_ids:
+            item = self.item_dict.get(item_id)
+            if item is not None:
+                item.selected = False
+                item.update()
+        self.selected_ids = ids
+        self.selected_id = ids[-1] if ids else ''
+        for item_id in ids:
+            self.item_dict[item_id].selected = True
+            self.item_dict[item_id].update()
+        if sync_list and self.list_view is not None:
+            # 同步列表时不再触发list_selection_changed
+            self.syncing_list = True
+            model = self.list_model
+            rows = sorted(row for row in map(model.row_of, ids) if row is not None)
+            selection = QItemSelection()
+            for first, last in row_runs(rows):
+                selection.select(model.index(first), model.index(last))
+            selection_model = self.list_view.selectionModel()
+            selection_model.select(selection, QItemSelectionModel.ClearAndSelect)
+            current = model.row_of(self.selected_id)
+            if current is not None:
+                selection_model.setCurrentIndex(model.index(current), QItemSelectionModel.NoUpdate)
+            self.syncing_list = False
 
     def selection_changed(self, selected):
+        if selected not in self.item_dict:
+            return
         self.main_window.statusBar().showMessage('图元选择： %s' % selected)
-        if self.selected_id != '':
-            self.item_dict[self.selected_id].selected = False
-            self.item_dict[self.selected_id].update()
-        self.selected_id = selected
-        self.item_dict[selected].selected = True
-        self.item_dict[selected].update()
+        self.set_selection([selected])
         self.status = ''
-        self.updateScene([self.sceneRect()])
+
+    def list_selection_changed(self):
+        """列表视图中的选中项改变（支持Ctrl/Shift多选）"""
+        if self.syncing_list:
+            return
+        selection_model = self.list_view.selectionModel()
+        # 按选中的区间整段取ID，不逐行构造QModelIndex
+        ids = [item_id for selected in selection_model.selection()
+               for item_id in self.list_model.ids[selected.top():selected.bottom() + 1]]
+        current = selection_model.currentIndex()
+        if current.isValid() and selection_model.isSelected(current):
+            # 当前项作为selected_id
+            current_id = self.list_model.id_at(current.row())
+            ids.remove(current_id)
+            ids.append(current_id)
+        self.main_window.statusBar().showMessage('图元选择： %s' % ', '.join(ids))
+        self.set_selection(ids, sync_list=False)
+        self.status = ''
+
+    def begin_group_transform(self):
+        """记录所有选中图元变换前的顶点，拖动时对它们整体做一次向量化变换"""
+        self.group_items = [self.item_dict[item_id] for item_id in self.selected_ids]
+        lengths = [len(item.p_list) for item in self.group_items]
+        points = [point for item in self.group_items for point in item.p_list]
+        self.origin_points = np.array(points, np.int64).reshape(-1, 2)
+        self.origin_splits = np.cumsum(lengths)[:-1]
+
+    def apply_group_transform(self, points):
+        """将变换后的顶点数组按图元拆分，写回各图元"""
+        for item, part in zip(self.group_items, np.split(points, self.origin_splits)):
+            item.p_list = part.tolist()
+
+    def begin_preview(self, items):
+        """拖动开始：图元改为低细节预览，拖动中每帧不再精确光栅化"""
+        if not self.preview_drag:
+            return
+        for item in items:
+            item.preview = True
+        self.preview_items.extend(items)
+
+    def end_preview(self):
+        """拖动结束：恢复精确绘制，每个图元只在此时光栅化一次"""
+        for item in self.preview_items:
+            item.preview = False
+        self.preview_items = []
 
     def mousePressEvent(self, event: QMouseEvent) -> None:
         # 獲取點擊位置
@@ -157,6 +480,7 @@ class MyCanvas(QGraphicsView):
         if self.status in ['line', 'polygon', 'ellipse']:
             self.temp_item = MyItem(self.temp_id, self.status, [[x, y], [x, y]], self.temp_algorithm,self.temp_color)
             self.scene().addItem(self.temp_item)
+            self.begin_preview([self.temp_item])
             self.main_window.isModified = True
         elif self.status == 'curve':
             if self.temp_item is None:
@@ -164,27 +488,37 @@ class MyCanvas(QGraphicsView):
                 self.temp_item = MyItem(self.temp_id, self.status, [[x, y]], self.temp_algorithm, self.temp_color)
                 self.scene().addItem(self.temp_item)
             else:
-                self.temp_item.p_list.append([x, y])
+                self.temp_item.p_list = self.temp_item.p_list + [[x, y]]
+            self.begin_preview([self.temp_item])
             self.main_window.isModified = True
 
         elif self.status == 'selecting':
-            selected = self.scene().itemAt(pos, QTransform())
-            if selected in self.item_dict.values():  # 检查是否选中了有效图元
-                if self.selected_id:  # 如果之前有选中其他图元，取消其选中状态
-                    previous_item = self.item_dict[self.selected_id]
-                    previous_item.selected = False
-                    previous_item.update()
-                # 更新当前选中图元的状态
-                self.selected_id = next(key for key, value in self.item_dict.items() if value == selected)
-                selected.selected = True
-                selected.update()
-                self.main_window.list_widget.setCurrentRow(int(self.selected_id))
+            # 按住Shift或Ctrl时在原有选择上增减
+            additive = bool(event.modifiers() & (Qt.ShiftModifier | Qt.ControlModifier))
+            base = self.selected_ids if additive else []
+            # 由空间索引找到附近的图元，再按到像素的距离精确判断
+            item_id = self.item_dict.hit_test(pos.x(), pos.y(), self.hit_tolerance)
+            if item_id is not None:
+                if additive and item_id in base:
+                    self.set_selection([i for i in base if i != item_id])
+                else:
+                    self.set_selection(base + [item_id])
+            else:
+                # 点击空白处开始框选
+                self.rubber_origin = pos
+                self.rubber_base = base
+                self.rubber_band = QGraphicsRectItem(QRectF(pos, pos))
+                self.rubber_band.setPen(QPen(QColor(0, 120, 215), 0, Qt.DashLine))
+                self.scene().addItem(self.rubber_band)
 
         elif self.status in ["translate", "rotate", "scale", "clip"]:
             if self.selected_id:
                 self.main_window.isModified = True
                 self.temp_item = self.item_dict[self.selected_id]
                 self.origin_p_list = self.temp_item.p_list
+                if self.status != 'clip':
+                    self.begin_group_transform()
+                    self.begin_preview(self.group_items)
         
             if self.status == "translate":
                 self.origin_pos = pos
@@ -195,7 +529,8 @@ class MyCanvas(QGraphicsView):
                     self.origin_pos = pos
             elif self.status == "clip" and self.temp_item.item_type == 'line':  # 針對綫段
                 self.origin_pos = pos
-        self.updateScene([self.sceneRect()])
+        elif self.status == 'clip_all':
+            self.origin_pos = pos
         super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event: QMouseEvent) -> None:
@@ -205,41 +540,48 @@ class MyCanvas(QGraphicsView):
         # TODO
         if self.temp_item:
             if self.status in ['line', 'ellipse']:
-                # 更新最后一个点
-                self.temp_item.p_list[1] = [x, y]
+                # 更新最后一个点（整体赋值以使图元缓存失效）
+                self.temp_item.p_list = [self.temp_item.p_list[0], [x, y]]
             elif self.status in ['polygon', 'curve']:
                 # 更新多边形或曲线的最后一个点
-                self.temp_item.p_list[-1] = [x, y]
+                self.temp_item.p_list = self.temp_item.p_list[:-1] + [[x, y]]
             elif self.status == "translate" and self.selected_id:
-                # 平移
+                # 平移（所有选中图元一起）
                 dx, dy = x - int(self.origin_pos.x()), y - int(self.origin_pos.y())
-                self.temp_item.p_list = alg.translate(self.origin_p_list, dx, dy)
+                self.apply_group_transform(cg_store.translate_points(self.origin_points, dx, dy))
             elif self.status == "rotate" and self.selected_id and self.trans_center and self.origin_pos:
-                # 旋转
+                # 旋转（绕旋转中心）
                 r = self.calculate_rotation(x, y)
-                self.temp_item.p_list = alg.rotate(self.origin_p_list, 0, 0, r)
+                self.apply_group_transform(cg_store.rotate_points(
+                    self.origin_points,
+                    int(self.trans_center.x()),
+                    int(self.trans_center.y()),
+                    r
+                ))
             elif self.status == "scale" and self.selected_id and self.trans_center and self.origin_pos:
                 # 缩放
                 scale_factor = self.calculate_scale_factor(x, y)
                 if scale_factor is not None:
-                    self.temp_item.p_list = alg.scale(
-                        self.origin_p_list,
+                    self.apply_group_transform(cg_store.scale_points(
+                        self.origin_points,
                         int(self.trans_center.x()),
                         int(self.trans_center.y()),
                         scale_factor
-                    )
-            elif self.status == "clip" and self.selected_id and self.origin_pos and self.temp_item.item_type == "line":
-                # 裁剪
-                x_min, x_max = sorted([int(self.origin_pos.x()), x])
-                y_min, y_max = sorted([int(self.origin_pos.y()), y])
-                if self.border is None:
-                    self.border = QGraphicsRectItem(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
-                    self.scene().addItem(self.border)
-                    self.border.setPen(QColor(0, 255, 255))
-                else:
-                    self.border.setRect(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
+                    ))
+        if (self.status == "clip" and self.temp_item and self.selected_id and self.origin_pos
+                and self.temp_item.item_type == "line") or (self.status == "clip_all" and self.origin_pos):
+            # 裁剪
+            x_min, x_max = sorted([int(self.origin_pos.x()), x])
+            y_min, y_max = sorted([int(self.origin_pos.y()), y])
+            if self.border is None:
+                self.border = QGraphicsRectItem(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
+                self.scene().addItem(self.border)
+                self.border.setPen(QColor(0, 255, 255))
+            else:
+                self.border.setRect(x_min - 1, y_min - 1, x_max - x_min + 2, y_max - y_min + 2)
+        if self.status == 'selecting' and self.rubber_band is not None:
+            self.rubber_band.setRect(QRectF(self.rubber_origin, pos).normalized())
 
-        self.updateScene([self.sceneRect()])
         super().mouseMoveEvent(event)
 
     def calculate_rotation(self, current_x, current_y):
@@ -286,31 +628,48 @@ class MyCanvas(QGraphicsView):
         return None
 
     def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        self.end_preview()
         if self.status == 'line':
             self.item_dict[self.temp_id] = self.temp_item
-            self.list_widget.addItem(self.temp_id)
+            self.list_model.append([self.temp_id])
+            self.record([self.temp_id])
             self.finish_draw()
         # TODO
         if self.status == 'polygon':
             self.item_dict[self.temp_id] = self.temp_item
-            self.list_widget.addItem(self.temp_id)
+            self.list_model.append([self.temp_id])
+            self.record([self.temp_id])
             self.finish_draw()
             #pass
         if self.status == 'ellipse':
             self.item_dict[self.temp_id] = self.temp_item
-            self.list_widget.addItem(self.temp_id)
+            self.list_model.append([self.temp_id])
+            self.record([self.temp_id])
             self.finish_draw()
         elif self.status == 'curve':
             self.item_dict[self.temp_id] = self.temp_item
-            if not self.list_widget.findItems(self.temp_id, Qt.MatchContains):
-                self.list_widget.addItem(self.temp_id)
+            self.list_model.append([self.temp_id])
+            self.record([self.temp_id])
+        elif self.status in ('translate', 'rotate', 'scale') and self.origin_pos is not None and self.group_items:
+            # 拖动结束时记录变换后的所有选中图元
+            self.record([item.id for item in self.group_items])
         elif self.status == 'clip':
             pos = self.mapToScene(event.localPos().toPoint())
             x, y = int(pos.x()), int(pos.y())
             if self.selected_id and self.temp_item.item_type == 'line':
                 self.handle_clip_event(x, y)
-        # 更新场景并传递事件
-        self.updateScene([self.sceneRect()])
+        elif self.status == 'clip_all' and self.origin_pos is not None:
+            pos = self.mapToScene(event.localPos().toPoint())
+            self.handle_clip_all_event(int(pos.x()), int(pos.y()))
+        elif self.status == 'selecting' and self.rubber_band is not None:
+            # 选中包围矩形与选框相交的所有图元
+            rect = self.rubber_band.rect()
+            self.scene().removeItem(self.rubber_band)
+            self.rubber_band = None
+            # 未拖动的单击落在空白处时不选中任何图元，否则会选中包围矩形盖住该点的大图元
+            hit = self.item_dict.query_rect(rect) if rect.width() or rect.height() else []
+            self.set_selection(self.rubber_base + hit)
+        # 传递事件
         super().mouseReleaseEvent(event)
 
     def handle_clip_event(self, x, y):
@@ -334,11 +693,13 @@ class MyCanvas(QGraphicsView):
             self.temp_item.setVisible(False)
             self.temp_item.p_list = []
             self.item_dict[self.selected_id] = None  # 清空图形项引用
+            self.record([self.selected_id])
             self.clear_selection()  # 清除选择状态
         else:
             # 更新图形项为裁剪后的点列表，并确保其可见
             self.temp_item.p_list = temp_p_list
             self.temp_item.setVisible(True)
+            self.record([self.selected_id])
 
         # 移除裁剪框
         if self.border is not None:
@@ -346,6 +707,31 @@ class MyCanvas(QGraphicsView):
             self.border = None
 
 
+    def handle_clip_all_event(self, x, y):
+        """将所有线段一次性裁剪到裁剪框内，结果与逐条裁剪相同：完全位于框外的线段与alg.clip一样
+        变为 [[0, 0], [0, 0]] 而不删除，与命令行的clipAll一致"""
+        origin_x, origin_y = int(self.origin_pos.x()), int(self.origin_pos.y())
+        self.origin_pos = None
+        if self.border is not None:
+            self.scene().removeItem(self.border)
+            self.border = None
+        if origin_x == x or origin_y == y:
+            return
+        lines = [(item_id, item) for item_id, item in self.item_dict.items()
+                 if item is not None and item.item_type == 'line' and len(item.p_list) == 2]
+        if not lines:
+            return
+        self.main_window.isModified = True
+        segments, _ = cg_store.clip_segments([item.p_list for _, item in lines],
+                                             origin_x, origin_y, x, y, self.temp_algorithm)
+        changed = []
+        for (item_id, item), p_list in zip(lines, segments.tolist()):
+            if item.p_list != p_list:
+                item.p_list = p_list
+                changed.append(item_id)
+        self.record(changed)
+
+
 class MyItem(QGraphicsItem):
     """
     自定义图元类，继承自QGraphicsItem
@@ -362,45 +748,134 @@ class MyItem(QGraphicsItem):
         super().__init__(parent)
         self.id = item_id           # 图元ID
         self.item_type = item_type  # 图元类型，'line'、'polygon'、'ellipse'、'curve'等
-        self.p_list = p_list        # 图元参数
-        self.algorithm = algorithm  # 绘制算法，'DDA'、'Bresenham'、'Bezier'、'B-spline'等
+        self._p_list = p_list       # 图元参数
+        self._algorithm = algorithm # 绘制算法，'DDA'、'Bresenham'、'Bezier'、'B-spline'等
         self.selected = False
-        self.color = color  # TODO
+        self._color = color  # TODO
+        # 缓存：光栅化结果（一次drawPoints绘制）与包围矩形，仅在p_list或algorithm改变时失效
+        self._points = None
+        self._pixels = None         # 光栅化结果的NumPy数组，用于点选时计算像素距离
+        self._points_rect = None    # 光栅化时的可见区域（场景矩形），场景大小改变时缓存也失效
+        self._bounding_rect = None
+        self.registry = None        # 登记了该图元的ItemDict，几何形状改变时通知其更新空间索引
+        self._preview = False       # 拖动中以低细节的折线预览，不做精确光栅化
+        self._preview_points = None
+        # 绘制时需要option.exposedRect，以便只绘制需要重绘的区域内的像素
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    # 修改p_list、algorithm、color时需整体赋值（而非原地修改列表），以便使缓存失效
+    @property
+    def p_list(self):
+        return self._p_list
+
+    @p_list.setter
+    def p_list(self, p_list):
+        self._p_list = p_list
+        self.invalidate()
+
+    @property
+    def algorithm(self):
+        return self._algorithm
+
+    @algorithm.setter
+    def algorithm(self, algorithm):
+        self._algorithm = algorithm
+        self.invalidate()
+
+    @property
+    def preview(self):
+        return self._preview
+
+    @preview.setter
+    def preview(self, preview):
+        if preview != self._preview:
+            self._preview = preview
+            self.invalidate()
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, color):
+        # 颜色只影响画笔，光栅化结果与包围矩形仍然有效
+        self._color = color
+        self.update()
+
+    def invalidate(self):
+        """丢弃光栅化缓存和包围矩形缓存"""
+        self.prepareGeometryChange()
+        self._points = None
+        self._pixels = None
+        self._preview_points = None
+        self._bounding_rect = None
+        if self.registry is not None:
+            self.registry.refresh(self)
+        self.update()
+
+    def points(self) -> QPolygon:
+        """返回缓存的光栅化结果，缓存为空时重新光栅化；只生成场景矩形内的部分"""
+        rect = None
+        if self.scene() is not None:
+            scene_rect = self.scene().sceneRect().toAlignedRect()
+            rect = (scene_rect.left(), scene_rect.top(), scene_rect.right() + 1, scene_rect.bottom() + 1)
+        if self._points is None or self._points_rect != rect:
+            self._points_rect = rect
+            pixels = cg_raster.rasterize(self.item_type, self._p_list, self._algorithm, rect)
+            self._pixels = pixels
+            self._points = to_polygon(pixels)
+        return self._points
+
+    def set_pixels(self, pixels, rect, bounding_rect=None):
+        """填入预先光栅化的结果（如在后台线程中批量光栅化），首次绘制时不必再光栅化
+
+        :param pixels: (np.ndarray of int32, shape (M, 2)) 可见区域内的像素坐标
+        :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 光栅化时的可见区域，须与场景矩形一致
+        :param bounding_rect: (QRectF) 预先算出的包围矩形，与calculate_bounding_rect()的结果相同
+        """
+        self._points_rect = rect
+        self._pixels = pixels
+        self._points = to_polygon(pixels)
+        if bounding_rect is not None:
+            self._bounding_rect = bounding_rect
+
+    def preview_points(self) -> QPolygon:
+        """返回缓存的预览折线，缓存为空时重新计算"""
+        if self._preview_points is None:
+            self._preview_points = to_polygon(
+                cg_raster.preview_polyline(self.item_type, self._p_list, self._algorithm))
+        return self._preview_points
+
+    def distance(self, x, y):
+        """点 (x, y) 到图元最近像素的距离"""
+        self.points()
+        return cg_spatial.pixel_distance(self._pixels, x, y)
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = ...) -> None:
         painter.setPen(self.color)
-        if self.item_type == 'line':
-            item_pixels = alg.draw_line(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))   # red
-                painter.drawRect(self.boundingRect())
-        # TODO
-        elif self.item_type == 'polygon':
-            item_pixels = alg.draw_polygon(self.p_list, self.algorithm)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0)) 
-                painter.drawRect(self.boundingRect())
-        elif self.item_type == 'ellipse':
-            item_pixels = alg.draw_ellipse(self.p_list)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect())
-        elif self.item_type == 'curve':
-            item_pixels = alg.draw_curve(self.p_list, self.algorithm)
-            #painter.setPen(self.color)
-            for p in item_pixels:
-                painter.drawPoint(*p)
-            if self.selected:
-                painter.setPen(QColor(255, 0, 0))
-                painter.drawRect(self.boundingRect())
+        if self._preview:
+            # 预览：由Qt绘制折线
+            painter.drawPolyline(self.preview_points())
+        else:
+            points = self.points()
+            exposed = option.exposedRect
+            if not exposed.contains(self.boundingRect()):
+                # 只绘制需要重绘的区域内的像素（像素 (x, y) 覆盖 [x, x+1) x [y, y+1)）
+                pixels = self._pixels
+                inside = ((pixels[:, 0] + 1 > exposed.left()) & (pixels[:, 0] < exposed.right())
+                          & (pixels[:, 1] + 1 > exposed.top()) & (pixels[:, 1] < exposed.bottom()))
+                points = to_polygon(pixels[inside])
+            painter.drawPoints(points)
+        if self.selected:
+            painter.setPen(QColor(255, 0, 0))   # red
+            painter.drawRect(self.boundingRect())
 
     def boundingRect(self) -> QRectF:
+        if self._bounding_rect is None:
+            self._bounding_rect = self.calculate_bounding_rect()
+        return self._bounding_rect
+
+    def calculate_bounding_rect(self) -> QRectF:
         # TODO
         # Helper function to compute bounding box
         # 计算图元点的最小值和最大值，返回包围矩形的四个角坐标
@@ -415,6 +890,10 @@ class MyItem(QGraphicsItem):
                 y_max = max(y_max, y)
             return x_min, y_min, x_max, y_max
 
+        # 裁剪后没有剩余的点
+        if not self.p_list:
+            return QRectF()
+
         if self.item_type == 'line':
             x0, y0 = self.p_list[0]
             x1, y1 = self.p_list[1]
@@ -437,11 +916,151 @@ class MyItem(QGraphicsItem):
         return QRectF(x_min - 1, y_min - 1, w + 2, h + 2)
 
 
+def to_polygon(pixels) -> QPolygon:
+    """把像素坐标数组转换为QPolygon：直接写入QPolygon的内存（QPoint为两个int），避免逐点构造QPoint
+
+    :param pixels: (np.ndarray of int, shape (M, 2)) 像素坐标
+    :return: (QPolygon) 包含M个点的多边形
+    """
+    polygon = QPolygon(len(pixels))
+    if len(pixels):
+        buffer = polygon.data()
+        buffer.setsize(pixels.nbytes)
+        np.frombuffer(buffer, np.int32)[:] = pixels.ravel()
+    return polygon
+
+
+SCENE_SUFFIX = '.cgs'
+SCENE_FILTER = '场景文件 (*.cgs);;旧版画布文件 (*.bmp);;所有文件 (*)'
+# 应用名，默认的状态目录为应用数据目录下的同名目录
+APP_NAME = 'cg_demo'
+# 保存未命名画布的操作日志和会话文件的目录，可由该环境变量指定
+STATE_DIR_ENV = 'CG_STATE_DIR'
+# 状态目录中尚未保存为文件的画布：从不写入快照，只有操作日志
+UNTITLED_NAME = 'untitled' + SCENE_SUFFIX
+# 状态目录中记录当前画布对应的场景文件的会话文件，启动时据此重建上次的画布
+SESSION_NAME = 'session'
+
+
+def default_state_dir():
+    """状态目录：环境变量CG_STATE_DIR，未设置时为本应用的数据目录
+
+    不依赖QApplication是否设置了应用名（未设置时AppDataLocation就是公共数据目录本身），
+    等同于应用名为APP_NAME时的QStandardPaths.AppDataLocation
+    """
+    return os.environ.get(STATE_DIR_ENV) or os.path.join(
+        QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation), APP_NAME)
+
+
+# 打开画布时每次事件循环加入场景的图元个数，批次之间界面可以重绘和响应取消
+LOAD_BATCH = 2000
+# 后台任务超过该时间（毫秒）仍未完成时才显示进度对话框
+PROGRESS_DELAY = 500
+
+
+class TaskCancelled(Exception):
+    """后台任务被用户取消"""
+
+
+class TaskSignals(QObject):
+    """后台任务的信号；在工作线程中发出，以排队连接交给界面线程处理"""
+    progress = pyqtSignal(int, int)     # 已完成数、总数
+    finished = pyqtSignal(object)       # 任务函数的返回值
+    failed = pyqtSignal(str)            # 错误信息
+    cancelled = pyqtSignal()
+
+
+class Task(QRunnable):
+    """
+    在QThreadPool中执行的后台任务：任务函数只读写文件和纯数据，不访问任何界面对象，
+    通过report报告进度，用户取消后在下一次报告时抛出TaskCancelled结束
+    """
+    def __init__(self, func):
+        """
+
+        :param func: (callable) 在工作线程中执行的函数，参数为任务本身
+        """
+        super().__init__()
+        self.setAutoDelete(False)   # 由Python端持有引用
+        self.func = func
+        self.signals = TaskSignals()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def report(self, done, total):
+        """报告进度；任务已被取消时抛出TaskCancelled"""
+        if self.cancelled:
+            raise TaskCancelled
+        self.signals.progress.emit(done, total)
+
+    def track(self, items):
+        """逐个产生items中的元素，每cg_journal.PROGRESS_STEP个报告一次进度"""
+        total = len(items)
+        for done, item in enumerate(items):
+            if done % cg_journal.PROGRESS_STEP == 0:
+                self.report(done, total)
+            yield item
+        self.report(total, total)
+
+    def run(self):
+        try:
+            result = self.func(self)
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+def read_canvas(path, size, task):
+    """在工作线程中读取画布并批量光栅化全部图元：场景文件读取快照并重放操作日志，旧版pickle文件经过安全检查后导入
+
+    :param path: (string) 文件路径，MainWindow.untitled_scene表示未保存为文件的画布（只有操作日志）
+    :param size: (tuple of int: (width, height)) 文件中没有画布大小时使用的大小
+    :param task: (Task) 当前任务，用于报告进度和响应取消
+    :return: (tuple: (items, pixels, bounds, size, pending, legacy, corrupt)) 图元字典（图元ID -> (item_type, p_list,
+             algorithm, (r, g, b))，按绘制顺序排列）、与之一一对应的光栅化结果和控制点包围盒（左闭右开）、
+             画布大小（未知时为None）、未保存的修改条数、是否为旧版文件、
+             操作日志无法读取时被移开后的路径（否则为None）
+    """
+    legacy = os.path.exists(path) and not cg_scene.is_scene_file(path)
+    corrupt = None
+    if legacy:
+        items = {item_id: (item_type, p_list, algorithm, color)
+                 for item_id, item_type, p_list, algorithm, color in task.track(cg_scene.import_pickle(path))}
+        scene_size, pending = None, 0
+    else:
+        try:
+            items, scene_size, pending = cg_journal.load(path, task.report)
+        except cg_journal.JournalError:
+            # 日志损坏时移到一旁，只读取快照，否则每次打开（包括启动时恢复）都会失败
+            corrupt = cg_journal.quarantine(cg_journal.journal_path(path))
+            items, scene_size, pending = cg_journal.load(path, task.report)
+    store = cg_store.PrimitiveStore()
+    for item_id, (item_type, p_list, algorithm, _) in items.items():
+        store.set(item_id, item_type, p_list, algorithm, 0)
+    # 按场景矩形光栅化，结果与MyItem.points()的缓存一致
+    rect = (0, 0) + tuple(scene_size or size)
+    pixels = []
+    for start in range(0, len(store), cg_journal.PROGRESS_STEP):
+        task.report(start, len(store))
+        pixels += cg_cli.rasterize_items(store, np.arange(start, min(start + cg_journal.PROGRESS_STEP, len(store))), rect)
+    return items, pixels, cg_cli.item_bounds(store).tolist(), scene_size, pending, legacy, corrupt
+
+
 class MainWindow(QMainWindow):
     """
     主窗口类
     """
-    def __init__(self):
+    task_done = pyqtSignal()    # 后台任务（包括打开画布时的分批加入）结束
+
+    def __init__(self, state_dir=None):
+        """
+        :param state_dir: (string) 保存未命名画布的操作日志和会话文件的目录，None为default_state_dir()
+        """
         super().__init__()
         self.item_cnt = 0   # 图元计数器
 
@@ -451,10 +1070,26 @@ class MainWindow(QMainWindow):
         self.height = 600   # 画布的高度
         self.isModified = False    # 画布是否被修改
         self.opened_filename = ''   # 当前打开的文件名
+        self.journal = None         # 当前画布的操作日志，日志被另一个窗口占用时为None
+        self.journal_lock = None    # 当前日志的锁（QLockFile），防止多个窗口同时写入同一个日志
+        self.locked_scene = None    # journal_lock对应的场景文件路径
+        self.state_dir = state_dir or default_state_dir()
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.untitled_scene = os.path.join(self.state_dir, UNTITLED_NAME)
+        self.session_file = os.path.join(self.state_dir, SESSION_NAME)
+        self.task = None            # 正在执行的后台读写任务
+        self.task_aborted = None    # 任务失败（参数为错误信息）或被取消（参数为None）时在界面线程中调用
+        self.progress_dialog = None
         
-        # 使用QListWidget来记录已有的图元，并用于选择图元。注：这是图元选择的简单实现方法，更好的实现是在画布中直接用鼠标选择图元
-        self.list_widget = QListWidget(self)
-        self.list_widget.setMinimumWidth(200)
+        # 使用QListView来记录已有的图元，并用于选择图元；数据放在ItemListModel中，视图只绘制可见的行
+        self.list_model = ItemListModel(self)
+        self.list_view = QListView(self)
+        self.list_view.setModel(self.list_model)
+        self.list_view.setMinimumWidth(200)
+        # 所有行高度相同，视图不必逐行计算尺寸
+        self.list_view.setUniformItemSizes(True)
+        # 支持Ctrl/Shift多选
+        self.list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
 
         # 使用QGraphicsView作为画布
         self.scene = QGraphicsScene(self)
@@ -462,7 +1097,8 @@ class MainWindow(QMainWindow):
         self.canvas_widget = MyCanvas(self.scene, self)
         self.canvas_widget.setFixedSize(600, 600)
         self.canvas_widget.main_window = self
-        self.canvas_widget.list_widget = self.list_widget
+        self.canvas_widget.list_view = self.list_view
+        self.canvas_widget.list_model = self.list_model
 
         # 设置菜单栏
         menubar = self.menuBar()
@@ -500,6 +1136,9 @@ class MainWindow(QMainWindow):
         clip_menu = edit_menu.addMenu('裁剪')
         clip_cohen_sutherland_act = clip_menu.addAction('Cohen-Sutherland')
         clip_liang_barsky_act = clip_menu.addAction('Liang-Barsky')
+        clip_menu.addSeparator()
+        clip_all_cohen_sutherland_act = clip_menu.addAction('全部线段 (Cohen-Sutherland)')
+        clip_all_liang_barsky_act = clip_menu.addAction('全部线段 (Liang-Barsky)')
         # TODO：删除
         delete_act = edit_menu.addAction('删除')
         
@@ -529,20 +1168,271 @@ class MainWindow(QMainWindow):
         scale_act.triggered.connect(self.scale_action)
         clip_cohen_sutherland_act.triggered.connect(self.clip_cohen_sutherland_action)
         clip_liang_barsky_act.triggered.connect(self.clip_liang_barsky_action)
+        clip_all_cohen_sutherland_act.triggered.connect(lambda: self.clip_all_action('Cohen-Sutherland'))
+        clip_all_liang_barsky_act.triggered.connect(lambda: self.clip_all_action('Liang-Barsky'))
         delete_act.triggered.connect(self.delete_action)
         #
-        self.list_widget.currentTextChanged.connect(self.canvas_widget.selection_changed)
+        self.list_view.selectionModel().selectionChanged.connect(self.canvas_widget.list_selection_changed)
 
         # 设置主窗口的布局
         self.hbox_layout = QHBoxLayout()
         self.hbox_layout.addWidget(self.canvas_widget)
-        self.hbox_layout.addWidget(self.list_widget, stretch=1)
+        self.hbox_layout.addWidget(self.list_view, stretch=1)
         self.central_widget = QWidget()
         self.central_widget.setLayout(self.hbox_layout)
         self.setCentralWidget(self.central_widget)
         self.statusBar().showMessage('空闲')
         self.resize(600, 600)
-        self.setWindowTitle('CG Demo')
+        self.update_title()
+        self.restore_session()
+
+    def update_title(self, path=''):
+        """设置窗口标题：CG Demo，有对应的文件时加上文件名
+
+        :param path: (string) 当前画布的文件路径，空字符串表示没有对应的文件
+        """
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.setWindowTitle(f'CG Demo - {name}' if name else 'CG Demo')
+
+    def set_canvas_size(self, width, height):
+        self.width, self.height = width, height
+        self.scene.setSceneRect(0, 0, self.width, self.height)
+        self.canvas_widget.setFixedSize(self.width, self.height)
+
+    def lock_journal(self, scene_path):
+        """锁定场景文件对应的操作日志
+
+        :param scene_path: (string) 场景文件路径
+        :return: (QLockFile or None) 锁；已持有该日志的锁时返回它，日志被另一个窗口锁定时为None
+        """
+        if self.journal_lock is not None and self.locked_scene == scene_path:
+            return self.journal_lock
+        lock = QLockFile(cg_journal.journal_path(scene_path) + '.lock')
+        # 只在持有锁的进程已退出时才视为失效，不按持有时间判断
+        lock.setStaleLockTime(0)
+        return lock if lock.tryLock(0) else None
+
+    def use_journal(self, scene_path):
+        """切换到场景文件对应的操作日志，并记下当前的场景文件
+
+        日志被另一个窗口占用时本窗口不记录日志，修改只在保存时写入文件；日志文件头损坏时移到一旁，从空日志开始。
+        """
+        lock = self.lock_journal(scene_path)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.journal_lock is not None and self.journal_lock is not lock:
+            self.journal_lock.unlock()
+        self.journal_lock = lock
+        self.locked_scene = scene_path if lock is not None else None
+        self.canvas_widget.journal = None
+        if lock is None:
+            self.statusBar().showMessage('另一个窗口正在使用该画布的操作日志，本窗口的修改只在保存时写入文件')
+            return
+        path = cg_journal.journal_path(scene_path)
+        try:
+            self.journal = cg_journal.Journal(path)
+        except cg_journal.JournalError as e:
+            corrupt = cg_journal.quarantine(path)
+            self.journal = cg_journal.Journal(path)
+            QMessageBox.warning(self, '操作日志损坏', f'{e}\n已移至 {corrupt}，从空日志开始')
+        self.canvas_widget.journal = self.journal
+        # 未命名画布是默认恢复的对象，不必写会话文件
+        if scene_path != self.untitled_scene:
+            with open(self.session_file, 'w', encoding='utf-8') as fp:
+                fp.write(scene_path)
+        elif os.path.exists(self.session_file):
+            os.remove(self.session_file)
+
+    def populate(self, items, pixels, bounds, rect):
+        """把图元加入画布
+
+        :param items: (dict) 图元ID -> (item_type, p_list, algorithm, (r, g, b))，按绘制顺序排列
+        :param pixels: (list of np.ndarray) 与items一一对应的光栅化结果
+        :param bounds: (list of list of int) 与items一一对应的控制点包围盒 (x_min, y_min, x_max, y_max)，左闭右开
+        :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 光栅化时的可见区域
+        """
+        for (item_id, (item_type, p_list, algorithm, color)), item_pixels, (x_min, y_min, x_max, y_max) \
+                in zip(items.items(), pixels, bounds):
+            temp_item = MyItem(item_id, item_type, p_list, algorithm, QColor(*color))
+            # 与MyItem.calculate_bounding_rect相同：控制点包围盒向外扩展1个像素，没有控制点时为空矩形
+            bounding_rect = QRectF(x_min - 1, y_min - 1, x_max - x_min + 1, y_max - y_min + 1) if p_list else QRectF()
+            temp_item.set_pixels(item_pixels, rect, bounding_rect)
+            self.canvas_widget.scene().addItem(temp_item)  # 添加到画布
+            self.canvas_widget.item_dict[item_id] = temp_item  # 更新项目字典
+        # 一次性更新列表；批量加入时由end_bulk_load统一加入
+        if not self.canvas_widget.bulk_loading:
+            self.list_model.append(items)
+
+    def update_item_cnt(self):
+        # 新图元的编号接在已有的数字ID之后，避免与已有ID重复
+        self.item_cnt = max((int(item_id) + 1 for item_id in self.canvas_widget.item_dict if item_id.isdigit()),
+                            default=len(self.canvas_widget.item_dict))
+
+    def scene_items(self):
+        """按绘制顺序产生画布上的图元 (item_id, item_type, p_list, algorithm, (r, g, b))，被裁剪删除的图元除外"""
+        for item in self.canvas_widget.item_dict.values():
+            if item is not None:
+                yield item.id, item.item_type, item.p_list, item.algorithm, item.color.getRgb()[:3]
+
+    def start_task(self, label, func, finished, aborted):
+        """在线程池中执行后台任务，期间显示可取消的进度对话框，并禁止编辑画布
+
+        :param label: (string) 进度对话框的提示文字
+        :param func: (callable) 在工作线程中执行的函数，参数为任务本身
+        :param finished: (callable) 任务函数返回后在界面线程中以返回值为参数调用，需在处理完后调用end_task
+        :param aborted: (callable) 任务失败或被取消时在界面线程中调用，参数为错误信息或None
+        """
+        task = Task(func)
+        self.task, self.task_aborted = task, aborted
+        self.progress_dialog = QProgressDialog(label, '取消', 0, 0, self)
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(PROGRESS_DELAY)
+        self.progress_dialog.setAutoReset(False)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.canceled.connect(task.cancel)
+        # 对话框显示之前也不能修改画布
+        self.centralWidget().setEnabled(False)
+        self.menuBar().setEnabled(False)
+        task.signals.progress.connect(lambda done, total: self.task_progress(task, done, total))
+        task.signals.finished.connect(lambda result: self.task_finished(task, finished, result))
+        task.signals.failed.connect(lambda message: self.task_failed(task, message))
+        task.signals.cancelled.connect(lambda: self.task_failed(task, None))
+        QThreadPool.globalInstance().start(task)
+
+    def task_progress(self, task, done, total):
+        if task is self.task:
+            self.progress_dialog.setMaximum(total)
+            self.progress_dialog.setValue(done)
+
+    def task_finished(self, task, finished, result):
+        if task is not self.task:
+            return
+        if task.cancelled:
+            # 任务函数已经返回，但用户在结果送达之前取消了
+            self.task_failed(task, None)
+        else:
+            finished(result)
+
+    def task_failed(self, task, message):
+        """结束失败（message为错误信息）或被取消（message为None）的任务"""
+        if task is not self.task:
+            return
+        aborted = self.task_aborted
+        self.end_task()
+        aborted(message)
+
+    def end_task(self):
+        """关闭进度对话框并恢复编辑"""
+        self.task = self.task_aborted = None
+        self.progress_dialog.hide()
+        self.progress_dialog.deleteLater()
+        self.progress_dialog = None
+        self.centralWidget().setEnabled(True)
+        self.menuBar().setEnabled(True)
+        self.canvas_widget.end_bulk_load()
+        self.canvas_widget.setUpdatesEnabled(True)
+        self.task_done.emit()
+
+    def wait_task(self):
+        """等待正在执行的后台任务结束，等待期间照常处理事件"""
+        if self.task is None:
+            return
+        loop = QEventLoop()
+        self.task_done.connect(loop.quit)
+        loop.exec_()
+        self.task_done.disconnect(loop.quit)
+
+    def open_scene(self, path, title='文件读取错误'):
+        """在后台读取画布，读完后分批加入场景；失败或取消时清空画布
+
+        :param path: (string) 场景文件或旧版画布文件路径，self.untitled_scene表示未保存为文件的画布
+        :param title: (string) 出错时提示框的标题
+        """
+        def aborted(message):
+            self.reset_canvas_action(False)
+            if message is None:
+                self.statusBar().showMessage('已取消打开画布')
+            else:
+                QMessageBox.critical(self, title, f'打开文件时出错: {message}')
+
+        size = (self.width, self.height)
+        self.start_task('正在读取 %s' % path, lambda task: read_canvas(path, size, task),
+                        lambda result: self.fill_canvas(path, *result), aborted)
+
+    def fill_canvas(self, path, items, pixels, bounds, size, pending, legacy, corrupt):
+        """把后台读取的图元分批加入场景，每批之后回到事件循环"""
+        if size is not None:
+            self.set_canvas_size(*size)
+        self.progress_dialog.setLabelText('正在加入画布')
+        self.progress_dialog.setRange(0, len(items))
+        # 加入完成前不重绘画布，否则每批之后都要重绘已加入的全部图元；各索引在全部加入后一次性重建
+        self.canvas_widget.setUpdatesEnabled(False)
+        self.canvas_widget.begin_bulk_load(len(items))
+        rect = (0, 0, self.width, self.height)
+        ids = list(items)
+        batches = (({item_id: items[item_id] for item_id in ids[start:start + LOAD_BATCH]},
+                    pixels[start:start + LOAD_BATCH], bounds[start:start + LOAD_BATCH])
+                   for start in range(0, len(ids), LOAD_BATCH))
+
+        def next_batch():
+            if task is not self.task:
+                return
+            if task.cancelled:
+                self.task_failed(task, None)
+                return
+            batch = next(batches, None)
+            if batch is None:
+                self.canvas_opened(path, pending, legacy, corrupt)
+                return
+            self.populate(*batch, rect)
+            self.progress_dialog.setValue(len(self.canvas_widget.item_dict))
+            QTimer.singleShot(0, next_batch)
+
+        task = self.task
+        next_batch()
+
+    def canvas_opened(self, path, pending, legacy, corrupt):
+        self.update_item_cnt()
+        self.end_task()
+        if corrupt is not None:
+            QMessageBox.warning(self, '操作日志损坏', f'无法读取操作日志，已移至 {corrupt}，上次未保存的修改没有恢复')
+        if legacy:
+            # 旧版文件保存时需选择新的路径，不覆盖原文件；导入的图元记入未保存画布的日志
+            self.canvas_widget.record(list(self.canvas_widget.item_dict))
+        else:
+            self.use_journal(path)
+            if path != self.untitled_scene:
+                self.opened_filename = path
+        if path != self.untitled_scene:
+            self.update_title(path)
+        if pending and self.canvas_widget.item_dict:
+            # 最后一个保存点之后的记录视为未保存的修改
+            self.isModified = True
+            self.statusBar().showMessage('已从操作日志恢复 %d 条未保存的修改' % pending)
+        elif self.journal is not None or legacy:
+            # 日志被占用时保留use_journal的提示
+            self.statusBar().showMessage('空闲')
+
+    def restore_session(self):
+        """启动时在后台重建上次的画布：上次打开的场景文件（快照加日志），或未保存画布的日志；
+        日志正被另一个窗口使用时不恢复，从空画布开始"""
+        scene_path = self.untitled_scene
+        if os.path.exists(self.session_file):
+            with open(self.session_file, encoding='utf-8') as fp:
+                scene_path = fp.read().strip() or self.untitled_scene
+        if scene_path != self.untitled_scene and not os.path.exists(scene_path):
+            scene_path = self.untitled_scene
+        lock = self.lock_journal(scene_path)
+        if lock is None or scene_path == self.untitled_scene and not os.path.exists(cg_journal.journal_path(scene_path)):
+            if lock is not None:
+                lock.unlock()
+            self.use_journal(self.untitled_scene)
+            return
+        # 读取期间持有锁，读完后由use_journal接管
+        self.journal_lock = lock
+        self.locked_scene = scene_path
+        self.open_scene(scene_path, '恢复错误')
 
     #
     def get_id(self):
@@ -574,19 +1464,27 @@ class MainWindow(QMainWindow):
                     break
                     QMessageBox.warning(self, '无效输入', '高度必须在100到1000之间，请重新输入.')
         # 清除选择和项目
-        self.list_widget.clearSelection()
-        self.list_widget.clear()
+        self.list_view.clearSelection()
+        self.list_model.clear()
         self.canvas_widget.clear_selection()
         self.canvas_widget.item_dict.clear()
         self.canvas_widget.scene().clear()
+        # 丢弃已打开文件未保存的修改，之后的操作记入未保存画布的日志
+        if self.opened_filename and self.journal is not None:
+            self.journal.rollback()
+        self.use_journal(self.untitled_scene)
+        if self.journal is not None:
+            self.journal.clear()
         # 重置相关变量
         self.item_cnt = 0
         self.canvas_widget.status = ''
         self.opened_filename = ''
         self.isModified = False
+        self.update_title()
         # 设置场景矩形大小和画布尺寸
-        self.scene.setSceneRect(0, 0, self.width, self.height)
-        self.canvas_widget.setFixedSize(self.width, self.height)
+        self.set_canvas_size(self.width, self.height)
+        if self.journal is not None:
+            self.journal.reset(self.width, self.height)
 
     # TODO: 打开画布
     def open_canvas_action(self):
@@ -601,6 +1499,9 @@ class MainWindow(QMainWindow):
             reply = QMessageBox.question(self, '提示', '是否保存更改？', QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.Yes)
             if reply == QMessageBox.Yes:
                 self.save_canvas_action()  # 保存画布
+                self.wait_task()
+                if self.isModified:     # 保存失败或被取消
+                    return
             elif reply == QMessageBox.Cancel:
                 return
     
@@ -609,34 +1510,11 @@ class MainWindow(QMainWindow):
         self.statusBar().showMessage('打开画布')
 
         # 打开文件对话框，选择文件
-        path, _ = QFileDialog.getOpenFileName(self, caption='打开画布', filter='BitMap文件 (*.bmp)')
+        path, _ = QFileDialog.getOpenFileName(self, caption='打开画布', filter=SCENE_FILTER)
     
-        # 检查路径是否为空
+        # 检查路径是否为空；场景文件读取快照并重放操作日志，上次异常退出前未保存的修改也一并恢复
         if path != '':
-            try:
-                # 打开文件并读取内容
-                with open(path, 'rb') as fr:
-                    # 假设文件是使用pickle序列化的
-                    open_list = pickle.load(fr)
-
-                    # 处理文件中的每个项
-                    for item in open_list:
-                        color = QColor(item[4][0], item[4][1], item[4][2])
-                        temp_item = MyItem(item[0], item[1], item[2], item[3], color)
-                        self.canvas_widget.scene().addItem(temp_item)  # 添加到画布
-                        self.list_widget.addItem(item[0])  # 更新列表
-                        self.canvas_widget.item_dict[item[0]] = temp_item  # 更新项目字典
-
-                # 更新项计数
-                self.item_cnt = len(open_list)
-
-                # 设置窗口标题
-                self.opened_filename = path  # 更新当前文件路径
-                name = self.opened_filename.split('/')[-1].split('.')[0]  # 提取文件名
-                self.setWindowTitle(f'MYCG - {name}')  # 更新窗口标题
-
-            except Exception as e:
-                QMessageBox.critical(self, '文件读取错误', f'打开文件时出错: {e}')
+            self.open_scene(path)
 
     # TODO: 保存画布
     def save_canvas_action(self):
@@ -646,40 +1524,52 @@ class MainWindow(QMainWindow):
 
         self.statusBar().showMessage('保存画布')
 
-        # 保存的项目列表
-        save_list = []
-
-        # 构建保存的数据
-        for item in self.canvas_widget.item_dict.values():
-            save_list.append([item.id, item.item_type, item.p_list, item.algorithm, item.color.getRgb()])
-
-        # 如果没有打开文件（即是新画布），需要保存到新路径
-        if self.opened_filename == '':
-            path, _ = QFileDialog.getSaveFileName(self, caption='保存画布', filter='BitMap文件 (*.bmp)')
-
-            if path != '':
-                try:
-                    # 保存到选定路径
-                    with open(path, 'wb') as fw:
-                        pickle.dump(save_list, fw)
-                    self.opened_filename = path
-                    self.isModified = False
-
-                    # 设置窗口标题
-                    name = self.opened_filename.split('/')[-1].split('.')[0]
-                    self.setWindowTitle(f'CG Demo - {name}')
-
-                except Exception as e:
-                    QMessageBox.critical(self, '保存错误', f'保存文件时出错: {e}')
-
-        else:   
-            # 如果已打开文件，直接保存到原文件
+        path = self.opened_filename
+        if path == '':
+            # 如果没有打开文件（即是新画布），需要保存到新路径：写入完整的快照，之后从空日志开始
+            path, _ = QFileDialog.getSaveFileName(self, caption='保存画布', filter=SCENE_FILTER)
+            if path == '':
+                return
+            if '.' not in path.split('/')[-1]:
+                path += SCENE_SUFFIX
+        elif self.journal is not None and not self.journal.needs_compaction(path):
+            # 修改已经记在日志中，只需追加保存点并落盘
             try:
-                with open(self.opened_filename, 'wb') as fw:
-                    pickle.dump(save_list, fw)
-                self.isModified = False
+                self.journal.commit()
             except Exception as e:
                 QMessageBox.critical(self, '保存错误', f'保存文件时出错: {e}')
+                return
+            self.canvas_saved(path)
+            return
+
+        # 新路径或日志已比快照还大时，在后台写入新的快照；图元在界面线程中取出，工作线程只处理纯数据
+        items = list(self.scene_items())
+        width, height = self.width, self.height
+
+        def saved(_):
+            if path != self.opened_filename:
+                if self.journal is not None:
+                    self.journal.clear()
+                self.use_journal(path)
+            if self.journal is not None:
+                self.journal.clear()
+            self.end_task()
+            self.canvas_saved(path)
+
+        def aborted(message):
+            if message is None:
+                self.statusBar().showMessage('已取消保存画布')
+            else:
+                QMessageBox.critical(self, '保存错误', f'保存文件时出错: {message}')
+
+        self.start_task('正在保存 %s' % path, lambda task: cg_scene.save(path, task.track(items), width, height),
+                        saved, aborted)
+
+    def canvas_saved(self, path):
+        self.opened_filename = path
+        self.isModified = False
+        self.update_title(path)
+        self.statusBar().showMessage('已保存')
 
     # TODO: 設置畫筆顔色
     def set_pen_action(self):
@@ -692,32 +1582,32 @@ class MainWindow(QMainWindow):
     def line_naive_action(self):
         self.canvas_widget.start_draw_line('Naive', self.get_id())
         self.statusBar().showMessage('Naive算法绘制线段')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def line_DDA_action(self):
         self.canvas_widget.start_draw_line('DDA', self.get_id())
         self.statusBar().showMessage('DDA算法绘制线段')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def line_bresenham_action(self):
         self.canvas_widget.start_draw_line('Bresenham', self.get_id())
         self.statusBar().showMessage('Bresenham算法绘制线段')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def polygon_DDA_action(self):
         self.canvas_widget.start_draw_polygon('DDA', self.get_id())
         self.statusBar().showMessage('DDA算法绘制多边形')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def polygon_bresenham_action(self):
         self.canvas_widget.start_draw_polygon('Bresenham', self.get_id())
         self.statusBar().showMessage('Bresenham算法绘制多边形')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def ellipse_action(self):
         self.canvas_widget.start_draw_ellipse(self.get_id())
         self.statusBar().showMessage('绘制椭圆')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def curve_bezier_action(self):
         # TODO: 避免不完整的圖形
@@ -725,14 +1615,14 @@ class MainWindow(QMainWindow):
             self.canvas_widget.finish_draw()
         self.canvas_widget.start_draw_curve('Bezier', self.get_id())
         self.statusBar().showMessage('Bezier曲线')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def curve_b_spline_action(self):
         if self.canvas_widget.status == 'polygon' or self.canvas_widget.status == 'curve':
             self.canvas_widget.finish_draw()
         self.canvas_widget.start_draw_curve('B-spline', self.get_id())
         self.statusBar().showMessage('B-spline曲线')
-        self.list_widget.clearSelection()
+        self.list_view.clearSelection()
         self.canvas_widget.clear_selection()
     def translate_action(self):
         self.canvas_widget.start_translate()
@@ -757,6 +1647,11 @@ class MainWindow(QMainWindow):
             self.canvas_widget.finish_draw()
         self.canvas_widget.start_clip('Liang-Barsky')
         self.statusBar().showMessage('Liang-Barsky裁剪')
+    def clip_all_action(self, algorithm):
+        if self.canvas_widget.status == 'polygon' or self.canvas_widget.status == 'curve':
+            self.canvas_widget.finish_draw()
+        self.canvas_widget.start_clip_all(algorithm)
+        self.statusBar().showMessage('%s裁剪全部线段' % algorithm)
     def delete_action(self):
         if self.canvas_widget.status == 'polygon' or self.canvas_widget.status == 'curve':
             self.canvas_widget.finish_draw()
@@ -767,6 +1662,7 @@ class MainWindow(QMainWindow):
 # 主程序入口
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    app.setApplicationName(APP_NAME)
     mw = MainWindow()
     mw.show()
     sys.exit(app.exec_())
\ No newline at end of file
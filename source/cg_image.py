@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+外存画布：帧缓冲保存在文件中，按行条带映射到内存，并以条带为单位流式写出BMP/PPM图像，
+内存占用只与条带大小有关，与画布大小无关
+"""
+
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+
+class Framebuffer:
+    """
+    以文件为后端的RGB帧缓冲，每次只通过np.memmap映射一段连续的行
+    """
+    def __init__(self, width, height, directory=None):
+        self.width = width
+        self.height = height
+        fd, self.path = tempfile.mkstemp(suffix='.rgb', dir=directory)
+        os.close(fd)
+        with open(self.path, 'r+b') as fp:
+            fp.truncate(height * width * 3)
+
+    def strip(self, y_min, y_max, mode='r+'):
+        """映射第 y_min 至 y_max - 1 行
+
+        :param y_min: (int) 起始行
+        :param y_max: (int) 结束行（不含）
+        :param mode: (string) 'r+' 可读写，'r' 只读
+        :return: (np.memmap of uint8, shape (y_max - y_min, width, 3)) 映射的行条带，释放引用后解除映射
+        """
+        return np.memmap(self.path, np.uint8, mode, offset=y_min * self.width * 3,
+                         shape=(y_max - y_min, self.width, 3))
+
+    def strips(self, rows):
+        """将画布从上到下划分为行条带
+
+        :param rows: (int) 每个条带的行数
+        :return: (list of tuple: [(y_min, y_max), ...]) 各条带的行范围，左闭右开
+        """
+        return [(y, min(y + rows, self.height)) for y in range(0, self.height, rows)]
+
+    def close(self):
+        """删除后端文件"""
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+
+def bmp_header(width, height):
+    """24位BMP的文件头与信息头，与Pillow的输出逐字节相同
+
+    :param width: (int) 图像宽度
+    :param height: (int) 图像高度
+    :return: (bytes) 54字节的文件头
+    """
+    stride = (width * 3 + 3) & ~3
+    image = stride * height
+    if 54 + image > 2 ** 32 - 1:
+        raise ValueError('File size is too large for the BMP format')
+    # 分辨率为96dpi，即3780像素/米
+    return (b'BM' + struct.pack('<III', 54 + image, 0, 54)
+            + struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, image, 3780, 3780, 0, 0))
+
+
+def write_bmp(fp, framebuffer, rows):
+    """从帧缓冲流式写出24位BMP：自下而上逐条带读取，转换为BGR并补齐每行的4字节对齐
+
+    :param fp: (file) 以二进制模式打开的输出文件
+    :param framebuffer: (Framebuffer) 帧缓冲
+    :param rows: (int) 每个条带的行数
+    """
+    width, height = framebuffer.width, framebuffer.height
+    fp.write(bmp_header(width, height))
+    stride = (width * 3 + 3) & ~3
+    for y_min, y_max in reversed(framebuffer.strips(rows)):
+        strip = framebuffer.strip(y_min, y_max, 'r')
+        out = np.zeros((y_max - y_min, stride), np.uint8)
+        out[:, :width * 3] = strip[::-1, :, ::-1].reshape(y_max - y_min, -1)
+        del strip
+        fp.write(out.tobytes())
+
+
+def write_ppm(fp, framebuffer, rows):
+    """从帧缓冲流式写出二进制PPM（P6），与Pillow的输出逐字节相同，且没有BMP的4GB大小限制
+
+    :param fp: (file) 以二进制模式打开的输出文件
+    :param framebuffer: (Framebuffer) 帧缓冲
+    :param rows: (int) 每个条带的行数
+    """
+    fp.write(b'P6\n%d %d\n255\n' % (framebuffer.width, framebuffer.height))
+    for y_min, y_max in framebuffer.strips(rows):
+        strip = framebuffer.strip(y_min, y_max, 'r')
+        fp.write(strip.tobytes())
+        del strip
+
+
+WRITERS = {
+    'bmp': write_bmp,
+    'ppm': write_ppm,
+}
@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+操作日志：画布的每次修改以一行JSON追加到日志文件末尾，保存时只需追加一条提交记录并落盘，
+耗时与上次保存以来的修改量成正比；日志过长时压缩为一份完整的场景文件（快照）并清空日志。
+打开场景时先读取快照，再依次重放日志中的记录即可恢复到最后一次修改后的状态。
+
+记录保存图元修改后的完整状态而不是操作本身，重复重放同一条记录结果不变，因此：
+压缩时先写快照再清空日志，两步之间崩溃只会留下已经包含在快照中的记录；
+写到一半的最后一行在读取时被丢弃。
+
+记录格式（每行一个JSON对象）：
+    {"journal": 1}                                                 文件头
+    {"op": "set", "id": ..., "type": ..., "p": [[x, y], ...], "alg": ..., "rgb": [r, g, b]}
+                                                                    新增或替换图元
+    {"op": "delete", "id": ...}                                     删除图元
+    {"op": "reset", "width": ..., "height": ...}                    清空画布并设置大小
+    {"op": "commit"}                                                保存点
+"""
+
+import os
+import json
+from collections import namedtuple
+
+import cg_scene
+
+
+VERSION = 1
+# 日志超过该大小且不小于快照时，保存时压缩为新的快照
+COMPACT_MIN_BYTES = 1 << 20
+# 各类记录必须包含的字段，缺少时视为损坏
+FIELDS = {
+    'set': ('id', 'type', 'p', 'alg', 'rgb'),
+    'delete': ('id',),
+    'reset': ('width', 'height'),
+    'commit': (),
+}
+# 读取快照时每读取这么多图元报告一次进度
+PROGRESS_STEP = 10000
+
+
+class JournalError(ValueError):
+    """日志文件头不合法、版本不受支持，或最后一行之前有损坏的记录"""
+
+
+# records为全部记录（不含文件头和保存点），pending为其中位于最后一个保存点之后的条数；
+# header、end、committed分别为文件头、最后一条完整记录、最后一个保存点之后的字节偏移
+Contents = namedtuple('Contents', ['records', 'pending', 'header', 'end', 'committed'])
+
+
+def _encode(record):
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def read(path):
+    """读取日志中的所有记录；只有没有换行符结尾的最后一行视为写到一半，将其丢弃
+
+    以换行符结尾的行都已完整写入，其中任何一行无法解析都说明文件已损坏，此时抛出JournalError，
+    而不是丢弃该行之后的记录（其中可能有已保存的修改），由调用者决定如何处置整个文件
+
+    :param path: (string) 日志文件路径
+    :return: (Contents) 日志内容；文件为空或文件头不完整时各项为空或0
+    """
+    records, header, end, committed, saved = [], 0, 0, 0, 0
+    with open(path, 'rb') as fp:
+        for number, line in enumerate(fp):
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise JournalError('操作日志第%d行损坏: %s' % (number + 1, path)) from None
+            end += len(line)
+            if number == 0:
+                if not isinstance(record, dict) or not isinstance(record.get('journal'), int):
+                    raise JournalError('不是操作日志文件: %s' % path)
+                if record['journal'] > VERSION:
+                    raise JournalError('操作日志版本 %s 高于支持的版本 %d' % (record['journal'], VERSION))
+                header = committed = end
+                continue
+            if not isinstance(record, dict) or any(key not in record for key in FIELDS.get(record.get('op'), ())):
+                raise JournalError('操作日志第%d行损坏: %s' % (number + 1, path))
+            if record.get('op') == 'commit':
+                committed = end
+                saved = len(records)
+            else:
+                records.append(record)
+    return Contents(records, len(records) - saved, header, end, committed)
+
+
+def apply(records, items):
+    """把记录依次应用到图元字典上
+
+    :param records: (list of dict) 日志记录
+    :param items: (dict) 图元ID -> (item_type, p_list, algorithm, (r, g, b))，按绘制顺序排列，原地修改
+    :return: (tuple of int or None) 最后一条reset记录给出的画布大小 (width, height)，没有时为None
+    """
+    size = None
+    for record in records:
+        op = record.get('op')
+        if op == 'set':
+            items[record['id']] = (record['type'], record['p'], record['alg'], tuple(record['rgb']))
+        elif op == 'delete':
+            items.pop(record['id'], None)
+        elif op == 'reset':
+            items.clear()
+            size = (record['width'], record['height'])
+    return size
+
+
+class Journal:
+    """
+    以追加方式打开的日志文件；每条记录写入后立即交给操作系统，程序崩溃不会丢失，保存时再落盘。
+    文件不存在时直到写入第一条记录才创建，只打开而没有修改的画布不会留下日志文件
+    """
+    def __init__(self, path):
+        self.path = path
+        self.fp = None
+        self.header = self.committed = 0
+        if os.path.exists(path):
+            contents = read(path)
+            self.fp = open(path, 'r+b')
+            # 丢弃写到一半的最后一行，之后的记录接在最后一条完整记录后面
+            self.fp.truncate(contents.end)
+            self.fp.seek(contents.end)
+            self.header, self.committed = contents.header, contents.committed
+            if not contents.header:
+                self._write_header()
+
+    def _write_header(self):
+        self.fp.write(_encode({'journal': VERSION}))
+        self.fp.flush()
+        self.header = self.committed = self.fp.tell()
+
+    @property
+    def size(self):
+        """文件头之后的字节数"""
+        return self.fp.tell() - self.header if self.fp is not None else 0
+
+    @property
+    def pending(self):
+        """最后一个保存点之后是否还有记录"""
+        return self.fp is not None and self.fp.tell() > self.committed
+
+    def _append(self, record):
+        if self.fp is None:
+            # 只创建新文件，不会覆盖已有的日志（例如close之后误用）
+            self.fp = open(self.path, 'x+b')
+            self._write_header()
+        self.fp.write(_encode(record))
+        self.fp.flush()
+
+    def set(self, item_id, item_type, p_list, algorithm, color):
+        """记录新增或替换后的图元
+
+        :param item_id: (string) 图元ID
+        :param item_type: (string) 图元类型
+        :param p_list: (list of list of int) 控制点坐标列表
+        :param algorithm: (string) 绘制算法
+        :param color: (tuple of int: (r, g, b)) 颜色
+        """
+        self._append({'op': 'set', 'id': item_id, 'type': item_type, 'p': p_list, 'alg': algorithm,
+                      'rgb': list(color[:3])})
+
+    def delete(self, item_id):
+        self._append({'op': 'delete', 'id': item_id})
+
+    def reset(self, width, height):
+        self._append({'op': 'reset', 'width': width, 'height': height})
+
+    def commit(self):
+        """追加保存点并落盘"""
+        if self.fp is None:
+            return
+        if self.pending:
+            self._append({'op': 'commit'})
+        os.fsync(self.fp.fileno())
+        self.committed = self.fp.tell()
+
+    def rollback(self):
+        """丢弃最后一个保存点之后的记录"""
+        if self.fp is None:
+            return
+        self.fp.truncate(self.committed)
+        self.fp.seek(self.committed)
+
+    def clear(self):
+        """清空所有记录，只保留文件头"""
+        if self.fp is None:
+            return
+        self.fp.truncate(self.header)
+        self.fp.seek(self.header)
+        os.fsync(self.fp.fileno())
+        self.committed = self.header
+
+    def needs_compaction(self, snapshot_path):
+        """日志是否已超过压缩阈值：大于COMPACT_MIN_BYTES且不小于快照文件"""
+        snapshot = os.path.getsize(snapshot_path) if os.path.exists(snapshot_path) else 0
+        return self.size >= max(COMPACT_MIN_BYTES, snapshot)
+
+    def compact(self, snapshot_path, items, width=0, height=0):
+        """把当前的完整状态写为快照，然后清空日志
+
+        :param snapshot_path: (string) 快照（场景文件）路径
+        :param items: (iterable of tuple: (item_id, item_type, p_list, algorithm, (r, g, b))) 按绘制顺序排列的图元
+        :param width: (int) 画布宽度
+        :param height: (int) 画布高度
+        """
+        cg_scene.save(snapshot_path, items, width, height)
+        self.clear()
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+
+def journal_path(scene_path):
+    """场景文件对应的日志文件路径"""
+    return scene_path + '.journal'
+
+
+def quarantine(path):
+    """将无法读取的日志移到一旁（加后缀 .corrupt，覆盖之前移开的文件），之后可在原路径从空日志开始
+
+    :param path: (string) 日志文件路径
+    :return: (string) 移动后的路径
+    """
+    corrupt_path = path + '.corrupt'
+    os.replace(path, corrupt_path)
+    return corrupt_path
+
+
+def load(scene_path, progress=None):
+    """读取快照并重放其日志
+
+    :param scene_path: (string) 场景文件路径；文件不存在时从空画布开始重放
+    :param progress: (callable) 读取快照时调用 progress(已读取数, 总数) 报告进度，可抛出异常中止读取
+    :return: (tuple: (items, size, pending)) 图元字典（图元ID -> (item_type, p_list, algorithm, (r, g, b))，
+             按绘制顺序排列）、画布大小 (width, height)（未知时为None）、重放的记录中位于最后一个保存点之后的条数
+    """
+    items, size = {}, None
+    if os.path.exists(scene_path):
+        with cg_scene.SceneFile(scene_path) as scene:
+            for index, (item_id, item_type, p_list, algorithm, color) in enumerate(scene):
+                if progress is not None and index % PROGRESS_STEP == 0:
+                    progress(index, len(scene))
+                items[item_id] = (item_type, p_list, algorithm, color)
+            if scene.width and scene.height:
+                size = (scene.width, scene.height)
+    path = journal_path(scene_path)
+    if not os.path.exists(path):
+        return items, size, 0
+    contents = read(path)
+    size = apply(contents.records, items) or size
+    return items, size, contents.pending
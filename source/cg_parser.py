@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+指令文件的流式解析：按块读取输入，逐条产生类型化的指令记录，内存占用与文件长度无关
+"""
+
+import sys
+import warnings
+from collections import namedtuple
+
+import numpy as np
+
+
+ResetCanvas = namedtuple('ResetCanvas', ['width', 'height'])
+SaveCanvas = namedtuple('SaveCanvas', ['name'])
+SetColor = namedtuple('SetColor', ['r', 'g', 'b'])
+# item_type 为 'line'、'polygon'、'ellipse' 或 'curve'，p_list 为 [[x0, y0], [x1, y1], ...]
+Draw = namedtuple('Draw', ['item_id', 'item_type', 'p_list', 'algorithm'])
+Translate = namedtuple('Translate', ['item_id', 'dx', 'dy'])
+Rotate = namedtuple('Rotate', ['item_id', 'x', 'y', 'r'])
+Scale = namedtuple('Scale', ['item_id', 'x', 'y', 's'])
+Clip = namedtuple('Clip', ['item_id', 'x_min', 'y_min', 'x_max', 'y_max', 'algorithm'])
+# 将所有线段裁剪到同一窗口
+ClipAll = namedtuple('ClipAll', ['x_min', 'y_min', 'x_max', 'y_max', 'algorithm'])
+# 图元组：一条指令变换组内的所有图元
+Group = namedtuple('Group', ['group_id', 'item_ids'])
+TranslateGroup = namedtuple('TranslateGroup', ['group_id', 'dx', 'dy'])
+RotateGroup = namedtuple('RotateGroup', ['group_id', 'x', 'y', 'r'])
+ScaleGroup = namedtuple('ScaleGroup', ['group_id', 'x', 'y', 's'])
+
+# 坐标文本超过该长度时用NumPy一次解析，短列表逐个int()更快
+FAST_PATH_LENGTH = 256
+# 默认每次读取的字符数
+CHUNK_SIZE = 1 << 20
+
+
+def parse_points(text):
+    """解析形如 "x0 y0 x1 y1 ..." 的坐标文本
+
+    :param text: (string) 以空白分隔的整数坐标
+    :return: (list of list of int: [[x0, y0], [x1, y1], ...]) 坐标列表
+    """
+    if len(text) > FAST_PATH_LENGTH:
+        with warnings.catch_warnings():
+            # 遇到非法字符时np.fromstring默认只给出警告并截断，升级为错误后抛出ValueError
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(text, dtype=np.int64, sep=' ')
+    else:
+        values = [int(value) for value in text.split()]
+    if len(values) % 2:
+        raise ValueError('坐标个数为奇数')
+    if isinstance(values, np.ndarray):
+        return values.reshape(-1, 2).tolist()
+    return [[values[i], values[i + 1]] for i in range(0, len(values), 2)]
+
+
+def _parse_segment(values):
+    x0, y0, x1, y1 = (int(value) for value in values)
+    return [[x0, y0], [x1, y1]]
+
+
+def parse_line(line):
+    """解析一行指令
+
+    :param line: (string) 一行指令文本
+    :return: (namedtuple or None) 指令记录；空行和无法识别的指令返回None
+    """
+    parts = line.split(None, 1)
+    if not parts:
+        return None
+    command, rest = parts[0], parts[1] if len(parts) > 1 else ''
+    if command in ('drawPolygon', 'drawCurve'):
+        # 坐标列表可能很长，不逐个拆分token，而是整段交给parse_points
+        item_id, rest = rest.split(None, 1)
+        fields = rest.rsplit(None, 1)
+        text, algorithm = fields if len(fields) == 2 else ('', fields[0])
+        item_type = 'polygon' if command == 'drawPolygon' else 'curve'
+        return Draw(item_id, item_type, parse_points(text), algorithm)
+    args = rest.split()
+    if command == 'resetCanvas':
+        return ResetCanvas(int(args[0]), int(args[1]))
+    elif command == 'saveCanvas':
+        return SaveCanvas(args[0])
+    elif command == 'setColor':
+        return SetColor(int(args[0]), int(args[1]), int(args[2]))
+    elif command == 'drawLine':
+        return Draw(args[0], 'line', _parse_segment(args[1:5]), args[5])
+    elif command == 'drawEllipse':
+        return Draw(args[0], 'ellipse', _parse_segment(args[1:5]), 'null')
+    elif command == 'translate':
+        return Translate(args[0], int(args[1]), int(args[2]))
+    elif command == 'rotate':
+        return Rotate(args[0], int(args[1]), int(args[2]), int(args[3]))
+    elif command == 'scale':
+        return Scale(args[0], int(args[1]), int(args[2]), float(args[3]))
+    elif command == 'clip':
+        return Clip(args[0], int(args[1]), int(args[2]), int(args[3]), int(args[4]), args[5])
+    elif command == 'clipAll':
+        return ClipAll(int(args[0]), int(args[1]), int(args[2]), int(args[3]), args[4])
+    elif command == 'group':
+        return Group(args[0], args[1:])
+    elif command == 'translateGroup':
+        return TranslateGroup(args[0], int(args[1]), int(args[2]))
+    elif command == 'rotateGroup':
+        return RotateGroup(args[0], int(args[1]), int(args[2]), int(args[3]))
+    elif command == 'scaleGroup':
+        return ScaleGroup(args[0], int(args[1]), int(args[2]), float(args[3]))
+    return None
+
+
+def iter_lines(fp, chunk_size=CHUNK_SIZE):
+    """按块读取文本并逐行产生，每次只在内存中保留一个块
+
+    :param fp: (file) 以文本模式打开的文件
+    :param chunk_size: (int) 每次读取的字符数
+    """
+    pending = ''
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def parse(fp, chunk_size=CHUNK_SIZE):
+    """流式解析指令文件
+
+    :param fp: (file) 以文本模式打开的文件
+    :param chunk_size: (int) 每次读取的字符数
+    :return: (generator of namedtuple) 依次产生各条指令记录
+    """
+    for number, line in enumerate(iter_lines(fp, chunk_size), 1):
+        try:
+            command = parse_line(line)
+        except (ValueError, IndexError) as e:
+            raise ValueError('第%d行指令格式错误: %s (%s)' % (number, line.strip()[:80], e)) from None
+        if command is not None:
+            yield command
+
+
+def parse_file(path, chunk_size=CHUNK_SIZE):
+    """流式解析指定路径的指令文件，路径为 '-' 时读取标准输入
+
+    :param path: (string) 指令文件路径
+    :param chunk_size: (int) 每次读取的字符数
+    :return: (generator of namedtuple) 依次产生各条指令记录
+    """
+    if path == '-':
+        yield from parse(sys.stdin, chunk_size)
+        return
+    with open(path, 'r') as fp:
+        yield from parse(fp, chunk_size)
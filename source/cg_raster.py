@@ -0,0 +1,753 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 基于NumPy的批量光栅化，输出与cg_algorithms中对应的逐图元实现逐像素一致
+import math
+import numpy as np
+import cg_algorithms as alg
+
+# 累加矩阵的单块元素上限，控制DDA批量累加时的临时内存
+_ACCUMULATE_BLOCK = 1 << 22
+
+
+def _segment_index(counts):
+    """根据每条线段的像素数，计算像素所属线段编号、线段内序号及偏移表
+
+    :param counts: (np.ndarray of int) 每条线段的像素数
+    :return: (seg, t, offsets) 每个像素所属线段编号、该像素在线段内的序号、长度为N+1的偏移表
+    """
+    offsets = np.zeros(len(counts) + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    seg = np.repeat(np.arange(len(counts)), counts)
+    t = np.arange(offsets[-1], dtype=np.int64) - offsets[seg]
+    return seg, t, offsets
+
+
+def _accumulate(start, delta, counts):
+    """逐段顺序累加 start, start + delta, (start + delta) + delta, ...
+
+    与标量实现中 y += delta_y 的浮点累加顺序完全相同，从而保证取整结果一致。
+    按长度分桶后在二维矩阵上做 np.add.accumulate，避免逐像素的Python循环。
+
+    :param start: (np.ndarray of float) 每段的起始值
+    :param delta: (np.ndarray of float) 每段的增量
+    :param counts: (np.ndarray of int) 每段的累加项数
+    :return: (np.ndarray of float) 所有段的累加结果顺序拼接
+    """
+    offsets = np.zeros(len(counts) + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    result = np.empty(offsets[-1], np.float64)
+    order = np.argsort(counts, kind='stable')
+    # 不可见的线段没有累加项
+    order = order[np.searchsorted(counts[order], 1):]
+    i = 0
+    while i < len(order):
+        # 同一桶内长度至多相差一倍，且矩阵大小不超过上限
+        length = max(int(counts[order[i]]), 1)
+        j = np.searchsorted(counts[order], 2 * length, side='left')
+        rows = max(_ACCUMULATE_BLOCK // (2 * length), 1)
+        j = min(j, i + rows)
+        idx = order[i:j]
+        width = int(counts[idx].max())
+        block = np.empty((len(idx), width), np.float64)
+        block[:, 0] = start[idx]
+        block[:, 1:] = delta[idx, None]
+        np.add.accumulate(block, axis=1, out=block)
+        col = np.arange(width)
+        mask = col < counts[idx, None]
+        result[(offsets[idx, None] + col)[mask]] = block[mask]
+        i = j
+    return result
+
+
+# 非主方向坐标与理想直线的偏差不到1个像素（DDA的累加误差远小于此），求可见范围时再放宽1个像素
+_LINE_MARGIN = 2
+
+
+def _visible_steps(rect, x_major, major0, minor0, slope, counts):
+    """求各线段落在矩形区域内的步数范围
+
+    第t步像素的主方向坐标为 major0 + t，非主方向坐标与 minor0 + slope * t 相差不到1个像素，
+    因此区域外的步不必生成；范围按余量略微放宽，多出的少量像素由调用方丢弃。
+
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 可见区域，左闭右开
+    :param x_major: (np.ndarray of bool) 主方向是否为x方向
+    :param major0: (np.ndarray of int) 主方向起点坐标
+    :param minor0: (np.ndarray of int) 非主方向起点坐标
+    :param slope: (np.ndarray of float) 非主方向坐标每步的增量
+    :param counts: (np.ndarray of int) 各线段的像素数
+    :return: (first, counts) 各线段第一个可见步的序号、可见的步数
+    """
+    x_min, y_min, x_max, y_max = rect
+    lo = np.where(x_major, x_min, y_min) - major0
+    hi = np.where(x_major, x_max, y_max) - major0
+    # 非主方向：解出理想直线进入和离开区域（含余量）的步
+    low = (np.where(x_major, y_min, x_min) - _LINE_MARGIN - minor0).astype(np.float64)
+    high = (np.where(x_major, y_max, x_max) + _LINE_MARGIN - minor0).astype(np.float64)
+    flat = slope == 0
+    divisor = np.where(flat, 1, slope)
+    t0, t1 = low / divisor, high / divisor
+    lo = np.maximum(lo, np.where(flat, 0, np.floor(np.minimum(t0, t1))))
+    hi = np.minimum(hi, np.where(flat, np.where((low <= 0) & (high > 0), counts, 0),
+                                 np.ceil(np.maximum(t0, t1)) + 1))
+    first = np.clip(lo, 0, counts).astype(np.int64)
+    last = np.clip(hi, 0, counts).astype(np.int64)
+    return first, np.maximum(last - first, 0)
+
+
+def _advance(value, delta, steps):
+    """求 value 逐次加 steps 次 delta 的浮点结果，与逐步累加逐位相同，但运算次数只与经过的指数段数有关
+
+    同一个指数段 [2^(e-1), 2^e) 内的浮点数都是该段ulp的整数倍，每步加delta的舍入方式相同，
+    因此连续两步的实际增量相等后，此后直到接近段边界为止增量都不变，可以一次跨过这些步。
+
+    :param value: (float) 初值
+    :param delta: (float) 增量
+    :param steps: (int) 累加次数
+    :return: (float) 累加结果
+    """
+    value, delta = float(value), float(delta)
+    while steps >= 3:
+        middle = value + delta
+        following = middle + delta
+        steps -= 2
+        exponent = math.frexp(value)[1]
+        increment = following - middle
+        steady = (value * middle > 0 and middle * following > 0 and increment == middle - value
+                  and math.frexp(middle)[1] == exponent == math.frexp(following)[1])
+        value = following
+        if not steady:
+            continue
+        if increment == 0:
+            # 增量不足半个ulp，此后value不再变化
+            return value
+        # 跨过的每一步在加delta之前和之后都不越过当前指数段的边界
+        if (increment > 0) == (value > 0):
+            room = 2.0 ** exponent - abs(value)
+        else:
+            room = abs(value) - 2.0 ** (exponent - 1)
+        jump = min(int((room - abs(delta) - math.ulp(value)) / abs(increment)) - 1, steps)
+        if jump > 0:
+            value += jump * increment
+            steps -= jump
+    for _ in range(steps):
+        value += delta
+    return value
+
+
+def draw_lines(segments, algorithm, rect=None):
+    """批量绘制线段
+
+    :param segments: (array-like of int, shape (N, 2, 2)) N条线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开；
+                 给定时只生成线段穿过该区域的部分，运算量与线段的可见长度成正比
+    :return: (pixels, offsets) pixels为(M, 2)的int32像素坐标数组，offsets为长度N+1的int64数组，
+             第i条线段的像素为pixels[offsets[i]:offsets[i + 1]]，与alg.draw_line的结果逐点相同；
+             给定rect时为其中落在区域内的全部像素，另有少量区域边缘外的像素
+    """
+    seg_array = np.asarray(segments, np.int64).reshape(-1, 2, 2)
+    x0, y0 = seg_array[:, 0, 0].copy(), seg_array[:, 0, 1].copy()
+    x1, y1 = seg_array[:, 1, 0].copy(), seg_array[:, 1, 1].copy()
+    vertical = x0 == x1
+
+    if algorithm == 'Naive':
+        # 垂直线段不交换端点，y0 > y1 时结果为空
+        swap = ~vertical & (x0 > x1)
+        x0[swap], y0[swap], x1[swap], y1[swap] = x1[swap], y1[swap], x0[swap], y0[swap]
+        counts = np.where(vertical, np.maximum(y1 - y0 + 1, 0), x1 - x0 + 1)
+        k = (y1 - y0) / np.where(vertical, 1, x1 - x0)
+        first = np.zeros(len(counts), np.int64)
+        if rect is not None:
+            first, counts = _visible_steps(rect, ~vertical, np.where(vertical, y0, x0),
+                                           np.where(vertical, x0, y0), np.where(vertical, 0, k), counts)
+        seg, t, offsets = _segment_index(counts)
+        t += first[seg]
+        pixels = np.empty((len(t), 2), np.int32)
+        v = vertical[seg]
+        pixels[:, 0] = np.where(v, x0[seg], x0[seg] + t)
+        y = np.trunc(y0[seg] + k[seg] * t).astype(np.int64)
+        pixels[:, 1] = np.where(v, y0[seg] + t, y)
+        return pixels, offsets
+
+    if algorithm == 'DDA':
+        dx, dy = x1 - x0, y1 - y0
+        k = np.abs(dy / np.where(vertical, 1, dx))
+        x_major = ~vertical & (k < 1)
+        # 垂直线段与y为主变量的线段都按y从小到大绘制
+        swap = np.where(x_major, x0 > x1, y0 > y1)
+        x0[swap], y0[swap], x1[swap], y1[swap] = x1[swap], y1[swap], x0[swap], y0[swap]
+        counts = np.where(x_major, x1 - x0 + 1, y1 - y0 + 1)
+        acc = ~vertical
+        delta = np.where(x_major, dy / np.where(x_major, dx, 1), dx / np.where(x_major | vertical, 1, dy))
+        start = np.where(x_major, y0, x0).astype(np.float64)
+        first = np.zeros(len(counts), np.int64)
+        if rect is not None:
+            first, counts = _visible_steps(rect, x_major, np.where(x_major, x0, y0),
+                                           np.where(x_major, y0, x0), delta, counts)
+            # 跳过的步仍须按原顺序累加，才能得到与逐步累加相同的起始值
+            for i in np.flatnonzero(acc & (first > 0) & (counts > 0)).tolist():
+                start[i] = _advance(start[i], delta[i], int(first[i]))
+        seg, t, offsets = _segment_index(counts)
+        t += first[seg]
+        pixels = np.empty((len(t), 2), np.int32)
+        major = np.where(x_major, x0, y0)[seg] + t
+        # 非主方向坐标按标量实现的顺序逐步累加后四舍五入（银行家舍入，与round一致）
+        minor = np.empty(len(t), np.int64)
+        acc_pixels = acc[seg]
+        minor[acc_pixels] = np.rint(_accumulate(start[acc], delta[acc], counts[acc])).astype(np.int64)
+        minor[~acc_pixels] = x0[seg][~acc_pixels]
+        xm = x_major[seg]
+        pixels[:, 0] = np.where(xm, major, minor)
+        pixels[:, 1] = np.where(xm, minor, major)
+        return pixels, offsets
+
+    if algorithm == 'Bresenham':
+        dx, dy = np.abs(x1 - x0), np.abs(y1 - y0)
+        steep = ~vertical & (dy > dx)
+        # 陡直线交换x和y
+        x0[steep], y0[steep] = y0[steep].copy(), x0[steep].copy()
+        x1[steep], y1[steep] = y1[steep].copy(), x1[steep].copy()
+        dx[steep], dy[steep] = dy[steep].copy(), dx[steep].copy()
+        swap = np.where(vertical, y0 > y1, x0 > x1)
+        x0[swap], y0[swap], x1[swap], y1[swap] = x1[swap], y1[swap], x0[swap], y0[swap]
+        counts = np.where(vertical, y1 - y0 + 1, x1 - x0 + 1)
+        y_step = np.where(y0 < y1, 1, -1)
+        first = np.zeros(len(counts), np.int64)
+        if rect is not None:
+            first, counts = _visible_steps(rect, ~vertical & ~steep, np.where(vertical, y0, x0),
+                                           np.where(vertical, x0, y0),
+                                           np.where(vertical, 0, y_step * dy / np.maximum(dx, 1)), counts)
+        seg, t, offsets = _segment_index(counts)
+        t += first[seg]
+        pixels = np.empty((len(t), 2), np.int32)
+        # 决策参数的闭式解：前t步中y共前进 floor((2*dy*t + dx) / (2*dx)) 次
+        d_x = np.maximum(dx, 1)[seg]
+        y = y0[seg] + y_step[seg] * ((2 * dy[seg] * t + d_x) // (2 * d_x))
+        x = x0[seg] + t
+        v, s = vertical[seg], steep[seg]
+        pixels[:, 0] = np.where(v, x0[seg], np.where(s, y, x))
+        pixels[:, 1] = np.where(v, y0[seg] + t, np.where(s, x, y))
+        return pixels, offsets
+
+    return np.empty((0, 2), np.int32), np.zeros(len(seg_array) + 1, np.int64)
+
+
+def polygon_segments(p_list):
+    """多边形的边：[[p[-1], p[0]], [p[0], p[1]], ...]，与alg.draw_polygon的绘制顺序相同
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 多边形的顶点坐标列表
+    :return: (np.ndarray of int, shape (n, 2, 2)) 多边形各边的端点
+    """
+    points = np.asarray(p_list, np.int64).reshape(-1, 2)
+    return np.stack([np.roll(points, 1, axis=0), points], axis=1)
+
+
+def draw_polygon(p_list, algorithm, rect=None):
+    """绘制多边形（所有边一次批量光栅化）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :param rect: (tuple of int or None) 可见区域，含义同draw_lines
+    :return: (np.ndarray of int32, shape (M, 2)) 绘制结果的像素点坐标
+    """
+    return draw_lines(polygon_segments(p_list), algorithm, rect)[0]
+
+
+def _isqrt(values):
+    """逐元素求整数平方根 floor(sqrt(v))
+
+    :param values: (np.ndarray of int64 or object) 非负整数
+    :return: (np.ndarray) 与values类型相同
+    """
+    if values.dtype == object:
+        return np.frompyfunc(math.isqrt, 1, 1)(values)
+    root = np.sqrt(values.astype(np.float64)).astype(np.int64)
+    # 浮点开方的误差不超过1，修正一次即可
+    root -= root * root > values
+    root += (root + 1) * (root + 1) <= values
+    return root
+
+
+class _EllipseQuadrant:
+    """
+    中点椭圆算法在第一象限的轨迹，以闭式解代替逐步迭代
+
+    区域1（x为主方向）中 y(x) 是满足 f(x, y - 1/2) < 0 的最大整数，区域2（y为主方向）中
+    x(y) = max(x_2, 满足 f(x + 1/2, y) > 0 的最小整数)，其中 f(x, y) = ry^2 x^2 + rx^2 y^2 - rx^2 ry^2。
+    只有在切线斜率绝对值接近1的几步中，每步一个像素的限制会使迭代落后于闭式解，这几步按原算法逐步计算。
+    所有判断都用整数完成，与决策参数没有舍入误差时（半径不超过2^12）的alg.draw_ellipse逐点相同。
+    """
+    def __init__(self, rx, ry):
+        self.rx, self.ry = rx, ry
+        self.rx_2, self.ry_2 = rx * rx, ry * ry
+        # 4 * rx^2 * ry^2 超出int64时改用Python整数
+        self.dtype = object if rx * ry >= 1 << 30 else np.int64
+        # 区域1：斜率绝对值小于1的部分闭式解成立，此后逐步迭代至区域1结束
+        if rx == 0:
+            self.x_closed, self.tail = 0, []
+            self.x_end, self.y_end = 0, ry
+        else:
+            x_closed = max(int(self.rx_2 / math.hypot(rx, ry)) - 2, 0)
+            if self._ends(x_closed):
+                # 区域1在闭式解成立的范围内结束，二分查找结束位置
+                low, high = -1, x_closed
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    low, high = (low, middle) if self._ends(middle) else (middle, high)
+                self.x_closed = self.x_end = high
+                self.tail = []
+                self.y_end = int(self._y([high])[0])
+            else:
+                self.x_closed = x_closed
+                x, y = x_closed, int(self._y([x_closed])[0])
+                self.tail = []
+                while self.ry_2 * x < self.rx_2 * y:
+                    x += 1
+                    if 4 * self.ry_2 * x * x + self.rx_2 * (2 * y - 1) ** 2 >= 4 * self.rx_2 * self.ry_2:
+                        y -= 1
+                    self.tail.append(y)
+                self.x_end, self.y_end = x, y
+        # 区域2：逐步迭代至斜率绝对值小于1且轨迹与闭式解一致，此后 x(y) = max(x_2, x_min(y))
+        y_closed = int(self.ry_2 / math.hypot(rx, ry)) - 1 if rx or ry else 0
+        x, y = self.x_end, self.y_end
+        self.head = []
+        while y > 0 and (y > y_closed or x < self._x([y])[0]):
+            y -= 1
+            x += int(x < self._x([y])[0])
+            self.head.append(x)
+        self.x_2, self.y_2 = x, y
+
+    def _y(self, x):
+        """区域1中满足 4 ry^2 x^2 + rx^2 (2y - 1)^2 < 4 rx^2 ry^2 的最大整数y；rx = 0时区域1只有x = 0一点"""
+        x = np.asarray(x, np.int64).astype(self.dtype)
+        if self.rx == 0:
+            return np.full(len(x), self.ry, np.int64)
+        d = 4 * self.ry_2 * (self.rx_2 - x * x)
+        return ((_isqrt(np.maximum((d - 1) // self.rx_2, 0)) + 1) // 2).astype(np.int64)
+
+    def _x(self, y):
+        """区域2中满足 ry^2 (2x + 1)^2 + 4 rx^2 y^2 > 4 rx^2 ry^2 的最小整数x"""
+        y = np.asarray(y, np.int64).astype(self.dtype)
+        e = 4 * self.rx_2 * (self.ry_2 - y * y)
+        return ((_isqrt(e // self.ry_2) + 1) // 2).astype(np.int64)
+
+    def _ends(self, x):
+        """区域1是否在x处结束：ry^2 x >= rx^2 y(x)"""
+        return self.ry_2 * x >= self.rx_2 * int(self._y([x])[0])
+
+    def region1(self, x):
+        """区域1中各x处的y，x取值于 [0, x_end]"""
+        y = np.empty(len(x), np.int64)
+        closed = x <= self.x_closed
+        y[closed] = self._y(x[closed])
+        y[~closed] = np.array(self.tail, np.int64)[x[~closed] - self.x_closed - 1]
+        return y
+
+    def region2(self, y):
+        """区域2中各y处的x，y取值于 [0, y_end)"""
+        x = np.empty(len(y), np.int64)
+        closed = y < self.y_2
+        x[closed] = np.maximum(self._x(y[closed]), self.x_2)
+        x[~closed] = np.array(self.head, np.int64)[self.y_end - 1 - y[~closed]]
+        return x
+
+
+def _symmetric_range(center, low, high, limit):
+    """满足 center + v 或 center - v 落在 [low, high) 中的 v，且 0 <= v < limit"""
+    values = np.union1d(np.arange(max(low - center, 0), min(high - center, limit)),
+                        np.arange(max(center - high + 1, 0), min(center - low + 1, limit)))
+    return values.astype(np.int64)
+
+
+def draw_ellipse(p_list, rect=None):
+    """绘制椭圆（中点椭圆算法的闭式解，见_EllipseQuadrant）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框左上角和右下角顶点坐标
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开；
+                 给定时只计算落在该区域内的像素，运算量与区域的宽和高成正比
+    :return: (np.ndarray of int32, shape (M, 2)) 绘制结果的像素点坐标，与alg.draw_ellipse的像素集合相同
+    """
+    (x0, y0), (x1, y1) = p_list[0], p_list[1]
+    cx, cy = (x0 + x1) // 2, (y0 + y1) // 2
+    quadrant = _EllipseQuadrant(abs(x1 - x0) // 2, abs(y1 - y0) // 2)
+    if rect is None:
+        x = np.arange(quadrant.x_end + 1)
+        y = np.arange(quadrant.y_end)
+    else:
+        # 区域1每个x对应一个y，区域2每个y对应一个x，只需计算关于中心对称后落在区域内的x和y
+        x = _symmetric_range(cx, rect[0], rect[2], quadrant.x_end + 1)
+        y = _symmetric_range(cy, rect[1], rect[3], quadrant.y_end)
+    quarter = np.concatenate([np.stack([x, quadrant.region1(x)], axis=1),
+                              np.stack([quadrant.region2(y), y], axis=1)])
+    pixels = np.concatenate([quarter * sign for sign in ([1, 1], [-1, 1], [1, -1], [-1, -1])]) + [cx, cy]
+    if rect is not None:
+        pixels = crop(pixels, rect)
+    return pixels.astype(np.int32)
+
+
+def unique_pixels(pixels):
+    """去除重复像素，保留每个像素第一次出现的位置和先后顺序
+
+    :param pixels: (np.ndarray of int, shape (M, 2)) 像素坐标
+    :return: (np.ndarray of int32, shape (K, 2)) 去重后的像素坐标
+    """
+    pixels = np.asarray(pixels, np.int64).reshape(-1, 2)
+    key = (pixels[:, 0] << 32) + (pixels[:, 1] & 0xFFFFFFFF)
+    first = np.sort(np.unique(key, return_index=True)[1])
+    return pixels[first].astype(np.int32)
+
+
+def crop(pixels, rect):
+    """只保留落在矩形区域内的像素
+
+    :param pixels: (np.ndarray of int, shape (M, 2)) 像素坐标
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 区域，左闭右开
+    :return: (np.ndarray, shape (K, 2)) 区域内的像素坐标
+    """
+    x, y = pixels[:, 0], pixels[:, 1]
+    return pixels[(x >= rect[0]) & (x < rect[2]) & (y >= rect[1]) & (y < rect[3])]
+
+
+def join_samples(samples, rect=None):
+    """用Bresenham直线依次连接采样点并去除重复像素，与alg.join_samples的结果逐点相同
+
+    :param samples: (np.ndarray of int, shape (S, 2)) 取整后的采样点
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开；
+                 给定时跳过两端包围盒与区域不相交的连线，并只保留区域内的像素
+    :return: (np.ndarray of int32, shape (M, 2)) 无缺口的像素点坐标
+    """
+    samples = np.asarray(samples, np.int64).reshape(-1, 2)
+    head, tail = samples[:-1], samples[1:]
+    moved = (head != tail).any(axis=1)
+    if rect is not None:
+        low, high = np.minimum(head, tail), np.maximum(head, tail)
+        moved &= ((high[:, 0] >= rect[0]) & (low[:, 0] < rect[2])
+                  & (high[:, 1] >= rect[1]) & (low[:, 1] < rect[3]))
+    segments = np.stack([head[moved], tail[moved]], axis=1)
+    pixels = unique_pixels(np.concatenate([samples[:1], draw_lines(segments, 'Bresenham', rect)[0]]))
+    return pixels if rect is None else crop(pixels, rect)
+
+
+def bspline_samples(p_list, steps, indices=None):
+    """三次均匀B样条的采样点
+
+    所有段共用alg.bspline_basis_table给出的权重表，一次向量化计算全部段的全部采样点；
+    累加顺序与alg.draw_curve相同，结果逐位一致。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表，至少4个
+    :param steps: (int) 每段的采样数，须为2的整数次幂
+    :param indices: (np.ndarray of int or None) 只计算这些序号的采样点，第j个采样点位于第 j // steps 段
+    :return: (np.ndarray of int64, shape ((n - 3) * steps + 1, 2)) 取整后的采样点；给定indices时与之一一对应
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    table = np.array(alg.bspline_basis_table(steps), np.float64)
+    n = len(points)
+    if indices is not None:
+        segment, s = np.divmod(indices, steps)
+        # 终点只用到3个控制点，补一个零点后第4项为0，累加结果不变
+        points = np.concatenate([points, np.zeros((1, 2))])
+        total = np.zeros((len(segment), 2))
+        for m in range(4):
+            total += points[segment + m] * table[s, m, None]
+        return np.rint(total).astype(np.int64)
+    total = np.zeros(((n - 3) * steps + 1, 2))
+    body = total[:-1].reshape(n - 3, steps, 2)
+    for m in range(4):
+        body += points[m:m + n - 3, None, :] * table[None, :, m, None]
+    # 曲线终点即第n-3段的起点，第4个权重没有对应的控制点（其值为0）
+    for m in range(3):
+        total[-1] += points[n - 3 + m] * table[0, m]
+    return np.rint(total).astype(np.int64)
+
+
+def bezier_de_casteljau(p_list, u):
+    """批量De Casteljau算法：对所有参数值同时做n轮线性插值
+
+    每一步的运算顺序与alg.draw_curve相同，结果逐位一致，但每个采样点需要O(n^2)次运算。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表
+    :param u: (np.ndarray of float) 参数值
+    :return: (np.ndarray of float, shape (len(u), 2)) 曲线上的点
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    u = np.asarray(u, np.float64)
+    result = np.empty((len(u), 2))
+    # 按参数分块，限制 (n, block, 2) 临时数组的大小
+    block = max(_ACCUMULATE_BLOCK // max(len(points), 1), 1)
+    for start in range(0, len(u), block):
+        t = u[start:start + block, None]
+        res = np.repeat(points[:, None, :], len(t), axis=1)
+        for i in range(len(points) - 1):
+            res = (1 - t) * res[:-1] + t * res[1:]
+        result[start:start + block] = res[0]
+    return result
+
+
+def bezier_horner(p_list, u):
+    """Bernstein多项式的Horner求值，每个采样点只需O(n)次运算
+
+    t <= 1/2 时 B(t) = (1 - t)^n * sum(C(n, i) * s^i * P_i)，s = t / (1 - t)；
+    t > 1/2 时关于 1 - t 对称地展开，s = (1 - t) / t。两种情况下 s <= 1，各项均不放大舍入误差。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表
+    :param u: (np.ndarray of float) 参数值
+    :return: (np.ndarray of float, shape (len(u), 2)) 曲线上的点
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    n = len(points) - 1
+    u = np.asarray(u, np.float64)
+    coefficients = np.array([math.comb(n, i) for i in range(n + 1)], np.float64)[:, None] * points
+    result = np.empty((len(u), 2))
+
+    def horner(order, s):
+        acc = np.repeat(order[:1], len(s), axis=0)
+        for c in order[1:]:
+            acc = acc * s + c
+        return acc
+
+    low = u <= 0.5
+    t = u[low, None]
+    result[low] = horner(coefficients[::-1], t / (1 - t)) * (1 - t) ** n
+    t = u[~low, None]
+    result[~low] = horner(coefficients, (1 - t) / t) * t ** n
+    return result
+
+
+def bezier_bernstein(p_list, u):
+    """在对数域计算Bernstein基函数的Bezier曲线求值，任意次数下都不会溢出，每个采样点只需O(n)次运算
+
+    C(n, i) 由lgamma在对数域求得，与 t^i (1 - t)^(n - i) 的对数相加后才取指数，各项权重不超过1；
+    误差来自对数的舍入，与次数成正比，1000次时与De Casteljau算法相差约1e-9个像素。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表
+    :param u: (np.ndarray of float) 参数值，位于 [0, 1]
+    :return: (np.ndarray of float, shape (len(u), 2)) 曲线上的点
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    n = len(points) - 1
+    u = np.asarray(u, np.float64)
+    result = np.empty((len(u), 2))
+    # 端点处的对数为-inf，直接取首末控制点
+    result[u <= 0] = points[0]
+    result[u >= 1] = points[-1]
+    inner = np.flatnonzero((u > 0) & (u < 1))
+    if len(inner):
+        i = np.arange(n + 1)
+        log_comb = math.lgamma(n + 1) - np.array([math.lgamma(k + 1) + math.lgamma(n - k + 1) for k in i])
+        # 按参数分块，限制 (block, n + 1) 权重矩阵的大小
+        block = max(_ACCUMULATE_BLOCK // (n + 1), 1)
+        for start in range(0, len(inner), block):
+            index = inner[start:start + block]
+            t = u[index, None]
+            weights = np.exp(log_comb + i * np.log(t) + (n - i) * np.log1p(-t))
+            result[index] = weights @ points
+    return result
+
+
+# Horner求值中二项式系数与 2^n 的放大须在浮点数范围内，更高次数时改用对数域的Bernstein求值（同样为O(n)）
+_HORNER_MAX_DEGREE = 512
+
+
+def bezier_samples(p_list, steps, indices=None):
+    """Bezier曲线在 u = 0, 1/steps, ..., 1 处的采样点
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表
+    :param steps: (int) 采样段数
+    :param indices: (np.ndarray of int or None) 只计算这些序号的采样点，第j个采样点的参数为 j / steps
+    :return: (np.ndarray of int64, shape (steps + 1, 2)) 取整后的采样点，与alg.draw_curve的采样相差不超过1个像素；
+             给定indices时与之一一对应
+    """
+    u = (np.arange(steps + 1) if indices is None else np.asarray(indices, np.int64)) / steps
+    if len(p_list) - 1 <= _HORNER_MAX_DEGREE:
+        points = bezier_horner(p_list, u)
+    else:
+        points = bezier_bernstein(p_list, u)
+    return np.rint(points).astype(np.int64)
+
+
+# 按可见性细分曲线时，采样数不超过该值的片段不再细分
+_CURVE_LEAF = 256
+
+
+def _split_bezier(control, tau):
+    """用De Casteljau算法在参数tau处将Bezier曲线一分为二
+
+    :param control: (np.ndarray of float, shape (k, 2)) 控制点
+    :param tau: (float) 分割处的参数
+    :return: (left, right) 两段曲线的控制点
+    """
+    left, right = [control[0]], [control[-1]]
+    for _ in range(len(control) - 1):
+        control = (1 - tau) * control[:-1] + tau * control[1:]
+        left.append(control[0])
+        right.append(control[-1])
+    return np.array(left), np.array(right[::-1])
+
+
+def _visible_spans(control, begin, end, rect):
+    """求曲线片段上可能有像素落在区域内的采样区间
+
+    曲线位于其控制点的凸包内，控制点包围盒（计入取整的半个像素）与区域不相交的片段整段跳过，
+    部分可见的片段在中点处细分后分别判断。
+
+    :param control: (np.ndarray of float, shape (k, 2)) 片段的Bezier控制点，参数0和1分别对应第begin和第end个采样点
+    :param begin: (int) 片段第一个采样点的序号
+    :param end: (int) 片段最后一个采样点的序号
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 可见区域，左闭右开
+    :return: (list of tuple: [(begin, end), ...]) 采样区间，两端均包含
+    """
+    x_min, y_min, x_max, y_max = rect
+    spans = []
+    stack = [(control, begin, end)]
+    while stack:
+        control, begin, end = stack.pop()
+        low, high = control.min(axis=0), control.max(axis=0)
+        # 细分的舍入误差与坐标大小成正比
+        margin = 1 + 1e-9 * np.abs(control).max()
+        if (high[0] < x_min - margin or low[0] > x_max - 1 + margin
+                or high[1] < y_min - margin or low[1] > y_max - 1 + margin):
+            continue
+        inside = low[0] >= x_min and high[0] <= x_max - 1 and low[1] >= y_min and high[1] <= y_max - 1
+        if inside or end - begin <= _CURVE_LEAF:
+            spans.append((begin, end))
+            continue
+        middle = (begin + end) // 2
+        left, right = _split_bezier(control, (middle - begin) / (end - begin))
+        stack.append((right, middle, end))
+        stack.append((left, begin, middle))
+    return spans
+
+
+def _bspline_spans(p_list, steps, rect):
+    """B样条曲线上可能有像素落在区域内的采样区间
+
+    第i段是以 (P_i + 4P_(i+1) + P_(i+2)) / 6 等为控制点的三次Bezier曲线，先对所有段一次判断，
+    只有跨越区域边界的段才逐段细分。
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表，至少4个
+    :param steps: (int) 每段的采样数
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 可见区域，左闭右开
+    :return: (np.ndarray of int64, shape (k, 2)) 采样区间，两端均包含
+    """
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    p0, p1, p2, p3 = points[:-3], points[1:-2], points[2:-1], points[3:]
+    control = np.stack([(p0 + 4 * p1 + p2) / 6, (4 * p1 + 2 * p2) / 6,
+                        (2 * p1 + 4 * p2) / 6, (p1 + 4 * p2 + p3) / 6], axis=1)
+    low, high = control.min(axis=1), control.max(axis=1)
+    x_min, y_min, x_max, y_max = rect
+    margin = 1 + 1e-9 * np.abs(control).max(axis=(1, 2))
+    hit = ((high[:, 0] >= x_min - margin) & (low[:, 0] <= x_max - 1 + margin)
+           & (high[:, 1] >= y_min - margin) & (low[:, 1] <= y_max - 1 + margin))
+    inside = (low[:, 0] >= x_min) & (high[:, 0] <= x_max - 1) & (low[:, 1] >= y_min) & (high[:, 1] <= y_max - 1)
+    whole = np.flatnonzero(hit & (inside | (steps <= _CURVE_LEAF)))
+    spans = [np.stack([whole * steps, (whole + 1) * steps], axis=1)]
+    for i in np.flatnonzero(hit & ~inside & (steps > _CURVE_LEAF)).tolist():
+        spans.append(np.array(_visible_spans(control[i], i * steps, (i + 1) * steps, rect), np.int64).reshape(-1, 2))
+    return np.concatenate(spans)
+
+
+def _join_spans(spans, samples, rect):
+    """分别计算相接的采样区间上的采样点并依次连接
+
+    同一条曲线在区域内的像素都来自可见区间内相邻采样点之间的连线，因此结果包含完整绘制时落在区域内的全部像素。
+
+    :param spans: (array-like of int, shape (k, 2)) 采样区间，两端均包含
+    :param samples: (callable) 由采样点序号数组求取整后采样点的函数
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max)) 可见区域，左闭右开
+    :return: (np.ndarray of int32, shape (M, 2)) 区域内的像素点坐标
+    """
+    spans = np.asarray(spans, np.int64).reshape(-1, 2)
+    if not len(spans):
+        return np.empty((0, 2), np.int32)
+    spans = spans[np.argsort(spans[:, 0], kind='stable')]
+    # 起点超过之前所有区间终点的区间开始新的一段
+    reach = np.maximum.accumulate(spans[:, 1])
+    starts = np.flatnonzero(np.r_[True, spans[1:, 0] > reach[:-1]])
+    ends = np.maximum.reduceat(spans[:, 1], starts)
+    pieces = [join_samples(samples(np.arange(begin, end + 1)), rect) for begin, end in zip(spans[starts, 0], ends)]
+    return pieces[0] if len(pieces) == 1 else unique_pixels(np.concatenate(pieces))
+
+
+def draw_curve(p_list, algorithm, rect=None):
+    """绘制曲线，B样条曲线的结果与alg.draw_curve逐点相同，Bezier曲线的采样点与之相差不超过1个像素
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开；
+                 给定时只计算可能落在区域内的曲线片段，结果包含完整绘制时落在区域内的全部像素
+    :return: (np.ndarray of int32, shape (M, 2)) 绘制结果的像素点坐标
+    """
+    if algorithm == 'B-spline':
+        if len(p_list) < 4:
+            return np.empty((0, 2), np.int32)
+        steps = alg.curve_steps(p_list, algorithm)
+        if rect is None:
+            return join_samples(bspline_samples(p_list, steps))
+        return _join_spans(_bspline_spans(p_list, steps, rect),
+                           lambda indices: bspline_samples(p_list, steps, indices), rect)
+    elif algorithm == 'Bezier':
+        if len(p_list) == 0:
+            return np.empty((0, 2), np.int32)
+        steps = alg.curve_steps(p_list, algorithm)
+        if rect is None:
+            return join_samples(bezier_samples(p_list, steps))
+        control = np.asarray(p_list, np.float64).reshape(-1, 2)
+        return _join_spans(_visible_spans(control, 0, steps, rect),
+                           lambda indices: bezier_samples(p_list, steps, indices), rect)
+    return np.empty((0, 2), np.int32)
+
+
+# 拖动预览时曲线的目标采样段数
+PREVIEW_SAMPLES = 64
+
+
+def preview_polyline(item_type, p_list, algorithm, samples=PREVIEW_SAMPLES):
+    """拖动时的低细节预览：用少量顶点的折线近似图元，运算量只与控制点个数有关，与图元的像素数无关
+
+    :param item_type: (string) 图元类型，'line'、'polygon'、'ellipse'、'curve'
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 图元参数
+    :param algorithm: (string) 绘制使用的算法
+    :param samples: (int) 椭圆和曲线的目标采样段数
+    :return: (np.ndarray of int32, shape (M, 2)) 取整后的折线顶点，多边形和椭圆首尾闭合
+    """
+    if not p_list:
+        return np.empty((0, 2), np.int32)
+    points = np.asarray(p_list, np.float64).reshape(-1, 2)
+    if item_type == 'polygon':
+        points = np.concatenate([points, points[:1]])
+    elif item_type == 'ellipse':
+        center = (points[0] + points[1]) / 2
+        radius = np.abs(points[1] - points[0]) / 2
+        theta = np.linspace(0, 2 * math.pi, samples + 1)
+        points = center + radius * np.stack([np.cos(theta), np.sin(theta)], axis=1)
+    elif item_type == 'curve' and algorithm == 'Bezier':
+        points = bezier_bernstein(p_list, np.arange(samples + 1) / samples)
+    elif item_type == 'curve' and algorithm == 'B-spline':
+        if len(points) < 4:
+            return np.empty((0, 2), np.int32)
+        # 每段的采样数须为2的整数次幂，取使总段数不超过samples的最大值（至少1）
+        steps = 1 << max((samples // (len(points) - 3)).bit_length() - 1, 0)
+        points = bspline_samples(p_list, steps)
+    return np.rint(points).astype(np.int32)
+
+
+def rasterize(item_type, p_list, algorithm, rect=None):
+    """光栅化单个图元
+
+    :param item_type: (string) 图元类型，'line'、'polygon'、'ellipse'、'curve'
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 图元参数
+    :param algorithm: (string) 绘制使用的算法
+    :param rect: (tuple of int: (x_min, y_min, x_max, y_max) or None) 可见区域，左闭右开；给定时运算量只与图元的
+                 可见部分有关，结果包含完整绘制时落在区域内的全部像素，可能另有少量区域外的像素
+    :return: (np.ndarray of int32, shape (M, 2)) 绘制结果的像素点坐标
+    """
+    if item_type == 'line':
+        return draw_lines([p_list], algorithm, rect)[0]
+    elif item_type == 'polygon':
+        return draw_polygon(p_list, algorithm, rect)
+    elif item_type == 'ellipse':
+        return draw_ellipse(p_list, rect)
+    elif item_type == 'curve':
+        return draw_curve(p_list, algorithm, rect)
+    return np.empty((0, 2), np.int32)
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+场景文件：带版本号的紧凑二进制格式，可通过mmap直接读取，打开时只解析文件头，图元在访问时才被构造；
+另提供旧版pickle画布文件的安全导入
+
+文件布局（小端序，各段按8字节对齐）：
+    文件头      MAGIC、版本号、画布宽高、算法名数、图元数、顶点数
+    段表        每段一项 (偏移, 元素个数)，顺序同 SECTIONS
+    字符串表    string_offsets[k]:string_offsets[k + 1] 为第k个UTF-8字符串，前若干个为算法名，其后依次为图元ID
+    图元索引    types、algorithm、colors、offsets、lengths 各一列，第i个图元的顶点为
+                vertices[offsets[i]:offsets[i] + lengths[i]]
+    顶点数组    int32，形状 (顶点数, 2)
+"""
+
+import os
+import mmap
+import pickle
+import struct
+
+import numpy as np
+
+import cg_store
+
+
+MAGIC = b'CGSCENE\x00'
+VERSION = 1
+# MAGIC、版本号、保留、画布宽、画布高、算法名数、图元数、顶点数
+_HEADER = struct.Struct('<8sHHIIIQQ')
+# 段名与元素类型，段表中的顺序即文件中的顺序
+SECTIONS = (
+    ('string_offsets', '<i8'),
+    ('strings', 'u1'),
+    ('types', 'u1'),
+    ('algorithm', 'u1'),
+    ('colors', '<u4'),
+    ('offsets', '<i8'),
+    ('lengths', '<i4'),
+    ('vertices', '<i4'),
+)
+_SECTION = struct.Struct('<QQ')
+_ALIGN = 8
+
+
+class SceneFormatError(ValueError):
+    """场景文件或旧版画布文件的内容不合法"""
+
+
+def _align(offset):
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_store(path, store, width=0, height=0):
+    """将图元存储写入场景文件；先写入临时文件再替换，写入中途出错不会破坏原文件
+
+    :param path: (string) 场景文件路径
+    :param store: (cg_store.PrimitiveStore) 图元存储，下标顺序即绘制顺序
+    :param width: (int) 画布宽度，0表示未知
+    :param height: (int) 画布高度，0表示未知
+    """
+    count = len(store)
+    lengths = store.lengths[:count].astype('<i4')
+    offsets = (np.cumsum(lengths, dtype=np.int64) - lengths).astype('<i8')
+    vertices = store.vertices[cg_store.ranges(store.offsets[:count], lengths)].astype('<i4')
+    encoded = [name.encode('utf-8') for name in store.algorithms] + [item_id.encode('utf-8') for item_id in store.ids]
+    string_offsets = np.zeros(len(encoded) + 1, '<i8')
+    np.cumsum([len(text) for text in encoded], out=string_offsets[1:])
+    arrays = {
+        'string_offsets': string_offsets,
+        'strings': np.frombuffer(b''.join(encoded), 'u1'),
+        'types': store.types[:count].astype('u1'),
+        'algorithm': store.algorithm[:count].astype('u1'),
+        'colors': store.colors[:count].astype('<u4'),
+        'offsets': offsets,
+        'lengths': lengths,
+        'vertices': vertices,
+    }
+    position = _align(_HEADER.size + _SECTION.size * len(SECTIONS))
+    table = []
+    for name, _ in SECTIONS:
+        table.append((position, arrays[name].size))
+        position = _align(position + arrays[name].nbytes)
+
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as fp:
+        fp.write(_HEADER.pack(MAGIC, VERSION, 0, width, height, len(store.algorithms), count, len(vertices)))
+        for offset, size in table:
+            fp.write(_SECTION.pack(offset, size))
+        for (name, _), (offset, _) in zip(SECTIONS, table):
+            fp.write(b'\0' * (offset - fp.tell()))
+            fp.write(arrays[name].tobytes())
+    os.replace(temp_path, path)
+
+
+def save(path, items, width=0, height=0):
+    """将图元写入场景文件
+
+    :param path: (string) 场景文件路径
+    :param items: (iterable of tuple: (item_id, item_type, p_list, algorithm, (r, g, b))) 按绘制顺序排列的图元
+    :param width: (int) 画布宽度，0表示未知
+    :param height: (int) 画布高度，0表示未知
+    """
+    store = cg_store.PrimitiveStore()
+    for item_id, item_type, p_list, algorithm, color in items:
+        store.set(item_id, item_type, p_list, algorithm, cg_store.pack_rgb(color[:3]))
+    write_store(path, store, width, height)
+
+
+class SceneFile:
+    """
+    以mmap方式打开的场景文件：各段为直接指向映射内存的NumPy数组，打开时不复制数据，
+    图元ID和p_list等Python对象只在访问对应图元时才构造
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fp:
+            size = os.fstat(fp.fileno()).st_size
+            if size < _HEADER.size + _SECTION.size * len(SECTIONS):
+                raise SceneFormatError('文件过短，不是场景文件')
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open(size)
+        except Exception:
+            self.close()
+            raise
+        self._index = None
+
+    def _open(self, size):
+        magic, version, _, self.width, self.height, algorithm_count, count, vertex_count = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise SceneFormatError('文件标识不符，不是场景文件')
+        if version > VERSION:
+            raise SceneFormatError('场景文件版本 %d 高于支持的版本 %d' % (version, VERSION))
+        for k, (name, dtype) in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(self._mmap, _HEADER.size + _SECTION.size * k)
+            if offset % _ALIGN or offset + length * np.dtype(dtype).itemsize > size:
+                raise SceneFormatError('段 %s 超出文件范围' % name)
+            setattr(self, name, np.frombuffer(self._mmap, dtype, length, offset))
+        self.vertices = self.vertices.reshape(-1, 2)
+        self.algorithm_count = algorithm_count
+        self.count = count
+        self._check(vertex_count)
+        self.algorithms = [self.string(k) for k in range(algorithm_count)]
+
+    def _check(self, vertex_count):
+        """检查各段长度与取值范围，保证之后按下标访问时不会越界"""
+        count = self.count
+        if (len(self.string_offsets) != self.algorithm_count + count + 1
+                or any(len(getattr(self, name)) != count for name in ('types', 'algorithm', 'colors',
+                                                                      'offsets', 'lengths'))
+                or len(self.vertices) != vertex_count):
+            raise SceneFormatError('段长度与文件头不符')
+        string_offsets = self.string_offsets
+        if (string_offsets[0] != 0 or string_offsets[-1] != len(self.strings)
+                or np.any(np.diff(string_offsets) < 0)):
+            raise SceneFormatError('字符串表损坏')
+        if np.any(self.types >= len(cg_store.TYPES)) or np.any(self.algorithm >= self.algorithm_count):
+            raise SceneFormatError('图元类型或算法编码越界')
+        if np.any(self.lengths < 0) or np.any(self.offsets < 0) or np.any(self.offsets + self.lengths > vertex_count):
+            raise SceneFormatError('图元顶点范围越界')
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """释放映射；仍有外部引用的数组时由垃圾回收在引用释放后解除映射"""
+        for name, _ in SECTIONS:
+            self.__dict__.pop(name, None)
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def string(self, k):
+        """字符串表中的第k个字符串"""
+        try:
+            return bytes(self.strings[self.string_offsets[k]:self.string_offsets[k + 1]]).decode('utf-8')
+        except UnicodeDecodeError:
+            raise SceneFormatError('字符串表中第%d个字符串不是合法的UTF-8' % k) from None
+
+    def item_id(self, index):
+        return self.string(self.algorithm_count + index)
+
+    def item_ids(self):
+        """所有图元ID；字符串表为纯ASCII时整体解码一次再切片，不逐个解码"""
+        bounds = self.string_offsets[self.algorithm_count:]
+        data = self.strings[bounds[0]:]
+        if len(data) and data.max() >= 128:
+            return [self.item_id(index) for index in range(self.count)]
+        text = bytes(data).decode('ascii')
+        bounds = (bounds - bounds[0]).tolist()
+        return [text[begin:end] for begin, end in zip(bounds, bounds[1:])]
+
+    def index_of(self, item_id):
+        """图元ID对应的下标，首次调用时建立ID -> 下标的映射；ID不存在时返回None"""
+        if self._index is None:
+            self._index = {item_id: index for index, item_id in enumerate(self.item_ids())}
+        return self._index.get(item_id)
+
+    def item(self, index):
+        """第index个图元
+
+        :param index: (int) 图元下标
+        :return: (tuple: (item_id, item_type, p_list, algorithm, (r, g, b))) 图元参数
+        """
+        start = self.offsets[index]
+        p_list = self.vertices[start:start + self.lengths[index]].tolist()
+        color = self.colors[index]
+        return (self.item_id(index), cg_store.TYPES[self.types[index]], p_list,
+                self.algorithms[self.algorithm[index]], (int(color >> 16) & 255, int(color >> 8) & 255, int(color) & 255))
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.item(index)
+
+    def to_store(self):
+        """复制为可修改的图元存储"""
+        store = cg_store.PrimitiveStore()
+        count = self.count
+        store.ids = self.item_ids()
+        store.index = {item_id: index for index, item_id in enumerate(store.ids)}
+        store.algorithms = list(self.algorithms)
+        store.algorithm_codes = {name: code for code, name in enumerate(store.algorithms)}
+        store.types = self.types.astype(np.uint8)
+        store.algorithm = self.algorithm.astype(np.uint8)
+        store.colors = self.colors.astype(np.uint32)
+        store.offsets = self.offsets.astype(np.int64)
+        store.lengths = self.lengths.astype(np.int32)
+        store.vertices = self.vertices.astype(np.int32)
+        store.vertex_count = len(store.vertices)
+        return store
+
+
+class _RestrictedUnpickler(pickle.Unpickler):
+    """旧版画布文件只包含列表、元组、字符串和数字，禁止加载任何类或函数，防止打开文件时执行任意代码"""
+    def find_class(self, module, name):
+        raise SceneFormatError('旧版画布文件中不允许出现对象 %s.%s' % (module, name))
+
+
+def import_pickle(path):
+    """导入旧版pickle画布文件（[[item_id, item_type, p_list, algorithm, (r, g, b, a)], ...]）
+
+    :param path: (string) 旧版画布文件路径
+    :return: (list of tuple: [(item_id, item_type, p_list, algorithm, (r, g, b)), ...]) 图元列表
+    """
+    with open(path, 'rb') as fp:
+        try:
+            data = _RestrictedUnpickler(fp).load()
+        except SceneFormatError:
+            raise
+        except Exception as e:
+            # 损坏的数据可能引发各种异常，统一报告为格式错误
+            raise SceneFormatError('无法读取旧版画布文件: %s' % e) from None
+    if not isinstance(data, list):
+        raise SceneFormatError('旧版画布文件的内容不是图元列表')
+    items = []
+    for number, item in enumerate(data):
+        try:
+            item_id, item_type, p_list, algorithm, color = item
+            if not isinstance(item_id, str) or item_type not in cg_store.TYPE_CODES or not isinstance(algorithm, str):
+                raise ValueError
+            p_list = [[int(x), int(y)] for x, y in p_list]
+            r, g, b = (int(c) for c in color[:3])
+            # 坐标或颜色超出范围时同样报告为格式错误
+            cg_store.as_points(p_list)
+            cg_store.pack_rgb((r, g, b))
+        except (ValueError, TypeError):
+            raise SceneFormatError('旧版画布文件的第%d个图元格式错误' % number) from None
+        items.append((item_id, item_type, p_list, algorithm, (r, g, b)))
+    return items
+
+
+def is_scene_file(path):
+    """文件是否以场景文件的标识开头"""
+    with open(path, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
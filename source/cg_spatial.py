@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+图元包围盒的空间索引：多层均匀网格，支持增量插入、删除、移动，以及点查询和矩形查询
+"""
+
+import math
+
+import numpy as np
+
+
+class GridIndex:
+    """
+    多层均匀网格索引
+
+    第k层的网格边长为 cell_size * 2^k，每个矩形放在边长不小于其宽和高的最低一层，因此只占据至多2x2个网格。
+    点查询在每个非空层只需检查点所在的网格，耗时与层数（即矩形尺寸范围的对数）和命中的候选数有关，与矩形总数无关；
+    插入、删除和移动都只修改至多4个网格。
+    """
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.rects = {}     # 键 -> (矩形, 层号, 网格列表)
+        self.levels = {}    # 层号 -> {(列, 行): 键的集合}
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, key):
+        return key in self.rects
+
+    def clear(self):
+        self.rects = {}
+        self.levels = {}
+
+    def _level(self, rect):
+        """矩形所在的层：网格边长不小于矩形的宽和高"""
+        extent = max(rect[2] - rect[0], rect[3] - rect[1], 1)
+        return max(math.ceil(math.log2(extent / self.cell_size)), 0)
+
+    def _cells(self, level, x_min, y_min, x_max, y_max):
+        """第level层中与闭矩形 [x_min, x_max] x [y_min, y_max] 相交的网格"""
+        size = self.cell_size << level
+        return [(column, row)
+                for column in range(math.floor(x_min / size), math.floor(x_max / size) + 1)
+                for row in range(math.floor(y_min / size), math.floor(y_max / size) + 1)]
+
+    def insert(self, key, rect):
+        """插入或移动一个矩形
+
+        :param key: (hashable) 键，已存在时先删除原来的矩形
+        :param rect: (tuple of number: (x_min, y_min, x_max, y_max)) 矩形，宽或高为负的矩形不参与查询
+        """
+        if key in self.rects:
+            if self.rects[key][0] == tuple(rect):
+                return
+            self.remove(key)
+        rect = tuple(rect)
+        if rect[2] < rect[0] or rect[3] < rect[1]:
+            self.rects[key] = (rect, None, [])
+            return
+        level = self._level(rect)
+        cells = self._cells(level, *rect)
+        grid = self.levels.setdefault(level, {})
+        for cell in cells:
+            grid.setdefault(cell, set()).add(key)
+        self.rects[key] = (rect, level, cells)
+
+    def remove(self, key):
+        """删除一个矩形，键不存在时不做任何操作"""
+        if key not in self.rects:
+            return
+        _, level, cells = self.rects.pop(key)
+        if level is None:
+            return
+        grid = self.levels[level]
+        for cell in cells:
+            members = grid[cell]
+            members.discard(key)
+            if not members:
+                del grid[cell]
+        if not grid:
+            del self.levels[level]
+
+    def query_point(self, x, y, radius=0):
+        """查询与以 (x, y) 为中心、边长为 2 * radius 的正方形相交的矩形
+
+        :param x: (number) 查询点的x坐标
+        :param y: (number) 查询点的y坐标
+        :param radius: (number) 查询半径
+        :return: (list of hashable) 命中的键
+        """
+        return self.query_rect((x - radius, y - radius, x + radius, y + radius))
+
+    def query_rect(self, rect):
+        """查询与矩形相交（包括边界接触）的所有矩形
+
+        :param rect: (tuple of number: (x_min, y_min, x_max, y_max)) 查询矩形
+        :return: (list of hashable) 命中的键
+        """
+        x_min, y_min, x_max, y_max = rect
+        candidates = set()
+        for level, grid in self.levels.items():
+            size = self.cell_size << level
+            c_min, c_max = math.floor(x_min / size), math.floor(x_max / size)
+            r_min, r_max = math.floor(y_min / size), math.floor(y_max / size)
+            if (c_max - c_min + 1) * (r_max - r_min + 1) <= len(grid):
+                for cell in self._cells(level, x_min, y_min, x_max, y_max):
+                    candidates.update(grid.get(cell, ()))
+            else:
+                # 查询矩形覆盖的网格比该层非空的网格还多时，直接遍历非空网格
+                for (column, row), members in grid.items():
+                    if c_min <= column <= c_max and r_min <= row <= r_max:
+                        candidates.update(members)
+        rects = self.rects
+        return [key for key in candidates
+                if rects[key][0][0] <= x_max and rects[key][0][2] >= x_min
+                and rects[key][0][1] <= y_max and rects[key][0][3] >= y_min]
+
+
+def pixel_distance(pixels, x, y):
+    """点到一组像素的最近距离；像素 (px, py) 覆盖场景中的 [px, px + 1) x [py, py + 1)，其中心为 (px + 0.5, py + 0.5)
+
+    :param pixels: (np.ndarray of int, shape (M, 2)) 像素坐标
+    :param x: (number) 点的场景x坐标
+    :param y: (number) 点的场景y坐标
+    :return: (float) 最近像素中心到点的欧氏距离，没有像素时为inf
+    """
+    if not len(pixels):
+        return math.inf
+    dx = pixels[:, 0] + (0.5 - float(x))
+    dy = pixels[:, 1] + (0.5 - float(y))
+    return math.sqrt(float(np.min(dx * dx + dy * dy)))
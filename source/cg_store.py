@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""
+图元的列式存储：所有顶点位于同一个int32数组中，类型、算法、颜色等属性各占一列，
+代替每个图元一个 [item_type, p_list, algorithm, color] 列表
+"""
+
+import math
+
+import numpy as np
+
+
+TYPES = ('line', 'polygon', 'ellipse', 'curve')
+TYPE_CODES = {item_type: code for code, item_type in enumerate(TYPES)}
+# 顶点以int32保存，超出该范围的坐标无法表示
+COORD_MIN = np.iinfo(np.int32).min
+COORD_MAX = np.iinfo(np.int32).max
+
+
+def pack_rgb(color):
+    """将 (r, g, b) 打包为 0xRRGGBB
+
+    :param color: (tuple of int: (r, g, b)) 颜色，各分量在0至255之间
+    :return: (int) 打包后的颜色
+    """
+    r, g, b = (int(c) for c in color)
+    if not (0 <= r <= 255 and 0 <= g <= 255 and 0 <= b <= 255):
+        raise ValueError('颜色分量超出0-255的范围: (%d, %d, %d)' % (r, g, b))
+    return (r << 16) | (g << 8) | b
+
+
+def unpack_rgb(packed):
+    """将 0xRRGGBB 数组解包为 (n, 3) 的uint8数组"""
+    packed = np.asarray(packed, np.uint32).reshape(-1, 1)
+    return ((packed >> np.array([16, 8, 0], np.uint32)) & 255).astype(np.uint8)
+
+
+def as_points(points):
+    """将顶点转换为 (n, 2) 的int64数组，并检查坐标能否以int32保存
+
+    :param points: (array-like) 顶点坐标
+    :return: (np.ndarray of int64, shape (n, 2)) 顶点坐标
+    """
+    try:
+        points = np.asarray(points, np.int64).reshape(-1, 2)
+    except OverflowError:
+        raise ValueError('顶点坐标超出int32的范围') from None
+    if len(points) and (points.min() < COORD_MIN or points.max() > COORD_MAX):
+        raise ValueError('顶点坐标超出int32的范围')
+    return points
+
+
+def translate_points(points, dx, dy):
+    """平移变换，与alg.translate的结果相同
+
+    :param points: (np.ndarray of int, shape (n, 2)) 顶点坐标
+    :param dx: (int) 水平方向平移量
+    :param dy: (int) 垂直方向平移量
+    :return: (np.ndarray of int64, shape (n, 2)) 变换后的顶点坐标
+    """
+    return np.asarray(points, np.int64) + np.array([dx, dy], np.int64)
+
+
+def rotate_points(points, x, y, r):
+    """旋转变换，与alg.rotate的结果逐点相同：浮点运算顺序一致，np.rint与round同为银行家舍入
+
+    :param points: (np.ndarray of int, shape (n, 2)) 顶点坐标
+    :param x: (int) 旋转中心x坐标
+    :param y: (int) 旋转中心y坐标
+    :param r: (int) 顺时针旋转角度（°）
+    :return: (np.ndarray of int64, shape (n, 2)) 变换后的顶点坐标
+    """
+    angle = math.radians(r)
+    cos_r, sin_r = math.cos(angle), math.sin(angle)
+    points = np.asarray(points, np.int64)
+    x0, y0 = points[:, 0] - x, points[:, 1] - y
+    result = np.empty(points.shape, np.int64)
+    result[:, 0] = np.rint(x0 * cos_r - y0 * sin_r).astype(np.int64) + x
+    result[:, 1] = np.rint(x0 * sin_r + y0 * cos_r).astype(np.int64) + y
+    return result
+
+
+def scale_points(points, x, y, s):
+    """缩放变换，与alg.scale的结果逐点相同
+
+    :param points: (np.ndarray of int, shape (n, 2)) 顶点坐标
+    :param x: (int) 缩放中心x坐标
+    :param y: (int) 缩放中心y坐标
+    :param s: (float) 缩放倍数
+    :return: (np.ndarray of int64, shape (n, 2)) 变换后的顶点坐标
+    """
+    center = np.array([x, y], np.int64)
+    return np.rint((np.asarray(points, np.int64) - center) * s).astype(np.int64) + center
+
+
+def clip_segments(segments, x_min, y_min, x_max, y_max, algorithm):
+    """批量裁剪线段，对每条线段的结果与alg.clip逐点相同
+
+    两种算法都按与alg.clip相同的顺序做相同的浮点运算：Cohen-Sutherland算法每轮迭代对所有
+    尚未确定的线段同时裁去一个端点；Liang-Barsky算法依次对四条边界同时更新所有线段的参数范围。
+
+    :param segments: (array-like, shape (n, 2, 2)) 线段的起点和终点坐标
+    :param x_min: 裁剪窗口左上角x坐标
+    :param y_min: 裁剪窗口左上角y坐标
+    :param x_max: 裁剪窗口右下角x坐标
+    :param y_max: 裁剪窗口右下角y坐标
+    :param algorithm: (string) 使用的裁剪算法，包括'Cohen-Sutherland'和'Liang-Barsky'
+    :return: (tuple: (np.ndarray of int64, shape (n, 2, 2), np.ndarray of bool, shape (n,)))
+             裁剪后的线段和被整体裁去的线段的掩码；被裁去的线段与alg.clip一样置为 [[0, 0], [0, 0]]
+    """
+    segments = np.asarray(segments, np.int64).reshape(-1, 2, 2)
+    n = len(segments)
+    if algorithm not in ('Cohen-Sutherland', 'Liang-Barsky'):
+        raise ValueError('未知的裁剪算法: %s' % algorithm)
+    if x_min == x_max or y_min == y_max:
+        return np.zeros((n, 2, 2), np.int64), np.ones(n, bool)
+    x_min, x_max = min(x_min, x_max), max(x_min, x_max)
+    y_min, y_max = min(y_min, y_max), max(y_min, y_max)
+    x0, y0 = segments[:, 0, 0].astype(np.float64), segments[:, 0, 1].astype(np.float64)
+    x1, y1 = segments[:, 1, 0].astype(np.float64), segments[:, 1, 1].astype(np.float64)
+    rejected = np.zeros(n, bool)
+    result = np.zeros((n, 2, 2), np.int64)
+
+    if algorithm == 'Cohen-Sutherland':
+        def compute_code(x, y):
+            return ((x < x_min) * 1 | (x > x_max) * 2 | (y < y_min) * 4 | (y > y_max) * 8).astype(np.int8)
+
+        active = np.arange(n)
+        while len(active):
+            code0 = compute_code(x0[active], y0[active])
+            code1 = compute_code(x1[active], y1[active])
+            rejected[active[(code0 & code1) != 0]] = True
+            clipping = ((code0 | code1) != 0) & ((code0 & code1) == 0)
+            active, code0, code1 = active[clipping], code0[clipping], code1[clipping]
+            # 与alg.clip相同，优先裁剪起点，按左、右、下、上的顺序选择边界
+            first = code0 != 0
+            code_out = np.where(first, code0, code1)
+            ax, ay = x0[active], y0[active]
+            bx, by = x1[active], y1[active]
+            x_new, y_new = np.empty(len(active)), np.empty(len(active))
+            left = (code_out & 1) != 0
+            right = ~left & ((code_out & 2) != 0)
+            bottom = ~left & ~right & ((code_out & 4) != 0)
+            top = ~left & ~right & ~bottom
+            for mask, edge in ((left, x_min), (right, x_max)):
+                x_new[mask] = edge
+                y_new[mask] = ay[mask] + (by[mask] - ay[mask]) * (edge - ax[mask]) / (bx[mask] - ax[mask])
+            for mask, edge in ((bottom, y_min), (top, y_max)):
+                x_new[mask] = ax[mask] + (bx[mask] - ax[mask]) * (edge - ay[mask]) / (by[mask] - ay[mask])
+                y_new[mask] = edge
+            x0[active[first]], y0[active[first]] = x_new[first], y_new[first]
+            x1[active[~first]], y1[active[~first]] = x_new[~first], y_new[~first]
+        # alg.clip用int()截断
+        result[:, 0, 0], result[:, 0, 1] = np.trunc(x0), np.trunc(y0)
+        result[:, 1, 0], result[:, 1, 1] = np.trunc(x1), np.trunc(y1)
+
+    else:
+        dx, dy = x1 - x0, y1 - y0
+        u0, u1 = np.zeros(n), np.ones(n)
+        for p, q in ((-dx, x0 - x_min), (dx, x_max - x0), (-dy, y0 - y_min), (dy, y_max - y0)):
+            ratio = np.divide(q, p, out=np.zeros(n), where=p != 0)
+            u0 = np.where(p < 0, np.maximum(u0, ratio), u0)
+            u1 = np.where(p > 0, np.minimum(u1, ratio), u1)
+            rejected |= ((p == 0) & (q < 0)) | (u0 > u1)
+        result[:, 0, 0], result[:, 0, 1] = np.rint(x0 + u0 * dx), np.rint(y0 + u0 * dy)
+        result[:, 1, 0], result[:, 1, 1] = np.rint(x0 + u1 * dx), np.rint(y0 + u1 * dy)
+
+    result[rejected] = 0
+    return result, rejected
+
+
+def ranges(starts, counts):
+    """展开若干连续区间 [starts[i], starts[i] + counts[i]) 为一个下标数组"""
+    counts = np.asarray(counts, np.int64)
+    total = int(counts.sum())
+    return np.repeat(np.asarray(starts, np.int64) - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+class PrimitiveStore:
+    """
+    图元存储：第i个图元的顶点为 vertices[offsets[i]:offsets[i] + lengths[i]]；
+    类型和算法以整数编码保存，颜色打包为 0xRRGGBB；下标即绘制顺序
+    """
+    def __init__(self):
+        self.ids = []               # 下标 -> 图元ID
+        self.index = {}             # 图元ID -> 下标
+        self.algorithms = []        # 算法编码 -> 算法名称
+        self.algorithm_codes = {}   # 算法名称 -> 算法编码
+        self.types = np.empty(0, np.uint8)
+        self.algorithm = np.empty(0, np.uint8)
+        self.colors = np.empty(0, np.uint32)
+        self.offsets = np.empty(0, np.int64)
+        self.lengths = np.empty(0, np.int32)
+        self.vertices = np.empty((0, 2), np.int32)
+        self.vertex_count = 0       # vertices中已使用的行数
+        self.garbage = 0            # 图元顶点数变化后遗留的无用行数
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.index
+
+    def intern(self, algorithm):
+        """返回算法名称的编码，新名称追加到算法表；编码超出algorithm列的取值范围时抛出ValueError"""
+        code = self.algorithm_codes.get(algorithm)
+        if code is None:
+            if len(self.algorithms) > np.iinfo(self.algorithm.dtype).max:
+                raise ValueError('算法名称不能超过%d种' % len(self.algorithms))
+            code = self.algorithm_codes[algorithm] = len(self.algorithms)
+            self.algorithms.append(algorithm)
+        return code
+
+    def _reserve_vertices(self, count):
+        """保证vertices末尾还能容纳count行，并返回这些行的起始位置"""
+        start = self.vertex_count
+        if start + count > len(self.vertices):
+            if self.garbage > start // 2:
+                self.compact()
+                start = self.vertex_count
+            if start + count > len(self.vertices):
+                # 按倍数扩容，避免每新增一个图元就复制一次数组
+                self.vertices = np.resize(self.vertices, (max(2 * len(self.vertices), start + count, 256), 2))
+        self.vertex_count = start + count
+        return start
+
+    def set(self, item_id, item_type, p_list, algorithm, color):
+        """新增或替换图元
+
+        :param item_id: (string) 图元ID
+        :param item_type: (string) 图元类型，'line'、'polygon'、'ellipse'、'curve'
+        :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 控制点坐标列表
+        :param algorithm: (string) 绘制算法
+        :param color: (int) 打包后的颜色 0xRRGGBB
+        :return: (int) 图元的下标
+        """
+        # 先检查坐标、类型和算法，出错时不留下写了一半的图元
+        points = as_points(p_list)
+        type_code = TYPE_CODES[item_type]
+        algorithm_code = self.intern(algorithm)
+        index = self.index.get(item_id)
+        if index is None:
+            index = self.index[item_id] = len(self.ids)
+            self.ids.append(item_id)
+            if index == len(self.types):
+                capacity = max(2 * index, 64)
+                self.types = np.resize(self.types, capacity)
+                self.algorithm = np.resize(self.algorithm, capacity)
+                self.colors = np.resize(self.colors, capacity)
+                self.offsets = np.resize(self.offsets, capacity)
+                self.lengths = np.resize(self.lengths, capacity)
+            self.lengths[index] = 0
+        self.types[index] = type_code
+        self.algorithm[index] = algorithm_code
+        self.colors[index] = color
+        self.set_points(index, points)
+        return index
+
+    def set_points(self, indices, points):
+        """替换图元的顶点；顶点数不变时原地写入，否则在vertices末尾重新分配
+
+        :param indices: (int or array of int) 图元下标
+        :param points: (array-like, shape (n, 2)) 这些图元按下标顺序拼接的新顶点
+        """
+        points = as_points(points)
+        if np.ndim(indices) == 0:
+            index = int(indices)
+            if len(points) != self.lengths[index]:
+                # 分配前先把旧顶点记为无用行：分配时若触发compact，旧顶点随之回收，而不会当作有效顶点复制
+                self.garbage += int(self.lengths[index])
+                self.lengths[index] = 0
+                self.offsets[index] = self._reserve_vertices(len(points))
+                self.lengths[index] = len(points)
+            start = self.offsets[index]
+            self.vertices[start:start + len(points)] = points
+        else:
+            indices = np.asarray(indices, np.int64)
+            self.vertices[ranges(self.offsets[indices], self.lengths[indices])] = points
+
+    def points(self, indices):
+        """图元的顶点
+
+        :param indices: (int or array of int) 图元下标
+        :return: (np.ndarray of int32, shape (n, 2)) 单个下标时为vertices的视图，否则为按下标顺序拼接的副本
+        """
+        if np.ndim(indices) == 0:
+            start = self.offsets[indices]
+            return self.vertices[start:start + self.lengths[indices]]
+        indices = np.asarray(indices, np.int64)
+        return self.vertices[ranges(self.offsets[indices], self.lengths[indices])]
+
+    def p_list(self, index):
+        """图元的控制点坐标列表 [[x0, y0], [x1, y1], ...]"""
+        return self.points(index).tolist()
+
+    def item_type(self, index):
+        return TYPES[self.types[index]]
+
+    def algorithm_name(self, index):
+        return self.algorithms[self.algorithm[index]]
+
+    def rgb(self, indices):
+        """图元的颜色，形状为 (n, 3) 的uint8数组"""
+        return unpack_rgb(self.colors[indices])
+
+    def item(self, item_id):
+        """图元参数
+
+        :param item_id: (string) 图元ID
+        :return: (list: [item_type, p_list, algorithm, color]) 与原先item_dict中的格式相同
+        """
+        index = self.index[item_id]
+        return [self.item_type(index), self.p_list(index), self.algorithm_name(index), self.rgb(index)[0]]
+
+    def translate(self, indices, dx, dy):
+        self.set_points(indices, translate_points(self.points(indices), dx, dy))
+
+    def rotate(self, indices, x, y, r):
+        self.set_points(indices, rotate_points(self.points(indices), x, y, r))
+
+    def scale(self, indices, x, y, s):
+        self.set_points(indices, scale_points(self.points(indices), x, y, s))
+
+    def compact(self):
+        """按下标顺序重新排列顶点，回收无用行"""
+        count = len(self.ids)
+        lengths = self.lengths[:count]
+        vertices = self.vertices[ranges(self.offsets[:count], lengths)]
+        self.offsets[:count] = np.cumsum(lengths) - lengths
+        self.vertices = vertices
+        self.vertex_count = len(vertices)
+        self.garbage = 0
+
+    def copy(self, indices=None):
+        """紧凑的深复制，可作为不可变快照交给其他进程
+
+        :param indices: (np.ndarray of int or None) 只复制这些图元，按给定顺序重新编号为 0, 1, ...；None为全部图元
+        :return: (PrimitiveStore) 副本
+        """
+        store = PrimitiveStore.__new__(PrimitiveStore)
+        if indices is None:
+            indices = slice(0, len(self.ids))
+            store.ids = list(self.ids)
+            store.index = dict(self.index)
+        else:
+            indices = np.asarray(indices, np.int64)
+            store.ids = [self.ids[k] for k in indices.tolist()]
+            store.index = dict(zip(store.ids, range(len(store.ids))))
+        store.algorithms = list(self.algorithms)
+        store.algorithm_codes = dict(self.algorithm_codes)
+        store.types = self.types[indices].copy()
+        store.algorithm = self.algorithm[indices].copy()
+        store.colors = self.colors[indices].copy()
+        store.lengths = self.lengths[indices].copy()
+        store.offsets = np.cumsum(store.lengths, dtype=np.int64) - store.lengths
+        store.vertices = self.vertices[ranges(self.offsets[indices], store.lengths)]
+        store.vertex_count = len(store.vertices)
+        store.garbage = 0
+        return store
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_algorithms中曲线的自适应采样与B样条基函数表"""
+
+import math
+import random
+
+import pytest
+
+import cg_algorithms as alg
+
+
+def bezier_point(p_list, u):
+    points = [list(map(float, p)) for p in p_list]
+    while len(points) > 1:
+        points = [[(1 - u) * a[0] + u * b[0], (1 - u) * a[1] + u * b[1]] for a, b in zip(points, points[1:])]
+    return points[0]
+
+
+def segment_distance(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length = dx * dx + dy * dy
+    t = 0 if length == 0 else max(0, min(1, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length))
+    return math.hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+
+
+def assert_connected(pixels):
+    """没有重复像素，且所有像素8连通（Bresenham直线可能反向输出，只检查像素集合的连通性）"""
+    remaining = set(map(tuple, pixels))
+    assert len(remaining) == len(pixels)
+    frontier = [remaining.pop()]
+    while frontier:
+        x, y = frontier.pop()
+        for neighbour in [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]:
+            if neighbour in remaining:
+                remaining.remove(neighbour)
+                frontier.append(neighbour)
+    assert not remaining
+
+
+@pytest.mark.parametrize('count', [2, 3, 4, 7, 12])
+def test_curve_steps_bounds_chord_error(count):
+    rng = random.Random(count)
+    for _ in range(20):
+        p_list = [[rng.randint(-200, 200), rng.randint(-200, 200)] for _ in range(count)]
+        steps = alg.curve_steps(p_list, 'Bezier')
+        assert steps & (steps - 1) == 0
+        # 每段曲线与其弦的距离不超过默认容差0.25像素
+        for s in range(steps):
+            a, b = bezier_point(p_list, s / steps), bezier_point(p_list, (s + 1) / steps)
+            for t in range(1, 8):
+                point = bezier_point(p_list, (s + t / 8) / steps)
+                assert segment_distance(point, a, b) <= 0.25 + 1e-9
+
+
+def test_curve_steps_limited_by_length():
+    # 共线且等距的控制点二阶差分为0，只需一段
+    assert alg.curve_steps([[0, 0], [10, 0], [20, 0], [30, 0]], 'Bezier') == 1
+    # 很短的曲线不会过度采样：段数不超过控制多边形总长向上取到2的整数次幂
+    assert alg.curve_steps([[0, 0], [1, 3], [2, 0], [3, 3]], 'Bezier') <= 16
+    assert alg.curve_steps([[0, 0]], 'Bezier') == 1
+    assert alg.curve_steps([[0, 0], [500, 900], [-400, 800], [900, 0], [0, 0]], 'B-spline') >= 16
+
+
+def test_join_samples_connects_without_duplicates():
+    samples = [(0, 0), (0, 0), (5, 2), (5, 2), (5, 2), (2, 9), (0, 0)]
+    pixels = alg.join_samples(samples)
+    assert pixels[0] == [0, 0] and [5, 2] in pixels and [2, 9] in pixels
+    # 回到起点时不重复输出已有的像素
+    assert len(set(map(tuple, pixels))) == len(pixels)
+    assert alg.join_samples([(3, 4)]) == [[3, 4]]
+    assert alg.join_samples([]) == []
+
+
+@pytest.mark.parametrize('steps', [1, 2, 8, 64])
+def test_bspline_basis_table_matches_de_boor_cox(steps):
+    table = alg.bspline_basis_table(steps)
+    assert len(table) == steps and all(len(row) == 4 for row in table)
+    for s, row in enumerate(table):
+        # 各段共用同一张表：第j段的权重与第0段逐位相同
+        for j in (0, 1, 5):
+            assert row == [alg.de_boor_cox(j + m, 4, 3 + j + s / steps) for m in range(4)]
+        assert sum(row) == pytest.approx(1, abs=1e-12)
+    assert table[0] == pytest.approx([1 / 6, 2 / 3, 1 / 6, 0])
+
+
+@pytest.mark.parametrize('algorithm', ['Bezier', 'B-spline'])
+def test_draw_curve_has_no_gaps(algorithm):
+    # 自适应采样的段数较少，相邻采样点之间由直线连接，不会出现缺口
+    rng = random.Random(12)
+    for count in (4, 6, 10):
+        xs = sorted(rng.sample(range(300), count))
+        p_list = [[x, rng.randint(0, 300)] for x in xs]
+        pixels = alg.draw_curve(p_list, algorithm)
+        assert_connected(pixels)
+        if algorithm == 'Bezier':
+            assert p_list[0] in pixels and p_list[-1] in pixels
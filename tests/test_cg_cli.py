@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_cli的各种绘制模式与逐图元直接绘制的画布对照，以及cg_image的流式图像写出"""
+
+import io
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import cg_cli
+import cg_image
+import cg_parser
+import cg_raster
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+import gen_workload  # noqa: E402
+
+WIDTH, HEIGHT = 300, 200
+# 除普通的Renderer外的各种模式：并行保存、分块并行（图块边长不整除画布以检查接缝）、外存条带（每条带45行，不整除画布高度）
+MODES = {
+    'jobs': dict(jobs=2),
+    'tiled': dict(tile_jobs=2, tile_size=61),
+    'memmap-bmp': dict(memory_budget=WIDTH * 16 * 45),
+    'memmap-ppm': dict(memory_budget=WIDTH * 16 * 45, image_format='ppm'),
+    'ppm': dict(image_format='ppm'),
+}
+
+
+def build_script(path):
+    """约3000条指令：图元的控制点常超出画布，每隔100条保存一次，其中每三次连续保存两次并另存为同名的same，
+    中途对线段编组后变换并执行clipAll"""
+    lines = list(gen_workload.generate(3000, save_every=100, width=WIDTH, height=HEIGHT, span=80, seed=3))
+    line_ids = [line.split()[1] for line in lines if line.startswith('drawLine')]
+    extra = {
+        1: ['drawEllipse big -100 -80 420 260', 'drawLine out -50 -30 400 260 Bresenham'],
+        1500: ['group g ' + ' '.join(line_ids[:40:3] + line_ids[:2]), 'translateGroup g 15 -7',
+               'rotateGroup g 150 100 30', 'scaleGroup g 100 100 1.5', 'saveCanvas group'],
+        2000: ['clipAll 40 30 260 170 Liang-Barsky', 'saveCanvas clipped'],
+    }
+    script = []
+    for number, line in enumerate(lines):
+        script.append(line)
+        script.extend(extra.get(number, []))
+        if line.startswith('saveCanvas') and int(line.split()[1]) % 3 == 0:
+            script.append('saveCanvas same')
+    with open(path, 'w') as fp:
+        fp.write('\n'.join(script) + '\n')
+
+
+def read_images(directory):
+    """读取目录下的所有图像：不含扩展名的名称 -> RGB数组"""
+    images = {}
+    for name in os.listdir(directory):
+        with Image.open(os.path.join(directory, name)) as image:
+            images[os.path.splitext(name)[0]] = np.asarray(image.convert('RGB'))
+    return images
+
+
+def paint(store, width, height):
+    """逐图元完整光栅化后按绘制顺序直接写入画布，作为各模式的对照"""
+    canvas = np.full((height, width, 3), 255, np.uint8)
+    for k in range(len(store)):
+        pixels = cg_raster.rasterize(store.item_type(k), store.p_list(k), store.algorithm_name(k))
+        x, y = pixels[:, 0], pixels[:, 1]
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        canvas[y[inside], x[inside]] = store.rgb(k)[0]
+    return canvas
+
+
+def run(script, directory, **options):
+    os.makedirs(directory)
+    with cg_cli.Interpreter(directory, **options) as interpreter:
+        interpreter.run(cg_parser.parse_file(script))
+    return interpreter
+
+
+@pytest.fixture(scope='module')
+def reference(tmp_path_factory):
+    """脚本路径与普通Renderer保存的全部图像"""
+    root = tmp_path_factory.mktemp('cli')
+    script = str(root / 'script.txt')
+    build_script(script)
+    interpreter = run(script, str(root / 'plain'))
+    images = read_images(str(root / 'plain'))
+    # 最后一次保存的画布与直接绘制的结果相同
+    assert np.array_equal(images['29'], paint(interpreter.store, WIDTH, HEIGHT))
+    return script, images
+
+
+def test_reference_script(reference):
+    script, images = reference
+    with open(script) as fp:
+        assert len(fp.readlines()) > 3000
+    assert len(images) == 30 + 3
+    assert not np.array_equal(images['same'], images['29'])
+
+
+@pytest.mark.parametrize('mode', sorted(MODES))
+def test_mode_matches_plain_renderer(reference, tmp_path, mode):
+    script, expected = reference
+    run(script, str(tmp_path / mode), **MODES[mode])
+    images = read_images(str(tmp_path / mode))
+    assert sorted(images) == sorted(expected)
+    for name in expected:
+        assert np.array_equal(images[name], expected[name]), name
+
+
+def test_same_name_saves_keep_order(tmp_path):
+    # 同名文件多次保存时，最后写入的是最后一次保存时的画布
+    script = str(tmp_path / 'script.txt')
+    with open(script, 'w') as fp:
+        fp.write('resetCanvas 50 40\nsetColor 255 0 0\n')
+        for k in range(12):
+            fp.write('drawLine %d 0 %d 49 %d DDA\nsaveCanvas out\nsaveCanvas out\n' % (k, k, k))
+        fp.write('translate 0 5 0\nsaveCanvas out\n')
+    # 第k条线段为第k行；最后平移的第0条线段超出画布的部分被裁去
+    expected = np.full((40, 50, 3), 255, np.uint8)
+    expected[:12] = (255, 0, 0)
+    expected[0, :5] = 255
+    for mode, options in [('plain', {})] + sorted(MODES.items()):
+        run(script, str(tmp_path / mode), **options)
+        images = read_images(str(tmp_path / mode))
+        assert list(images) == ['out'], mode
+        assert np.array_equal(images['out'], expected), mode
+
+
+def test_group_commands_match_per_item_commands(tmp_path):
+    rng = random.Random(13)
+    header = ['resetCanvas 200 150']
+    for k in range(12):
+        x, y = rng.randint(0, 200), rng.randint(0, 150)
+        header.append('drawPolygon %d %d %d %d %d %d %d DDA' % (k, x, y, x + 30, y + 5, x + 10, y + 40))
+    members = ['1', '3', '4', '8', '3', '11']
+    steps = [('translate', '17 -9'), ('rotate', '100 70 33'), ('scale', '90 60 0.7'), ('translate', '-4 12')]
+    grouped = header + ['group g ' + ' '.join(members)]
+    grouped += ['%sGroup g %s' % step for step in steps] + ['saveCanvas out']
+    per_item = list(header)
+    # 组内重复的ID只变换一次
+    for name, args in steps:
+        per_item += ['%s %s %s' % (name, item_id, args) for item_id in dict.fromkeys(members)]
+    per_item.append('saveCanvas out')
+    stores, images = [], []
+    for name, lines in (('grouped', grouped), ('per-item', per_item)):
+        script = str(tmp_path / (name + '.txt'))
+        with open(script, 'w') as fp:
+            fp.write('\n'.join(lines) + '\n')
+        stores.append(run(script, str(tmp_path / name)).store)
+        images.append(read_images(str(tmp_path / name))['out'])
+    assert [stores[0].p_list(k) for k in range(12)] == [stores[1].p_list(k) for k in range(12)]
+    # 组外的图元不变
+    assert stores[0].p_list(0) == cg_parser.parse_line(header[1]).p_list
+    assert stores[0].p_list(1) != cg_parser.parse_line(header[2]).p_list
+    assert np.array_equal(images[0], images[1])
+
+
+def test_tiled_renderer_redraws_only_touched_tiles(monkeypatch):
+    redrawn = []
+    render_tiled = cg_cli.render_tiled
+
+    def record(pool, memory, shape, store, tiles, rects):
+        redrawn.append(sorted(rects))
+        render_tiled(pool, memory, shape, store, tiles, rects)
+
+    monkeypatch.setattr(cg_cli, 'render_tiled', record)
+    renderer = cg_cli.TiledRenderer(100, 100, jobs=2, tile_size=50)
+    try:
+        store = renderer.store
+        renderer.mark([store.set('a', 'line', [[5, 5], [20, 5]], 'DDA', 0)])
+        renderer.mark([store.set('b', 'line', [[60, 60], [90, 90]], 'DDA', 0)])
+        renderer.render()
+        pool = renderer.pool
+        assert redrawn == [[(0, 0, 50, 50), (50, 50, 100, 100)]]
+        # 图元移出的图块中不再有图元，也要重绘为白色
+        store.translate(store.index['a'], 60, 0)
+        renderer.mark([store.index['a']])
+        renderer.render()
+        assert redrawn[-1] == [(0, 0, 50, 50), (50, 0, 100, 50)]
+        assert np.array_equal(renderer.canvas, paint(store, 100, 100))
+        assert not renderer.render() and len(redrawn) == 2
+        # 重置画布后共享内存改变，进程池继续使用
+        renderer.reset(80, 60)
+        renderer.mark([renderer.store.set('c', 'ellipse', [[10, 10], [70, 50]], 'null', 0)])
+        renderer.render()
+        assert renderer.pool is pool
+        assert np.array_equal(renderer.canvas, paint(renderer.store, 80, 60))
+    finally:
+        renderer.close()
+    assert renderer.pool is None and renderer.memory is None
+
+
+def test_incremental_render_matches_full_render():
+    rng = random.Random(11)
+    renderer = cg_cli.Renderer(120, 80)
+    store = renderer.store
+    for step in range(300):
+        item_id = str(rng.randrange(40))
+        if item_id in store and rng.random() < 0.5:
+            index = store.index[item_id]
+            store.translate(index, rng.randint(-30, 30), rng.randint(-30, 30))
+        else:
+            x, y = rng.randint(-20, 130), rng.randint(-20, 90)
+            item_type = rng.choice(('line', 'polygon', 'ellipse'))
+            p_list = [[x, y], [x + rng.randint(1, 40), y + rng.randint(1, 40)]]
+            if item_type == 'polygon':
+                p_list.append([x - rng.randint(0, 30), y + rng.randint(0, 30)])
+            index = store.set(item_id, item_type, p_list, 'DDA', rng.randrange(1 << 24))
+        renderer.mark([index])
+        if step % 7 == 0:
+            renderer.render()
+            full = cg_cli.Renderer(120, 80)
+            full.load(store.copy())
+            full.render()
+            assert np.array_equal(renderer.canvas, full.canvas)
+            assert np.array_equal(renderer.canvas, paint(store, 120, 80))
+    # 没有修改时不重绘
+    renderer.render()
+    assert not renderer.render()
+
+
+def test_composite_order_and_clipping():
+    canvas = np.full((10, 10, 3), 255, np.uint8)
+    buffers = [np.array([[1, 1], [2, 2], [3, 3], [-1, 0], [20, 5]], np.int32),
+               np.array([[2, 2], [4, 4], [9, 9]], np.int32),
+               np.empty((0, 2), np.int32),
+               np.array([[3, 3], [2, 2]], np.int32)]
+    colors = np.array([[1, 1, 1], [2, 2, 2], [3, 3, 3], [4, 4, 4]], np.uint8)
+    cg_cli.composite(canvas, buffers, colors, (0, 0, 5, 5))
+    expected = np.full((10, 10, 3), 255, np.uint8)
+    expected[1, 1], expected[2, 2], expected[3, 3], expected[4, 4] = 1, 4, 4, 2
+    # 区域外（包括画布外）的像素被丢弃
+    assert np.array_equal(canvas, expected)
+    # 只保存行条带时按offset换算行号
+    strip = np.full((3, 10, 3), 255, np.uint8)
+    cg_cli.composite(strip, buffers, colors, (0, 2, 10, 5), offset=2)
+    assert np.array_equal(strip, expected[2:5])
+
+
+@pytest.mark.parametrize('width, height, rows', [(7, 5, 2), (8, 3, 1), (13, 9, 100)])
+def test_writers_match_pillow(tmp_path, width, height, rows):
+    # 宽度不是4的倍数时BMP每行需要补齐
+    pixels = np.random.default_rng(width).integers(0, 256, (height, width, 3), np.uint8)
+    framebuffer = cg_image.Framebuffer(width, height, str(tmp_path))
+    strip = framebuffer.strip(0, height)
+    strip[:] = pixels
+    strip.flush()
+    del strip
+    for fmt, writer in cg_image.WRITERS.items():
+        written, expected = io.BytesIO(), io.BytesIO()
+        writer(written, framebuffer, rows)
+        Image.fromarray(pixels).save(expected, fmt)
+        assert written.getvalue() == expected.getvalue(), fmt
+    path = framebuffer.path
+    framebuffer.close()
+    assert not os.path.exists(path)
+
+
+def test_framebuffer_strips():
+    framebuffer = cg_image.Framebuffer(4, 10)
+    try:
+        assert framebuffer.strips(4) == [(0, 4), (4, 8), (8, 10)]
+        assert framebuffer.strip(8, 10).shape == (2, 4, 3)
+    finally:
+        framebuffer.close()
+
+
+def test_bmp_size_limit():
+    with pytest.raises(ValueError):
+        cg_image.bmp_header(40000, 40000)
+    assert len(cg_image.bmp_header(1, 1)) == 54
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_gui中图元列表的数据模型：批量插入与删除、行号映射和发给视图的通知"""
+
+import os
+import random
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import cg_gui  # noqa: E402
+
+
+@pytest.fixture
+def model():
+    """数据模型及其发出的插入、删除通知 (信号, 首行, 末行)"""
+    model = cg_gui.ItemListModel()
+    model.events = []
+    model.rowsInserted.connect(lambda parent, first, last: model.events.append(('insert', first, last)))
+    model.rowsRemoved.connect(lambda parent, first, last: model.events.append(('remove', first, last)))
+    return model
+
+
+def check_rows(model, ids):
+    assert model.ids == ids and model.rowCount() == len(ids)
+    assert model.rows == {item_id: row for row, item_id in enumerate(ids)}
+    assert [model.data(model.index(row)) for row in range(len(ids))] == ids
+
+
+def test_row_runs():
+    assert cg_gui.row_runs([]) == []
+    assert cg_gui.row_runs([4]) == [(4, 4)]
+    assert cg_gui.row_runs([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+
+
+def test_append_ignores_duplicates(model):
+    model.append(['a', 'b', 'a'])
+    model.append(['b', 'c'])
+    model.append(['c'])
+    check_rows(model, ['a', 'b', 'c'])
+    # 每次批量插入只通知一次，没有新ID时不通知
+    assert model.events == [('insert', 0, 1), ('insert', 2, 2)]
+    assert 'b' in model and 'x' not in model
+    assert model.row_of('c') == 2 and model.row_of('x') is None and model.id_at(1) == 'b'
+
+
+def test_remove_notifies_contiguous_runs(model):
+    model.append([str(k) for k in range(10)])
+    model.events.clear()
+    model.remove(['8', '2', '3', 'missing', '9', '5', '3'])
+    check_rows(model, ['0', '1', '4', '6', '7'])
+    # 从后往前按连续的行删除
+    assert model.events == [('remove', 8, 9), ('remove', 5, 5), ('remove', 2, 3)]
+    model.events.clear()
+    model.remove(['missing'])
+    assert model.events == []
+
+
+def test_random_append_remove_and_clear(model):
+    rng = random.Random(17)
+    ids = []
+    for _ in range(200):
+        if rng.random() < 0.6:
+            batch = [str(rng.randrange(100)) for _ in range(rng.randint(1, 8))]
+            model.append(batch)
+            ids += [item_id for item_id in dict.fromkeys(batch) if item_id not in ids]
+        else:
+            batch = set(rng.sample(ids, min(len(ids), rng.randint(0, 6))))
+            model.remove(batch)
+            ids = [item_id for item_id in ids if item_id not in batch]
+        check_rows(model, ids)
+    model.clear()
+    check_rows(model, [])
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_journal的读取、提交与回滚、压缩和重放"""
+
+import os
+
+import pytest
+
+import cg_journal
+import cg_scene
+
+
+@pytest.fixture
+def scene_path(tmp_path):
+    return str(tmp_path / 'scene.cgs')
+
+
+def open_journal(scene_path):
+    return cg_journal.Journal(cg_journal.journal_path(scene_path))
+
+
+def test_journal_file_created_on_first_record(scene_path):
+    path = cg_journal.journal_path(scene_path)
+    journal = cg_journal.Journal(path)
+    assert not os.path.exists(path)
+    assert journal.size == 0 and not journal.pending
+    journal.commit()
+    journal.rollback()
+    journal.clear()
+    assert not os.path.exists(path)
+    journal.delete('a')
+    assert os.path.exists(path) and journal.pending
+    journal.close()
+    # 关闭后不会重新创建并覆盖已有的日志
+    with pytest.raises(FileExistsError):
+        journal.delete('b')
+
+
+def test_read_drops_torn_last_line(scene_path):
+    journal = open_journal(scene_path)
+    journal.set('a', 'line', [[0, 0], [1, 1]], 'DDA', (1, 2, 3))
+    journal.close()
+    path = cg_journal.journal_path(scene_path)
+    complete = os.path.getsize(path)
+    with open(path, 'ab') as fp:
+        fp.write(b'{"op":"set","id":"b","type":"li')
+    contents = cg_journal.read(path)
+    assert [record['id'] for record in contents.records] == ['a']
+    assert contents.end == complete and contents.pending == 1
+    # 重新打开时截去写到一半的行，之后的记录接在完整记录后面
+    journal = cg_journal.Journal(path)
+    journal.delete('a')
+    journal.close()
+    assert [record['op'] for record in cg_journal.read(path).records] == ['set', 'delete']
+
+
+@pytest.mark.parametrize('damage', [
+    lambda line: line[:5] + b'#' + line[6:],
+    lambda line: b'[1, 2]\n',
+    lambda line: b'{"op":"set","id":"1"}\n',
+], ids=['flipped-byte', 'not-an-object', 'missing-fields'])
+def test_corrupt_middle_line_raises_without_truncating(scene_path, damage):
+    journal = open_journal(scene_path)
+    for k in range(5):
+        journal.set(str(k), 'line', [[k, k], [k + 1, k]], 'DDA', (0, 0, 0))
+    journal.commit()
+    journal.close()
+    path = cg_journal.journal_path(scene_path)
+    with open(path, 'rb') as fp:
+        lines = fp.readlines()
+    lines[2] = damage(lines[2])
+    with open(path, 'wb') as fp:
+        fp.write(b''.join(lines))
+    size = os.path.getsize(path)
+    # 以换行符结尾的行损坏时整个文件都不可信，不能当作写到一半的行截去其后已保存的记录
+    with pytest.raises(cg_journal.JournalError, match='第3行'):
+        cg_journal.load(scene_path)
+    with pytest.raises(cg_journal.JournalError):
+        cg_journal.Journal(path)
+    assert os.path.getsize(path) == size
+
+
+def test_commit_and_rollback_replay(scene_path):
+    journal = open_journal(scene_path)
+    journal.reset(300, 200)
+    journal.set('a', 'line', [[0, 0], [1, 1]], 'DDA', (1, 2, 3))
+    journal.set('b', 'ellipse', [[0, 0], [4, 2]], 'null', (0, 0, 0))
+    journal.commit()
+    assert not journal.pending
+    journal.set('a', 'line', [[5, 5], [6, 6]], 'Bresenham', (9, 9, 9))
+    journal.delete('b')
+    items, size, pending = cg_journal.load(scene_path)
+    assert size == (300, 200) and pending == 2
+    assert items == {'a': ('line', [[5, 5], [6, 6]], 'Bresenham', (9, 9, 9))}
+    journal.rollback()
+    items, size, pending = cg_journal.load(scene_path)
+    assert pending == 0
+    assert items == {'a': ('line', [[0, 0], [1, 1]], 'DDA', (1, 2, 3)),
+                     'b': ('ellipse', [[0, 0], [4, 2]], 'null', (0, 0, 0))}
+    journal.close()
+
+
+def test_compaction_replay(scene_path, monkeypatch):
+    monkeypatch.setattr(cg_journal, 'COMPACT_MIN_BYTES', 0)
+    journal = open_journal(scene_path)
+    items = {}
+    for k in range(5):
+        items[str(k)] = ('line', [[k, k], [k + 1, k]], 'DDA', (k, k, k))
+        journal.set(str(k), *items[str(k)])
+    journal.delete('2')
+    del items['2']
+    assert journal.needs_compaction(scene_path)
+    journal.compact(scene_path, [(item_id,) + item for item_id, item in items.items()], 50, 60)
+    assert journal.size == 0 and not journal.pending
+    # 压缩后的修改记在新的日志中，重放时覆盖快照中的图元
+    journal.set('0', 'line', [[7, 7], [8, 8]], 'DDA', (0, 0, 0))
+    journal.close()
+    with cg_scene.SceneFile(scene_path) as scene:
+        assert [item[0] for item in scene] == ['0', '1', '3', '4']
+    loaded, size, pending = cg_journal.load(scene_path)
+    items['0'] = ('line', [[7, 7], [8, 8]], 'DDA', (0, 0, 0))
+    assert loaded == items and size == (50, 60) and pending == 1
+
+
+def test_needs_compaction_compares_with_snapshot(scene_path, monkeypatch):
+    monkeypatch.setattr(cg_journal, 'COMPACT_MIN_BYTES', 0)
+    cg_scene.save(scene_path, [('x', 'polygon', [[k, k] for k in range(1000)], 'DDA', (0, 0, 0))])
+    journal = open_journal(scene_path)
+    journal.delete('x')
+    assert not journal.needs_compaction(scene_path)
+    journal.close()
+
+
+@pytest.mark.parametrize('header', [b'["x"]\n', b'{"journal": 99}\n', b'{"op":"commit"}\n'])
+def test_bad_header_raises_and_quarantine(scene_path, header):
+    path = cg_journal.journal_path(scene_path)
+    with open(path, 'wb') as fp:
+        fp.write(header)
+    with pytest.raises(cg_journal.JournalError):
+        cg_journal.Journal(path)
+    with pytest.raises(cg_journal.JournalError):
+        cg_journal.load(scene_path)
+    assert cg_journal.quarantine(path) == path + '.corrupt'
+    assert not os.path.exists(path)
+    journal = cg_journal.Journal(path)
+    journal.delete('a')
+    journal.close()
+    assert cg_journal.load(scene_path) == ({}, None, 1)
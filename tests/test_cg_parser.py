@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_parser的坐标解析与流式逐行解析"""
+
+import io
+
+import pytest
+
+import cg_parser
+
+# 超过FAST_PATH_LENGTH、走NumPy解析的坐标文本
+LONG = ' '.join(str(value) for value in range(-100, 100))
+
+
+def test_parse_points_short_and_long():
+    assert cg_parser.parse_points('1 2 -3 4') == [[1, 2], [-3, 4]]
+    assert cg_parser.parse_points('') == []
+    assert len(LONG) > cg_parser.FAST_PATH_LENGTH
+    points = cg_parser.parse_points(LONG)
+    assert points == [[value, value + 1] for value in range(-100, 100, 2)]
+    assert cg_parser.parse_points(LONG.replace(' ', ' \t ')) == points
+
+
+@pytest.mark.parametrize('text', ['1 2 3', LONG + ' 7'])
+def test_parse_points_rejects_odd_count(text):
+    with pytest.raises(ValueError):
+        cg_parser.parse_points(text)
+
+
+@pytest.mark.parametrize('text', ['1 2 x 4', '1.5 2', LONG + ' x 5', LONG + ' 1.5 2', LONG + ' 1,2'])
+def test_parse_points_rejects_invalid_tokens(text):
+    with pytest.raises(ValueError):
+        cg_parser.parse_points(text)
+
+
+def test_parse_line():
+    assert cg_parser.parse_line('drawPolygon p1 0 0 10 0 5 5 DDA') == \
+        cg_parser.Draw('p1', 'polygon', [[0, 0], [10, 0], [5, 5]], 'DDA')
+    assert cg_parser.parse_line('drawLine l 1 2 3 4 Bresenham') == \
+        cg_parser.Draw('l', 'line', [[1, 2], [3, 4]], 'Bresenham')
+    assert cg_parser.parse_line('scale l 1 2 0.5') == cg_parser.Scale('l', 1, 2, 0.5)
+    assert cg_parser.parse_line('   ') is None
+    assert cg_parser.parse_line('unknownCommand 1 2') is None
+
+
+def test_parse_reports_line_number():
+    with pytest.raises(ValueError, match='第2行'):
+        list(cg_parser.parse(io.StringIO('resetCanvas 10 10\ndrawCurve c 1 2 3 Bezier\n')))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, cg_parser.CHUNK_SIZE])
+def test_parse_independent_of_chunk_size(chunk_size):
+    text = 'resetCanvas 100 100\n\ndrawCurve c %s Bezier\nsetColor 1 2 3\nsaveCanvas out' % LONG
+    commands = list(cg_parser.parse(io.StringIO(text), chunk_size))
+    assert commands == [cg_parser.ResetCanvas(100, 100),
+                        cg_parser.Draw('c', 'curve', cg_parser.parse_points(LONG), 'Bezier'),
+                        cg_parser.SetColor(1, 2, 3), cg_parser.SaveCanvas('out')]
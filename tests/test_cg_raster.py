@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_raster的批量光栅化与cg_algorithms中逐图元的标量实现对照"""
+
+import random
+
+import numpy as np
+import pytest
+
+import cg_algorithms as alg
+import cg_raster
+
+RECT = (20, 30, 120, 90)
+
+
+def random_segments(rng, count=200, span=60):
+    segments = []
+    for _ in range(count):
+        x, y = rng.randint(-20, 150), rng.randint(-20, 150)
+        segments.append([[x, y], [x + rng.randint(-span, span), y + rng.randint(-span, span)]])
+    # 水平、垂直、反向垂直、单点和45°的线段
+    segments += [[[0, 5], [40, 5]], [[7, 0], [7, 40]], [[7, 40], [7, 0]], [[3, 3], [3, 3]], [[0, 0], [30, 30]],
+                 [[30, 0], [0, 30]]]
+    return segments
+
+
+def as_list(pixels):
+    """标量实现返回元组列表，统一为列表的列表再比较"""
+    return [list(pixel) for pixel in pixels]
+
+
+def as_set(pixels):
+    return {tuple(pixel) for pixel in np.asarray(pixels).reshape(-1, 2).tolist()}
+
+
+def assert_contains_visible(pixels, reference, rect):
+    """给定可见区域时，结果须包含完整绘制时落在区域内的全部像素"""
+    expected = as_set(cg_raster.crop(np.asarray(reference, np.int64).reshape(-1, 2), rect))
+    assert expected <= as_set(pixels)
+
+
+@pytest.mark.parametrize('algorithm', ['Naive', 'DDA', 'Bresenham'])
+def test_draw_lines_matches_scalar(algorithm):
+    segments = random_segments(random.Random(1))
+    pixels, offsets = cg_raster.draw_lines(segments, algorithm)
+    assert len(offsets) == len(segments) + 1
+    for i, segment in enumerate(segments):
+        assert pixels[offsets[i]:offsets[i + 1]].tolist() == as_list(alg.draw_line(segment, algorithm))
+
+
+@pytest.mark.parametrize('algorithm', ['Naive', 'DDA', 'Bresenham'])
+def test_draw_lines_rect_keeps_visible_pixels(algorithm):
+    segments = random_segments(random.Random(2))
+    pixels, offsets = cg_raster.draw_lines(segments, algorithm, RECT)
+    for i, segment in enumerate(segments):
+        assert_contains_visible(pixels[offsets[i]:offsets[i + 1]], alg.draw_line(segment, algorithm), RECT)
+
+
+@pytest.mark.parametrize('algorithm', ['DDA', 'Bresenham'])
+def test_draw_polygon_matches_scalar(algorithm):
+    rng = random.Random(3)
+    for count in (3, 5, 12):
+        p_list = [[rng.randint(0, 100), rng.randint(0, 100)] for _ in range(count)]
+        assert cg_raster.draw_polygon(p_list, algorithm).tolist() == as_list(alg.draw_polygon(p_list, algorithm))
+
+
+@pytest.mark.parametrize('p_list', [[[10, 20], [90, 60]], [[90, 60], [10, 20]], [[0, 0], [1, 1]], [[5, 5], [5, 45]],
+                                    [[-40, -10], [160, 130]], [[0, 0], [301, 7]]])
+def test_draw_ellipse_matches_scalar(p_list):
+    reference = alg.draw_ellipse(p_list)
+    assert as_set(cg_raster.draw_ellipse(p_list)) == as_set(reference)
+    assert as_set(cg_raster.draw_ellipse(p_list, RECT)) == as_set(cg_raster.crop(np.array(reference).reshape(-1, 2),
+                                                                                 RECT))
+
+
+def test_draw_bspline_matches_scalar():
+    rng = random.Random(4)
+    for count in (4, 5, 9, 20):
+        p_list = [[rng.randint(0, 150), rng.randint(0, 150)] for _ in range(count)]
+        reference = alg.draw_curve(p_list, 'B-spline')
+        assert cg_raster.draw_curve(p_list, 'B-spline').tolist() == as_list(reference)
+        assert_contains_visible(cg_raster.draw_curve(p_list, 'B-spline', RECT), reference, RECT)
+    assert len(cg_raster.draw_curve([[0, 0], [1, 1], [2, 2]], 'B-spline')) == 0
+
+
+def test_bspline_samples_indices_match_full():
+    rng = random.Random(6)
+    p_list = [[rng.randint(0, 500), rng.randint(0, 500)] for _ in range(9)]
+    full = cg_raster.bspline_samples(p_list, 16)
+    assert len(full) == 6 * 16 + 1
+    indices = np.array([0, 1, 15, 16, 47, 95, 96])
+    assert cg_raster.bspline_samples(p_list, 16, indices).tolist() == full[indices].tolist()
+
+
+def test_draw_bezier_within_one_pixel_of_scalar():
+    rng = random.Random(5)
+    for count in (2, 3, 4, 8, 16):
+        p_list = [[rng.randint(0, 150), rng.randint(0, 150)] for _ in range(count)]
+        pixels = cg_raster.draw_curve(p_list, 'Bezier').astype(np.int64)
+        reference = np.array(alg.draw_curve(p_list, 'Bezier'), np.int64)
+        # 两者的每个像素到对方最近像素的切比雪夫距离都不超过1
+        distance = np.abs(pixels[:, None, :] - reference[None, :, :]).max(axis=2)
+        assert distance.min(axis=1).max() <= 1
+        assert distance.min(axis=0).max() <= 1
+        assert {tuple(p_list[0]), tuple(p_list[-1])} <= as_set(pixels)
+
+
+@pytest.mark.parametrize('degree', [3, 100, 512, 513, 600, 1000])
+def test_bezier_samples_match_de_casteljau(degree):
+    rng = random.Random(degree)
+    p_list = [[rng.randint(0, 1000), rng.randint(0, 1000)] for _ in range(degree + 1)]
+    steps = 1 << 14
+    indices = np.arange(0, steps + 1, 64)
+    reference = cg_raster.bezier_de_casteljau(p_list, indices / steps)
+    evaluate = cg_raster.bezier_horner if degree <= cg_raster._HORNER_MAX_DEGREE else cg_raster.bezier_bernstein
+    assert np.abs(evaluate(p_list, indices / steps) - reference).max() < 1e-6
+    samples = cg_raster.bezier_samples(p_list, steps, indices)
+    assert np.abs(samples - reference).max() <= 0.5 + 1e-6
+
+
+def test_bezier_bernstein_any_degree():
+    # 远超Horner适用范围的次数下不溢出，端点精确
+    p_list = [[k % 37, (k * 7) % 53] for k in range(3001)]
+    points = cg_raster.bezier_bernstein(p_list, np.array([0, 0.25, 0.5, 1]))
+    assert np.isfinite(points).all()
+    assert points[0].tolist() == p_list[0] and points[-1].tolist() == p_list[-1]
+
+
+def test_draw_high_degree_bezier_rect():
+    rng = random.Random(9)
+    p_list = [[rng.randint(0, 300), rng.randint(0, 300)] for _ in range(700)]
+    full = cg_raster.draw_curve(p_list, 'Bezier')
+    assert {tuple(p_list[0]), tuple(p_list[-1])} <= as_set(full)
+    assert_contains_visible(cg_raster.draw_curve(p_list, 'Bezier', RECT), full, RECT)
+
+
+@pytest.mark.parametrize('degree', [1, 2, 3, 7, 20])
+def test_bezier_bernstein_matches_de_casteljau(degree):
+    rng = random.Random(degree)
+    p_list = [[rng.randint(-500, 500), rng.randint(-500, 500)] for _ in range(degree + 1)]
+    u = np.linspace(0, 1, 101)
+    points = cg_raster.bezier_bernstein(p_list, u)
+    assert np.abs(points - cg_raster.bezier_de_casteljau(p_list, u)).max() < 1e-9
+    assert points[0].tolist() == p_list[0] and points[-1].tolist() == p_list[-1]
+
+
+def test_preview_polyline():
+    p_list = [[10, 20], [90, 60], [40, 100], [0, 70]]
+    assert cg_raster.preview_polyline('line', p_list[:2], 'DDA').tolist() == p_list[:2]
+    assert cg_raster.preview_polyline('polygon', p_list, 'DDA').tolist() == p_list + p_list[:1]
+    ellipse = cg_raster.preview_polyline('ellipse', p_list[:2], 'null', samples=32)
+    assert len(ellipse) == 33 and ellipse[0].tolist() == ellipse[-1].tolist() == [90, 40]
+    assert (ellipse.min(axis=0) >= [10, 20]).all() and (ellipse.max(axis=0) <= [90, 60]).all()
+    # 曲线的折线顶点是曲线上的点，顶点数只与samples有关
+    bezier = cg_raster.preview_polyline('curve', p_list, 'Bezier', samples=16)
+    reference = cg_raster.bezier_de_casteljau(p_list, np.arange(17) / 16)
+    assert len(bezier) == 17 and np.abs(bezier - reference).max() <= 0.5
+    bspline = cg_raster.preview_polyline('curve', p_list * 3, 'B-spline', samples=64)
+    assert len(bspline) == 9 * 4 + 1
+    assert bspline.tolist() == cg_raster.bspline_samples(p_list * 3, 4).tolist()
+    assert cg_raster.preview_polyline('curve', p_list[:3], 'B-spline').shape == (0, 2)
+    assert cg_raster.preview_polyline('polygon', [], 'DDA').shape == (0, 2)
+
+
+def test_rasterize_dispatches_by_type():
+    p_list = [[0, 0], [5, 2]]
+    assert cg_raster.rasterize('line', p_list, 'DDA').tolist() == as_list(alg.draw_line(p_list, 'DDA'))
+    assert cg_raster.rasterize('unknown', [[0, 0]], 'DDA').shape == (0, 2)
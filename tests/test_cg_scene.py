@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_scene的场景文件读写、损坏文件的检查与旧版画布文件的导入"""
+
+import os
+import pickle
+import struct
+
+import pytest
+
+import cg_scene
+
+ITEMS = [
+    ('line0', 'line', [[0, 0], [10, 5]], 'DDA', (255, 0, 0)),
+    ('多边形', 'polygon', [[1, 1], [5, 1], [3, 4]], 'Bresenham', (0, 128, 255)),
+    ('e', 'ellipse', [[-20, -10], [20, 10]], 'null', (1, 2, 3)),
+    ('c', 'curve', [[0, 0], [10, 20], [30, 20], [40, 0], [60, -5]], 'B-spline', (0, 0, 0)),
+    ('empty', 'polygon', [], 'DDA', (9, 9, 9)),
+]
+# 文件头之后为段表，每段一项 (偏移, 元素个数)
+TABLE = struct.calcsize('<8sHHIIIQQ')
+ENTRY = struct.Struct('<QQ')
+
+
+@pytest.fixture
+def scene_path(tmp_path):
+    path = str(tmp_path / 'scene.cgs')
+    cg_scene.save(path, ITEMS, 640, 480)
+    return path
+
+
+def section(data, name):
+    """段在文件中的 (偏移, 元素个数) 及其在段表中的位置"""
+    k = [section_name for section_name, _ in cg_scene.SECTIONS].index(name)
+    position = TABLE + ENTRY.size * k
+    return ENTRY.unpack_from(data, position) + (position,)
+
+
+def test_round_trip(scene_path):
+    assert cg_scene.is_scene_file(scene_path)
+    assert not os.path.exists(scene_path + '.tmp')
+    with cg_scene.SceneFile(scene_path) as scene:
+        assert (scene.width, scene.height, len(scene)) == (640, 480, len(ITEMS))
+        assert list(scene) == ITEMS
+        assert scene.item_ids() == [item[0] for item in ITEMS]
+        assert scene.index_of('e') == 2 and scene.index_of('missing') is None
+        store = scene.to_store()
+    assert [store.item_type(k) for k in range(len(store))] == [item[1] for item in ITEMS]
+    assert [store.p_list(k) for k in range(len(store))] == [item[2] for item in ITEMS]
+    assert store.rgb(1).tolist() == [[0, 128, 255]]
+
+
+def test_empty_scene(tmp_path):
+    path = str(tmp_path / 'empty.cgs')
+    cg_scene.save(path, [])
+    with cg_scene.SceneFile(path) as scene:
+        assert len(scene) == 0 and list(scene) == [] and (scene.width, scene.height) == (0, 0)
+
+
+def corrupt(path, change):
+    with open(path, 'rb') as fp:
+        data = bytearray(fp.read())
+    change(data)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+def set_entry(name, offset=None, length=None):
+    def change(data):
+        old_offset, old_length, position = section(data, name)
+        ENTRY.pack_into(data, position, old_offset if offset is None else offset,
+                        old_length if length is None else length)
+    return change
+
+
+def set_element(name, value, fmt):
+    def change(data):
+        offset, _, _ = section(data, name)
+        struct.pack_into(fmt, data, offset, value)
+    return change
+
+
+@pytest.mark.parametrize('change', [
+    lambda data: data.__setitem__(slice(0, 8), b'NOTSCENE'),
+    lambda data: struct.pack_into('<H', data, 8, cg_scene.VERSION + 1),
+    set_entry('vertices', offset=1 << 40),
+    set_entry('vertices', offset=TABLE + 1),
+    set_entry('colors', length=2),
+    set_element('types', 7, '<B'),
+    set_element('algorithm', 200, '<B'),
+    set_element('lengths', 1000, '<i'),
+    set_element('offsets', -1, '<q'),
+    set_element('string_offsets', 5, '<q'),
+], ids=['magic', 'version', 'section-offset', 'section-alignment', 'section-length', 'type-code',
+        'algorithm-code', 'vertex-length', 'vertex-offset', 'string-table'])
+def test_rejects_corrupted_sections(scene_path, change):
+    corrupt(scene_path, change)
+    with pytest.raises(cg_scene.SceneFormatError):
+        cg_scene.SceneFile(scene_path)
+
+
+def test_rejects_truncated_file(scene_path):
+    with open(scene_path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(scene_path) - 8)
+    with pytest.raises(cg_scene.SceneFormatError):
+        cg_scene.SceneFile(scene_path)
+    with open(scene_path, 'r+b') as fp:
+        fp.truncate(20)
+    with pytest.raises(cg_scene.SceneFormatError):
+        cg_scene.SceneFile(scene_path)
+
+
+def test_import_pickle(tmp_path):
+    path = str(tmp_path / 'legacy.pkl')
+    with open(path, 'wb') as fp:
+        pickle.dump([['1', 'line', [[0, 0], [3, 4]], 'DDA', (10, 20, 30, 255)]], fp)
+    assert cg_scene.import_pickle(path) == [('1', 'line', [[0, 0], [3, 4]], 'DDA', (10, 20, 30))]
+
+
+@pytest.mark.parametrize('data', [
+    {'not': 'a list'},
+    [['1', 'hexagon', [[0, 0]], 'DDA', (0, 0, 0)]],
+    [['1', 'line', [[0, 0], [1 << 40, 0]], 'DDA', (0, 0, 0)]],
+    [['1', 'line', [[0, 0], [1, 1]], 'DDA', (300, 0, 0)]],
+    [['1', 'line']],
+])
+def test_import_pickle_rejects_bad_items(tmp_path, data):
+    path = str(tmp_path / 'legacy.pkl')
+    with open(path, 'wb') as fp:
+        pickle.dump(data, fp)
+    with pytest.raises(cg_scene.SceneFormatError):
+        cg_scene.import_pickle(path)
+
+
+class Exploit:
+    def __reduce__(self):
+        return os.system, ('echo should-not-run',)
+
+
+def test_import_pickle_refuses_objects(tmp_path):
+    path = str(tmp_path / 'evil.pkl')
+    with open(path, 'wb') as fp:
+        pickle.dump([Exploit()], fp)
+    with pytest.raises(cg_scene.SceneFormatError, match='不允许'):
+        cg_scene.import_pickle(path)
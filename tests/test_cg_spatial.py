@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_spatial的多层网格索引与像素距离，与逐个比较包围盒的结果对照"""
+
+import math
+import random
+
+import numpy as np
+
+import cg_spatial
+
+
+def brute_force(rects, query):
+    x_min, y_min, x_max, y_max = query
+    return {key for key, rect in rects.items()
+            if rect[0] <= x_max and rect[2] >= x_min and rect[1] <= y_max and rect[3] >= y_min
+            and rect[2] >= rect[0] and rect[3] >= rect[1]}
+
+
+def random_rect(rng):
+    x, y = rng.uniform(-300, 1000), rng.uniform(-300, 1000)
+    # 尺寸跨越多个层级
+    w, h = rng.choice((0, 1, 5, 50, 400, 3000)) * rng.random(), rng.choice((0, 1, 5, 50, 400)) * rng.random()
+    return (x, y, x + w, y + h)
+
+
+def test_insert_move_remove_query():
+    rng = random.Random(8)
+    index, rects = cg_spatial.GridIndex(cell_size=32), {}
+    for step in range(2000):
+        key = rng.randrange(300)
+        action = rng.random()
+        if action < 0.6:
+            rects[key] = random_rect(rng)
+            index.insert(key, rects[key])
+        elif action < 0.8:
+            rects.pop(key, None)
+            index.remove(key)
+        else:
+            x, y, radius = rng.uniform(-300, 1000), rng.uniform(-300, 1000), rng.choice((0, 3, 100))
+            assert set(index.query_point(x, y, radius)) == brute_force(rects, (x - radius, y - radius,
+                                                                               x + radius, y + radius))
+            query = random_rect(rng)
+            assert set(index.query_rect(query)) == brute_force(rects, query)
+        assert len(index) == len(rects)
+    for key in list(rects):
+        index.remove(key)
+    assert len(index) == 0 and index.levels == {}
+
+
+def test_move_and_empty_rects():
+    index = cg_spatial.GridIndex(cell_size=10)
+    index.insert('a', (0, 0, 5, 5))
+    assert index.query_point(2, 2) == ['a']
+    index.insert('a', (100, 100, 105, 105))
+    assert index.query_point(2, 2) == [] and index.query_point(101, 101) == ['a']
+    # 宽或高为负的矩形占有键，但不参与查询
+    index.insert('b', (10, 10, 0, 0))
+    assert 'b' in index and index.query_rect((-100, -100, 200, 200)) == ['a']
+    index.remove('b')
+    index.remove('missing')
+    assert len(index) == 1
+    # 边界接触也算相交
+    assert index.query_rect((105, 50, 200, 100)) == ['a']
+
+
+def test_pixel_distance_to_centres():
+    pixels = np.array([[10, 10], [20, 5]])
+    assert cg_spatial.pixel_distance(pixels, 10.5, 10.5) == 0
+    assert cg_spatial.pixel_distance(pixels, 10, 10) == math.sqrt(0.5)
+    assert cg_spatial.pixel_distance(pixels, 23.5, 9.5) == 5
+    assert cg_spatial.pixel_distance(np.empty((0, 2), np.int32), 0, 0) == math.inf
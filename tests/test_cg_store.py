@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""cg_store的列式图元存储与批量变换"""
+
+import random
+
+import numpy as np
+import pytest
+
+import cg_algorithms as alg
+import cg_store
+
+
+def test_pack_rgb_round_trip():
+    packed = [cg_store.pack_rgb(color) for color in ((0, 0, 0), (255, 128, 1), (255, 255, 255))]
+    assert packed == [0, 0xFF8001, 0xFFFFFF]
+    assert cg_store.unpack_rgb(packed).tolist() == [[0, 0, 0], [255, 128, 1], [255, 255, 255]]
+
+
+@pytest.mark.parametrize('color', [(256, 0, 0), (0, -1, 0), (0, 0, 1000)])
+def test_pack_rgb_rejects_out_of_range(color):
+    with pytest.raises(ValueError):
+        cg_store.pack_rgb(color)
+
+
+@pytest.mark.parametrize('points', [[[cg_store.COORD_MAX + 1, 0]], [[0, cg_store.COORD_MIN - 1]], [[2 ** 70, 0]]])
+def test_as_points_rejects_out_of_int32(points):
+    with pytest.raises(ValueError):
+        cg_store.as_points(points)
+
+
+def test_as_points_accepts_int32_limits():
+    points = [[cg_store.COORD_MIN, cg_store.COORD_MAX]]
+    assert cg_store.as_points(points).tolist() == points
+    assert cg_store.as_points([]).shape == (0, 2)
+
+
+def test_set_and_replace():
+    store = cg_store.PrimitiveStore()
+    store.set('a', 'line', [[0, 0], [5, 5]], 'DDA', cg_store.pack_rgb((1, 2, 3)))
+    store.set('b', 'polygon', [[1, 1], [2, 2], [3, 1]], 'Bresenham', 0)
+    assert len(store) == 2 and 'a' in store and 'c' not in store
+    assert store.item('a')[:3] == ['line', [[0, 0], [5, 5]], 'DDA']
+    assert store.item('a')[3].tolist() == [1, 2, 3]
+    # 替换时顶点数变化，重新分配后原下标和绘制顺序不变
+    assert store.set('a', 'curve', [[0, 0], [1, 1], [2, 0], [3, 3]], 'Bezier', 0) == 0
+    assert store.ids == ['a', 'b']
+    assert store.p_list(0) == [[0, 0], [1, 1], [2, 0], [3, 3]]
+    assert store.p_list(1) == [[1, 1], [2, 2], [3, 1]]
+    store.compact()
+    assert store.garbage == 0 and store.vertex_count == 7
+    assert store.p_list(0) == [[0, 0], [1, 1], [2, 0], [3, 3]] and store.p_list(1) == [[1, 1], [2, 2], [3, 1]]
+
+
+def test_set_rejects_bad_points_without_partial_item():
+    store = cg_store.PrimitiveStore()
+    with pytest.raises(ValueError):
+        store.set('a', 'line', [[0, 0], [cg_store.COORD_MAX + 1, 0]], 'DDA', 0)
+    assert len(store) == 0 and 'a' not in store
+
+
+def test_set_rejects_too_many_algorithms_without_partial_item():
+    store = cg_store.PrimitiveStore()
+    for k in range(256):
+        store.set(str(k), 'line', [[0, 0], [1, 1]], 'A%d' % k, 0)
+    with pytest.raises(ValueError):
+        store.set('new', 'line', [[0, 0], [1, 1]], 'A256', 0)
+    assert len(store) == 256 and 'new' not in store
+    # 替换已有图元时同样不做任何修改
+    with pytest.raises(ValueError):
+        store.set('3', 'polygon', [[5, 5], [6, 6], [7, 5]], 'A256', 0)
+    assert store.item('3')[:3] == ['line', [[0, 0], [1, 1]], 'A3']
+    assert store.set('new', 'line', [[0, 0], [2, 2]], 'A255', 0) == 256
+
+
+def test_set_points_keeps_garbage_accounting_through_compaction():
+    rng = random.Random(12)
+    store, expected = cg_store.PrimitiveStore(), {}
+    for step in range(3000):
+        item_id = str(rng.randrange(50))
+        expected[item_id] = [[rng.randint(-9, 9), step] for _ in range(rng.randint(1, 30))]
+        store.set(item_id, 'polygon', expected[item_id], 'DDA', 0)
+        # 已使用的行数 = 有效顶点数 + 无用行数，替换时触发的compact不会把旧顶点当作有效顶点保留
+        assert store.vertex_count - store.garbage == int(store.lengths[:len(store)].sum())
+    assert {item_id: store.p_list(store.index[item_id]) for item_id in expected} == expected
+    store.compact()
+    assert store.vertex_count == sum(len(p_list) for p_list in expected.values())
+    assert {item_id: store.p_list(store.index[item_id]) for item_id in expected} == expected
+
+
+def test_copy_is_independent():
+    store = cg_store.PrimitiveStore()
+    for k in range(10):
+        store.set(str(k), 'line', [[k, k], [k + 1, k + 2]], 'DDA', k)
+    snapshot = store.copy()
+    store.translate(np.arange(10), 100, 0)
+    assert snapshot.p_list(3) == [[3, 3], [4, 5]]
+    assert store.p_list(3) == [[103, 3], [104, 5]]
+    # 只复制部分图元时按给定顺序重新编号
+    subset = store.copy(np.array([7, 2]))
+    assert subset.ids == ['7', '2'] and subset.index == {'7': 0, '2': 1}
+    assert [subset.p_list(k) for k in range(2)] == [store.p_list(7), store.p_list(2)]
+    assert subset.rgb([0, 1]).tolist() == store.rgb([7, 2]).tolist()
+
+
+def test_transforms_match_scalar():
+    rng = random.Random(6)
+    store = cg_store.PrimitiveStore()
+    p_lists = [[[rng.randint(-500, 500), rng.randint(-500, 500)] for _ in range(rng.randint(2, 6))]
+               for _ in range(50)]
+    for k, p_list in enumerate(p_lists):
+        store.set(str(k), 'polygon', p_list, 'DDA', 0)
+    indices = np.arange(0, 50, 3)
+    store.translate(indices, 7, -3)
+    store.rotate(indices, 10, 20, 37)
+    store.scale(indices, -5, 8, 1.7)
+    for k, p_list in enumerate(p_lists):
+        if k % 3 == 0:
+            p_list = alg.scale(alg.rotate(alg.translate(p_list, 7, -3), 10, 20, 37), -5, 8, 1.7)
+        assert store.p_list(k) == p_list
+
+
+def random_clip_segments(rng, count=300):
+    segments = [[[rng.randint(-50, 250), rng.randint(-50, 250)], [rng.randint(-50, 250), rng.randint(-50, 250)]]
+                for _ in range(count)]
+    # 完全在内、完全在外、贴着边界、单点和垂直水平的线段
+    segments += [[[60, 60], [90, 90]], [[-20, -20], [-10, 5]], [[50, 10], [150, 10]], [[50, 50], [50, 50]],
+                 [[70, -30], [70, 300]], [[-30, 70], [300, 70]], [[300, 300], [300, 300]]]
+    return segments
+
+
+@pytest.mark.parametrize('algorithm', ['Cohen-Sutherland', 'Liang-Barsky'])
+@pytest.mark.parametrize('window', [(50, 10, 150, 120), (150, 120, 50, 10), (50, 10, 50, 120)])
+def test_clip_segments_matches_scalar(algorithm, window):
+    segments = random_clip_segments(random.Random(7))
+    result, rejected = cg_store.clip_segments(segments, *window, algorithm)
+    for segment, clipped, reject in zip(segments, result.tolist(), rejected.tolist()):
+        expected = alg.clip(segment, *window, algorithm)
+        assert clipped == [list(point) for point in expected]
+        # 窗口不含原点，只有被整体裁去的线段才会变为 [[0, 0], [0, 0]]
+        assert reject == (clipped == [[0, 0], [0, 0]])
+
+
+def test_clip_segments_rejects_unknown_algorithm():
+    with pytest.raises(ValueError):
+        cg_store.clip_segments([[[0, 0], [1, 1]]], 0, 0, 10, 10, 'Sutherland-Hodgman')